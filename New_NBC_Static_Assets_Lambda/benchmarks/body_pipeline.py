@@ -0,0 +1,101 @@
+"""
+Body pipeline benchmark: read, encode and serialize a response body.
+
+Compares the previous read() + base64.b64encode() path with the readinto + single-call base64
+pipeline of resources/source/body.py, a chunked base64 encoding into a preallocated output, and
+raw text bodies. Every sample runs in a fresh interpreter so peak RSS is not shared between
+variants. Results are written to stdout as JSON, a summary table goes to stderr.
+
+    python benchmarks/body_pipeline.py --sizes 1,4,16 --runs 5 > body_pipeline.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "source")
+
+VARIANTS = {
+    "read+b64encode": "binary",
+    "readinto+chunked": "binary",
+    "readinto+b2a": "binary",
+    "readinto+text": "text",
+}
+
+CHILD_PROGRAM = """
+import base64, binascii, io, json, os, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+from body import encode_body, read_body
+
+def encode_chunked(body, chunk_bytes = 3 * 256 * 1024):
+    view = memoryview(body)
+    output = bytearray(4 * ((len(view) + 2) // 3))
+    output_offset = 0
+    for offset in range(0, len(view), chunk_bytes):
+        encoded = binascii.b2a_base64(view[offset:offset + chunk_bytes], newline = False)
+        output[output_offset:output_offset + len(encoded)] = encoded
+        output_offset += len(encoded)
+    return output.decode('ascii')
+
+variant, kind, size = sys.argv[2], sys.argv[3], int(sys.argv[4])
+data = os.urandom(size) if kind == 'binary' else (b'abcdefghij' * (size // 10 + 1))[:size]
+stream = io.BytesIO(data)
+baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+if variant == 'read+b64encode':
+    response = {"isBase64Encoded": True, "body": base64.b64encode(stream.read()).decode('ascii')}
+elif variant == 'readinto+chunked':
+    response = {"isBase64Encoded": True, "body": encode_chunked(read_body(stream, size))}
+else:
+    body = read_body(stream, size)
+    encoded, is_base64_encoded = encode_body(body, 'text/css' if kind == 'text' else 'image/png')
+    del body
+    response = {"isBase64Encoded": is_base64_encoded, "body": encoded}
+encoded_at = time.perf_counter()
+serialized = json.dumps(response)
+finished = time.perf_counter()
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'encode_ms': (encoded_at - started) * 1000, 'total_ms': (finished - started) * 1000,
+                  'peak_rss_delta_mb': (peak_kb - baseline_kb) / 1024, 'response_bytes': len(serialized)}))
+"""
+
+def run_sample(variant: str, size: int) -> dict:
+    """
+    Run one variant over one body size in a fresh interpreter
+    """
+    completed = subprocess.run([sys.executable, "-c", CHILD_PROGRAM, SOURCE_DIR, variant, VARIANTS[variant], str(size)],
+                               capture_output = True, text = True, check = True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default = "1,4,16", help = "comma separated body sizes in MB")
+    parser.add_argument("--runs", type = int, default = 5, help = "fresh interpreters per variant and size")
+    args = parser.parse_args()
+
+    results = {}
+    for size_mb in [float(size) for size in args.sizes.split(',')]:
+        size = int(size_mb * 1024 * 1024)
+        samples = {name: [] for name in VARIANTS}
+        for _ in range(args.runs):
+            for name in VARIANTS:
+                samples[name].append(run_sample(name, size))
+        results["%gMB" % size_mb] = {name: {
+            "encode_ms_per_mb": round(statistics.median(s["encode_ms"] for s in runs) / size_mb, 3),
+            "total_ms_per_mb": round(statistics.median(s["total_ms"] for s in runs) / size_mb, 3),
+            "peak_rss_delta_mb": round(statistics.median(s["peak_rss_delta_mb"] for s in runs), 2),
+            "response_bytes": runs[0]["response_bytes"]
+        } for name, runs in samples.items()}
+
+    json.dump({"python": sys.version.split()[0], "runs": args.runs, "sizes": results}, sys.stdout, indent = 2)
+    sys.stdout.write("\n")
+    sys.stderr.write("%-8s %-20s %14s %14s %16s\n" % ("size", "variant", "encode ms/MB", "total ms/MB", "peak RSS +MB"))
+    for size_name, variants in results.items():
+        for name, result in variants.items():
+            sys.stderr.write("%-8s %-20s %14.2f %14.2f %16.1f\n" % (
+                size_name, name, result["encode_ms_per_mb"], result["total_ms_per_mb"], result["peak_rss_delta_mb"]))
+
+if __name__ == "__main__":
+    main()
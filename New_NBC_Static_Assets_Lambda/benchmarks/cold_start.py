@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark of the static assets handler variants.
+
+Every sample runs in a fresh interpreter: the handler module is imported and its S3 client
+or resource is built the way the first invocation does, without calling S3. Results are
+written to stdout as JSON, a summary table goes to stderr.
+
+    python benchmarks/cold_start.py --runs 20 > cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Variant name -> (handler file, code run after the import to build the S3 client or resource)
+VARIANTS = {
+    "code_1.0/src/services/app.py": (
+        os.path.join(ROOT, "code_1.0", "src", "services", "app.py"),
+        "module.LambdaS3Class(module._LAMBDA_S3_RESOURCE)"),
+    "code_1.0/src/services/app_3.0.py": (
+        os.path.join(ROOT, "code_1.0", "src", "services", "app_3.0.py"),
+        "module.LambdaS3Class()"),
+    "resources/app_2.0.py": (
+        os.path.join(ROOT, "New_NBC_Static_Assets_Lambda", "resources", "app_2.0.py"),
+        "module.S3Resource()"),
+    "resources/source/app.py": (
+        os.path.join(ROOT, "New_NBC_Static_Assets_Lambda", "resources", "source", "app.py"),
+        "module.get_s3_resource()"),
+}
+
+CHILD_PROGRAM = """
+import importlib.util, json, os, sys, time
+started = time.perf_counter()
+source_file, init_code = sys.argv[1], sys.argv[2]
+sys.path.insert(0, os.path.dirname(source_file))
+spec = importlib.util.spec_from_file_location('handler_under_test', source_file)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+exec(init_code, {'module': module})
+initialised = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'init_ms': (initialised - imported) * 1000}))
+"""
+
+def child_environment(cache_dir: str) -> dict:
+    """
+    Offline environment for the child interpreters
+    """
+    env = dict(os.environ)
+    env.update({
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_EC2_METADATA_DISABLED": "true",
+        "BUCKET_NAME": "cold-start-benchmark",
+        "S3_BUCKET_NAME": "cold-start-benchmark",
+        "LAMBDA_PATH": "/static/",
+        "DISK_CACHE_DIR": cache_dir,
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+def run_sample(source_file: str, init_code: str, env: dict) -> dict:
+    """
+    Import and initialise one variant in a fresh interpreter
+    """
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", CHILD_PROGRAM, source_file, init_code],
+                               env = env, capture_output = True, text = True, check = True)
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = (time.perf_counter() - started) * 1000
+    sample["total_ms"] = sample["import_ms"] + sample["init_ms"]
+    return sample
+
+def summarize(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        "min": round(ordered[0], 2),
+        "median": round(statistics.median(ordered), 2),
+        "p90": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type = int, default = 10, help = "fresh interpreters per variant")
+    parser.add_argument("--variant", action = "append", choices = sorted(VARIANTS),
+                        help = "variant to measure, repeatable, defaults to all")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = child_environment(cache_dir)
+        names = args.variant or list(VARIANTS)
+        samples = {name: [] for name in names}
+        # Interleave the variants so drift on the machine affects them all alike.
+        for _ in range(args.runs):
+            for name in names:
+                samples[name].append(run_sample(*VARIANTS[name], env))
+        for name in names:
+            results[name] = {metric: summarize([sample[metric] for sample in samples[name]])
+                             for metric in ("import_ms", "init_ms", "total_ms", "process_ms")}
+
+    json.dump({"python": sys.version.split()[0], "runs": args.runs, "variants": results},
+              sys.stdout, indent = 2)
+    sys.stdout.write("\n")
+    sys.stderr.write("%-36s %12s %12s %12s\n" % ("variant", "import ms", "init ms", "total ms"))
+    for name, result in results.items():
+        sys.stderr.write("%-36s %12.1f %12.1f %12.1f\n" % (
+            name, result["import_ms"]["median"], result["init_ms"]["median"], result["total_ms"]["median"]))
+
+if __name__ == "__main__":
+    main()
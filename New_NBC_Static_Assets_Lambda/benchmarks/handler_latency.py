@@ -0,0 +1,197 @@
+"""
+Handler benchmark of the static assets handler variants across object sizes and cache states.
+
+Every sample runs in a fresh interpreter against moto, so nothing is sent to AWS. The first
+invocation after the import is timed as the cold request, the following ones as warm requests,
+for which latency percentiles, the median CPU time per request, throughput, the peak of traced
+allocations of one request and the peak RSS are reported. The consolidated handler is measured with each cache tier on and off,
+the other variants have no cache. Presigned redirects are disabled so every variant returns the
+body inline. Results are written to stdout as JSON, a summary table goes to stderr.
+
+    python benchmarks/handler_latency.py --sizes 1,64,512,1024,5120 --runs 3 > handler_latency.json
+    python benchmarks/handler_latency.py --baseline handler_latency.json > handler_latency_new.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VARIANTS = {
+    "code_1.0/src/services/app.py": os.path.join(ROOT, "code_1.0", "src", "services", "app.py"),
+    "code_1.0/src/services/app_3.0.py": os.path.join(ROOT, "code_1.0", "src", "services", "app_3.0.py"),
+    "resources/app_2.0.py": os.path.join(ROOT, "New_NBC_Static_Assets_Lambda", "resources", "app_2.0.py"),
+    "resources/source/app.py": os.path.join(ROOT, "New_NBC_Static_Assets_Lambda", "resources", "source", "app.py"),
+}
+CACHED_VARIANT = "resources/source/app.py"
+
+# Cache state -> (CACHE_MAX_BYTES, DISK_CACHE_MAX_BYTES) of the consolidated handler.
+CACHE_STATES = {
+    "none": (0, 0),
+    "memory": (64 * 1024 * 1024, 0),
+    "disk": (0, 512 * 1024 * 1024),
+    "memory+disk": (64 * 1024 * 1024, 512 * 1024 * 1024),
+}
+
+CHILD_PROGRAM = """
+import importlib.util, json, os, resource, sys, time, tracemalloc
+import moto
+from boto3 import client
+source_file, key, size, requests = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+mock = moto.mock_s3() if hasattr(moto, 'mock_s3') else moto.mock_aws()
+mock.start()
+s3_client = client('s3', region_name = 'us-east-1')
+s3_client.create_bucket(Bucket = os.environ['S3_BUCKET_NAME'])
+s3_client.put_object(Bucket = os.environ['S3_BUCKET_NAME'], Key = key, Body = os.urandom(size),
+                     ContentType = 'application/pdf')
+event = {'httpMethod': 'GET', 'path': '/static/' + key, 'queryStringParameters': {}, 'headers': {}}
+
+started = time.perf_counter()
+sys.path.insert(0, os.path.dirname(source_file))
+spec = importlib.util.spec_from_file_location('handler_under_test', source_file)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+response = module.lambda_handler(event, None)
+cold_ms = (time.perf_counter() - started) * 1000
+if response['statusCode'] != 200:
+    raise SystemExit('unexpected status %s: %s' % (response['statusCode'], response.get('body')))
+
+latencies = []
+cpu_times = []
+loop_started = time.perf_counter()
+for _ in range(requests):
+    request_started, cpu_started = time.perf_counter(), time.process_time()
+    module.lambda_handler(event, None)
+    latencies.append((time.perf_counter() - request_started) * 1000)
+    cpu_times.append((time.process_time() - cpu_started) * 1000)
+loop_seconds = time.perf_counter() - loop_started
+
+tracemalloc.start()
+module.lambda_handler(event, None)
+alloc_peak_bytes = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+print(json.dumps({'cold_ms': cold_ms, 'warm_ms': latencies, 'warm_cpu_ms': cpu_times,
+                  'requests_per_second': requests / loop_seconds,
+                  'alloc_peak_kb': alloc_peak_bytes / 1024,
+                  'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+def child_environment(cache_dir: str, cache_state: str) -> dict:
+    """
+    Offline environment of one sample, with a fresh disk cache directory
+    """
+    memory_bytes, disk_bytes = CACHE_STATES[cache_state]
+    env = dict(os.environ)
+    env.update({
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_EC2_METADATA_DISABLED": "true",
+        "BUCKET_NAME": "handler-benchmark",
+        "S3_BUCKET_NAME": "handler-benchmark",
+        "LAMBDA_PATH": "/static/",
+        "LOG_LEVEL": "WARNING",
+        "CACHE_MAX_BYTES": str(memory_bytes),
+        "DISK_CACHE_MAX_BYTES": str(disk_bytes),
+        "DISK_CACHE_DIR": tempfile.mkdtemp(dir = cache_dir),
+        "REDIRECT_THRESHOLD_BYTES": "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+def run_sample(source_file: str, size: int, requests: int, env: dict) -> dict:
+    """
+    Serve one object from one variant in a fresh interpreter
+    """
+    completed = subprocess.run([sys.executable, "-c", CHILD_PROGRAM, source_file, "benchmark.pdf",
+                                str(size), str(requests)],
+                               env = env, capture_output = True, text = True, check = True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(samples: list) -> dict:
+    """
+    Merge the samples of one variant, size and cache state
+    """
+    warm = sorted(latency for sample in samples for latency in sample["warm_ms"])
+    return {
+        "cold_ms": round(statistics.median(sample["cold_ms"] for sample in samples), 3),
+        "warm_ms": {
+            "p50": round(percentile(warm, 0.5), 3),
+            "p90": round(percentile(warm, 0.9), 3),
+            "p99": round(percentile(warm, 0.99), 3),
+            "max": round(warm[-1], 3),
+        },
+        "warm_cpu_ms_p50": round(statistics.median(cpu for sample in samples for cpu in sample["warm_cpu_ms"]), 3),
+        "requests_per_second": round(statistics.median(sample["requests_per_second"] for sample in samples), 1),
+        "alloc_peak_kb": round(statistics.median(sample["alloc_peak_kb"] for sample in samples), 1),
+        "peak_rss_mb": round(max(sample["peak_rss_mb"] for sample in samples), 1),
+    }
+
+def git_commit() -> str:
+    """
+    Commit the benchmark ran against, so result files can be told apart
+    """
+    try:
+        return subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def rows(results: dict):
+    for name, sizes in results.items():
+        for size_name, cache_states in sizes.items():
+            for cache_state, result in cache_states.items():
+                yield name, size_name, cache_state, result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default = "1,64,512,1024,5120", help = "comma separated object sizes in KB")
+    parser.add_argument("--runs", type = int, default = 3, help = "fresh interpreters per variant, size and cache state")
+    parser.add_argument("--requests", type = int, default = 50, help = "warm requests per interpreter")
+    parser.add_argument("--variant", action = "append", choices = sorted(VARIANTS),
+                        help = "variant to measure, repeatable, defaults to all")
+    parser.add_argument("--cache", action = "append", choices = sorted(CACHE_STATES),
+                        help = "cache state of %s, repeatable, defaults to all" % CACHED_VARIANT)
+    parser.add_argument("--baseline", help = "earlier JSON output to compare the warm p50 against")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name in args.variant or list(VARIANTS):
+            cache_states = (args.cache or list(CACHE_STATES)) if name == CACHED_VARIANT else ["none"]
+            results[name] = {}
+            for size_kb in [float(size) for size in args.sizes.split(',')]:
+                size = int(size_kb * 1024)
+                results[name]["%gKB" % size_kb] = {
+                    cache_state: summarize([run_sample(VARIANTS[name], size, args.requests,
+                                                       child_environment(cache_dir, cache_state))
+                                            for _ in range(args.runs)])
+                    for cache_state in cache_states}
+
+    json.dump({"python": sys.version.split()[0], "commit": git_commit(), "runs": args.runs,
+               "requests": args.requests, "variants": results}, sys.stdout, indent = 2)
+    sys.stdout.write("\n")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding = "utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["variants"]
+    sys.stderr.write("%-34s %-9s %-12s %10s %10s %10s %10s %10s %10s %10s\n" % (
+        "variant", "size", "cache", "cold ms", "p50 ms", "p99 ms", "cpu ms", "req/s", "alloc KB", "p50 diff"))
+    for name, size_name, cache_state, result in rows(results):
+        previous = baseline.get(name, {}).get(size_name, {}).get(cache_state)
+        difference = ("%+9.1f%%" % ((result["warm_ms"]["p50"] / previous["warm_ms"]["p50"] - 1) * 100)
+                      if previous and previous["warm_ms"]["p50"] else "")
+        sys.stderr.write("%-34s %-9s %-12s %10.1f %10.3f %10.3f %10.3f %10.1f %10.1f %10s\n" % (
+            name, size_name, cache_state, result["cold_ms"], result["warm_ms"]["p50"], result["warm_ms"]["p99"],
+            result["warm_cpu_ms_p50"], result["requests_per_second"], result["alloc_peak_kb"], difference))
+
+if __name__ == "__main__":
+    main()
@@ -40,10 +40,10 @@ def get_data_from_s3( s3: S3Resource,
                          s3_file_key: str):
     response = {}
     try:
-        client_response = s3.resource.Object(s3.bucket_name, s3_file_key)
-        logger.debug("Response from S3 '%s' : ", client_response.get())
-        body = base64.b64encode(client_response.get()['Body'].read())
-        content_type = client_response.get()['ContentType']
+        client_response = s3.resource.Object(s3.bucket_name, s3_file_key).get()
+        logger.debug("Response from S3 '%s' : ", client_response.get('ResponseMetadata'))
+        body = base64.b64encode(client_response['Body'].read())
+        content_type = client_response['ContentType']
         logger.info(
             "Successfully retreived object '%s' from Bucket '%s'.", s3_file_key, s3.bucket_name)
         response = {
@@ -68,5 +68,6 @@ def get_data_from_s3( s3: S3Resource,
         response['body'] = "ERROR: " + str(other_error)
         response['statusCode'] = 500
     finally:
-        logger.debug("Return Response is '%s'", response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Return Response is '%s'", {name: value for name, value in response.items() if name != 'body'})
         return response
\ No newline at end of file
@@ -0,0 +1,65 @@
+from os import environ
+import json
+import logging
+import random
+
+DEFAULT_ACCESS_LOG_LEVEL = 'INFO'
+DEFAULT_ACCESS_LOG_SAMPLE_RATE = 1.0
+DEFAULT_ACCESS_LOG_MAX_FIELD_CHARS = 256
+
+class AccessLog:
+    """
+    One compact JSON line per sampled request, built only from fields the handler already
+    computed. Bodies are never formatted, only their length is logged.
+    """
+    def __init__(self, level: int, sample_rate: float, max_field_chars: int,
+                 logger = None, sample = random.random):
+        """
+        Initialize an access log, a sample_rate of 0 disables it
+        """
+        self.level = level
+        self.sample_rate = sample_rate
+        self.max_field_chars = max_field_chars
+        self.logger = logger or logging.getLogger('access')
+        self._sample = sample
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Build the access log from the ACCESS_LOG_LEVEL, ACCESS_LOG_SAMPLE_RATE and
+        ACCESS_LOG_MAX_FIELD_CHARS environment variables
+        """
+        return cls(level = logging.getLevelName(environ.get('ACCESS_LOG_LEVEL', DEFAULT_ACCESS_LOG_LEVEL).upper()),
+                   sample_rate = float(environ.get('ACCESS_LOG_SAMPLE_RATE', DEFAULT_ACCESS_LOG_SAMPLE_RATE)),
+                   max_field_chars = int(environ.get('ACCESS_LOG_MAX_FIELD_CHARS', DEFAULT_ACCESS_LOG_MAX_FIELD_CHARS)))
+
+    def should_log(self) -> bool:
+        """
+        Decide once per request, before any field is gathered, whether it is logged
+        """
+        if self.sample_rate <= 0 or not self.logger.isEnabledFor(self.level):
+            return False
+        return self.sample_rate >= 1 or self._sample() < self.sample_rate
+
+    def truncate(self, value):
+        if isinstance(value, str) and len(value) > self.max_field_chars:
+            return value[:self.max_field_chars] + '...'
+        return value
+
+    def log(self, request_metrics, response: dict = None, method: str = None):
+        """
+        Write the access log line of a request from its tracked metrics and its response
+        """
+        response = response or {}
+        body = response.get('body')
+        fields = {
+            'method': method,
+            'key': request_metrics.get('Key'),
+            'status': response.get('statusCode'),
+            'bytes': len(body) if isinstance(body, (str, bytes)) else 0,
+            'duration_ms': round(request_metrics.elapsed_ms(), 3),
+            'cache_tier': request_metrics.get('CacheTier', 'none'),
+            'trace_id': request_metrics.get('TraceId')
+        }
+        self.logger.log(self.level, '%s', json.dumps(
+            {name: self.truncate(value) for name, value in fields.items()}, separators = (',', ':')))
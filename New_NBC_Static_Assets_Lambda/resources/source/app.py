@@ -1,65 +1,968 @@
+from time import monotonic, perf_counter
+_IMPORT_STARTED = perf_counter()
+
 from os import environ
+from collections import OrderedDict
+from datetime import datetime, timezone
+from hashlib import md5
+from mimetypes import guess_type
+from threading import Lock
 from typing import Any, Dict
-from boto3 import resource
-import base64
 import logging
 from botocore.exceptions import ClientError
+from fetch import S3Object, S3RequestCounter, fetch_object, fetch_range, head_object, is_missing_key
+from cache import ObjectCache
+from disk_cache import DiskCache
+from negative_cache import NegativeCache
+from cache_policy import CachePolicy
+from presign import PresignedUrlCache
+from client_config import client_config_from_environ
+from prewarm import FirstRequestStats, Prewarmer, read_manifest
+from fingerprint import IMMUTABLE_CACHE_CONTROL, FingerprintManifest, fingerprint
+from metadata_index import MetadataIndex
+from hedge import HedgedReads
+from singleflight import SingleFlight
+from images import (DERIVED_PREFIX, FORMAT_CONTENT_TYPES, TRANSCODABLE_TYPES, ImageTooLargeError, derived_key,
+                    is_transcodable, negotiate_format, parse_width, transcode)
+from body import EncodedResponse, encode_base64, encode_body
+from metrics import current_metrics, start_request
+from access_log import AccessLog
+from notifications import bucket_changes, is_bucket_notification
+from bundle import (BUNDLE_KEY, BundleRequestError, build_bundle_response, load_bundle, parse_bundle_keys,
+                    wants_zip)
+from encoding import (PREFERRED_CODINGS, SIBLING_SUFFIXES, acceptable_codings, compress, compression_codings,
+                      is_compressible, merge_vary, parse_accept_encoding, variant_etag)
+from http_utils import (build_multipart_byteranges, format_http_date, format_range_spec, get_header,
+                        has_conditional_headers, if_range_matches, is_not_modified, max_range_bytes,
+                        parse_range_header, resolve_ranges)
 
 logger = logging.getLogger()
 logger.setLevel(environ.get('LOG_LEVEL', 'INFO'))
+ACCESS_LOG = AccessLog.from_environ()
+
+# Objects served by this execution environment, kept across warm invocations.
+OBJECT_CACHE = ObjectCache.from_environ()
+DISK_CACHE = DiskCache.from_environ()
+CACHE_TIERS = (OBJECT_CACHE, DISK_CACHE)
+# Keys S3 reported missing, answered with a 404 without calling S3 for a short TTL.
+NEGATIVE_CACHE = NegativeCache.from_environ()
+# Optional listing of the bucket refreshed in the background, answering 404s and metadata lookups.
+METADATA_INDEX = MetadataIndex.from_environ()
+CACHE_POLICY = CachePolicy.from_environ()
+# Concurrent misses on the same key, prewarm included, share a single GetObject.
+IN_FLIGHT = SingleFlight()
+
+# Optional hot-key manifest prefetched on a background thread during init.
+PREWARM_MANIFEST = environ.get('PREWARM_MANIFEST')
+PREWARMER = Prewarmer()
+FIRST_REQUESTS = FirstRequestStats()
+
+# Objects above this size are redirected to a presigned URL, ALB rejects Lambda responses over 1 MB
+# and base64 inflates the body by a third.
+REDIRECT_THRESHOLD_BYTES = int(environ.get('REDIRECT_THRESHOLD_BYTES', 700 * 1024))
+REDIRECT_STATUS_CODE = int(environ.get('REDIRECT_STATUS_CODE', 307))
+PRESIGNED_URLS = PresignedUrlCache.from_environ()
+# Sizes of objects found over the threshold per (bucket, key), so hot large objects are redirected
+# without a GetObject for as long as a cached object stays fresh.
+LARGE_OBJECTS = OrderedDict()
+LARGE_OBJECTS_SIZE = 4096
+_LARGE_OBJECTS_LOCK = Lock()
+
+# Methods answered under LAMBDA_PATH, anything else gets a 405. Bundles also accept a POST body.
+ALLOWED_METHODS = ('GET', 'HEAD')
+BUNDLE_ALLOWED_METHODS = ('GET', 'HEAD', 'POST')
+
+PRECOMPRESSED_SIBLINGS = environ.get('PRECOMPRESSED_SIBLINGS', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(environ.get('COMPRESSION_MIN_BYTES', 1024))
+# Precompressed sibling codings found per (bucket, key, ETag), so siblings are looked up once.
+PRECOMPRESSED_INDEX = OrderedDict()
+PRECOMPRESSED_INDEX_SIZE = 4096
+_PRECOMPRESSED_LOCK = Lock()
+
+# The S3 client is built once per execution environment, on the first invocation.
+_S3_RESOURCE = None
+_S3_RESOURCE_LOCK = Lock()
+_COLD_START = True
 
 class S3Resource:
     """
-    AWS S3 Resource Class
+    AWS S3 Resource Class, a low-level S3 client bound to the assets bucket
     """
     def __init__(self):
         """
-        Initialize an S3 Resource
+        Initialize an S3 Resource. botocore is used directly, the boto3 resource layer
+        and s3transfer only add import time. With S3_REPLICA_BUCKET_NAME set, GetObject calls
+        are hedged by a replica of the bucket.
         """
-        self.resource = resource('s3')
+        from botocore.session import get_session
+        session = get_session()
+        self.client = session.create_client('s3', config = client_config_from_environ())
         self.bucket_name = environ.get('S3_BUCKET_NAME')
-        self.bucket = self.resource.Bucket(self.bucket_name)
+        self.request_counter = S3RequestCounter()
+        self.request_counter.attach(self.client)
+        self.hedged_reads = HedgedReads.from_environ(lambda region_name: session.create_client(
+            's3', region_name = region_name, config = client_config_from_environ()))
+
+def get_s3_resource() -> S3Resource:
+    """
+    Return the S3 resource shared by every invocation and thread, built during init when the
+    bucket is configured, otherwise on first use
+    """
+    global _S3_RESOURCE
+    if _S3_RESOURCE is None:
+        with _S3_RESOURCE_LOCK:
+            if _S3_RESOURCE is None:
+                started = perf_counter()
+                _S3_RESOURCE = S3Resource()
+                INIT_TIMINGS['client_init_seconds'] = perf_counter() - started
+    return _S3_RESOURCE
 
 def lambda_handler(event, context):
     """
     Lambda Entry Point
     """
-    s3_resource_class = S3Resource()
+    global _COLD_START
+    if is_bucket_notification(event):
+        return handle_bucket_notifications(get_s3_resource(), event)
+    access_logged = ACCESS_LOG.should_log()
+    metrics = start_request(get_header(event.get('headers'), 'x-amzn-trace-id'), _COLD_START,
+                            track = access_logged)
+    response = None
+    try:
+        s3_resource_class = get_s3_resource()
+        s3_resource_class.request_counter.reset()
+        if _COLD_START:
+            _COLD_START = False
+            metrics.set('InitImport', INIT_TIMINGS['import_seconds'] * 1000)
+            metrics.set('InitClient', INIT_TIMINGS['client_init_seconds'] * 1000)
+            logger.info("Cold start: module import took %.1f ms, S3 client init took %.1f ms, prewarm %s.",
+                        INIT_TIMINGS['import_seconds'] * 1000, INIT_TIMINGS['client_init_seconds'] * 1000,
+                        PREWARMER.stats())
+        response = route_event(s3_resource_class, event)
+        return response
+    finally:
+        if access_logged:
+            ACCESS_LOG.log(metrics, response, event.get('httpMethod'))
+        metrics.emit(response)
+
+def route_event(s3: S3Resource, event: dict) -> dict:
+    """
+    Serve an ALB event for a path under LAMBDA_PATH, a bundle, a fingerprinted URL or a single object
+    """
     static_path = environ.get('LAMBDA_PATH')
     if 'path' in event and event['path'].startswith(static_path):
         logger.debug("Event Path is '%s'", event['path'])
-        return get_data_from_s3(s3 = s3_resource_class,
-                s3_file_key = event['path'].split(static_path, 1)[1])
+        s3_file_key = event['path'].split(static_path, 1)[1]
+        method = request_method(event)
+        allowed_methods = BUNDLE_ALLOWED_METHODS if s3_file_key == BUNDLE_KEY else ALLOWED_METHODS
+        if method not in allowed_methods:
+            return method_not_allowed_response(allowed_methods)
+        if s3_file_key == BUNDLE_KEY:
+            response = get_bundle_from_s3(s3 = s3, event = event)
+        else:
+            fingerprinted = FINGERPRINTS.resolve(s3_file_key) if FINGERPRINTS is not None else None
+            if fingerprinted is not None:
+                response = get_fingerprinted_data(s3, event, static_path, *fingerprinted)
+            else:
+                response = get_data_from_s3(s3 = s3,
+                        s3_file_key = s3_file_key,
+                        headers = event.get('headers') or {},
+                        query = event.get('queryStringParameters') or {},
+                        method = method)
+        if method == 'HEAD':
+            response['body'] = ""
+            response['isBase64Encoded'] = False
+        return response
     else:
         return {
             "statusCode": 400,
             "body": "Invalid request" 
         }
 
-def get_data_from_s3( s3: S3Resource,
-                         s3_file_key: str):
-    response = {}
+def request_method(event: dict) -> str:
+    """
+    HTTP method of an ALB event, events without one are handled as GET
+    """
+    return (event.get('httpMethod') or 'GET').upper()
+
+def method_not_allowed_response(allowed_methods: tuple) -> dict:
+    return {
+        "headers": {
+            'Allow': ', '.join(allowed_methods),
+            'Access-Control-Allow-Origin': '*'
+        },
+        "isBase64Encoded": False,
+        "statusCode": 405,
+        "body": "Method Not Allowed"
+    }
+
+def handle_bucket_notifications(s3: S3Resource, event: dict) -> dict:
+    """
+    Apply the S3 event notifications of an S3, SQS or SNS event to this execution environment.
+    SQS messages that could not be applied are reported as batch item failures to be retried.
+    """
+    applied = 0
+    failures = []
+    for record in event['Records']:
+        try:
+            for change in bucket_changes(record):
+                applied += apply_bucket_change(s3, change)
+        except Exception as notification_error:
+            logger.exception("Unable to apply notification record: '%s'.", str(notification_error))
+            if record.get('messageId'):
+                failures.append({"itemIdentifier": record['messageId']})
+    logger.info("Applied %d bucket changes from %d notification records.", applied, len(event['Records']))
+    return {"batchItemFailures": failures}
+
+def apply_bucket_change(s3: S3Resource, change) -> bool:
+    """
+    Drop every cached representation of a created, overwritten or deleted key: the object in each
+    tier, its encoded responses, compressions and derivatives, its negative cache entry, its
+    remembered size and the precompressed sibling lookups. A key that was cached is fetched again after an upload.
+    Returns False for changes already applied or for another bucket.
+    """
+    if change.bucket != s3.bucket_name:
+        logger.debug("Ignoring a change to '%s' in Bucket '%s'.", change.key, change.bucket)
+        return False
+    cache_key = (s3.bucket_name, change.key)
+    cached = OBJECT_CACHE.peek(cache_key)
+    if not change.removed and cached is not None and change.etag and cached.etag == change.etag:
+        return False
+    was_cached = is_cached(s3, change.key)
+    affected_keys = {change.key}
+    for suffix in SIBLING_SUFFIXES.values():
+        if change.key.endswith(suffix):
+            affected_keys.add(change.key[:-len(suffix)])
+    derived_prefixes = tuple(DERIVED_PREFIX + key + '/' for key in affected_keys)
+    for cache_tier in CACHE_TIERS:
+        cache_tier.invalidate(cache_key)
+    OBJECT_CACHE.invalidate_where(lambda entry_key: entry_key[0] == s3.bucket_name and (
+        entry_key[1] in affected_keys or entry_key[1].startswith(derived_prefixes)))
+    NEGATIVE_CACHE.invalidate(cache_key)
+    with _LARGE_OBJECTS_LOCK:
+        LARGE_OBJECTS.pop(cache_key, None)
+    with _PRECOMPRESSED_LOCK:
+        for index_key in [index_key for index_key in PRECOMPRESSED_INDEX
+                          if index_key[0] == s3.bucket_name and index_key[1] in affected_keys]:
+            del PRECOMPRESSED_INDEX[index_key]
+    if METADATA_INDEX is not None:
+        if change.removed:
+            METADATA_INDEX.remove(change.key)
+        elif change.etag and change.size is not None:
+            METADATA_INDEX.update(change.key, change.size, change.etag,
+                                  change.event_time or datetime.now(timezone.utc))
+    if FINGERPRINTS is not None and environ.get('FINGERPRINT_MANIFEST') in (
+            's3:' + change.key, 's3://%s/%s' % (s3.bucket_name, change.key)):
+        FINGERPRINTS.invalidate()
+    logger.info("Object '%s' in Bucket '%s' was %s, cached copies dropped.",
+                change.key, s3.bucket_name, 'removed' if change.removed else 'uploaded')
+    if was_cached and not change.removed:
+        try:
+            fetch_into_cache(s3, change.key, max_body_bytes = REDIRECT_THRESHOLD_BYTES)
+        except ClientError as refresh_error:
+            logger.warning("Unable to refresh object '%s' from Bucket '%s': '%s'.",
+                           change.key, s3.bucket_name, str(refresh_error))
+    return True
+
+def load_object(s3: S3Resource, s3_file_key: str, max_body_bytes: int = None):
+    """
+    Return an object from the first cache tier holding it, revalidating stale entries
+    with a conditional GetObject, and fall back to a full GetObject on a miss.
+    Objects larger than max_body_bytes are returned without a body and are not cached.
+    """
+    cache_key = (s3.bucket_name, s3_file_key)
+    for cache_tier in CACHE_TIERS:
+        cached = cache_tier.get(cache_key)
+        if cached is None:
+            continue
+        FIRST_REQUESTS.record(cache_key, 'hit')
+        current_metrics().set('CacheTier', cache_tier.tier_name)
+        s3_object, is_fresh = cached
+        if is_fresh:
+            return s3_object
+        return IN_FLIGHT.do(cache_key + ('revalidate',),
+                            lambda: revalidate_object(s3, s3_file_key, s3_object, max_body_bytes))[0]
+    s3_object, shared = fetch_into_cache(s3, s3_file_key, max_body_bytes)
+    FIRST_REQUESTS.record(cache_key, 'coalesced' if shared else 'miss')
+    current_metrics().set('CacheTier', 'coalesced' if shared else 'miss')
+    return s3_object
+
+def fetch_into_cache(s3: S3Resource, s3_file_key: str, max_body_bytes: int = None):
+    """
+    GetObject a key and cache it in every tier. Callers asking for a key already being
+    fetched wait for that fetch instead of repeating it. Returns (s3_object, shared).
+    """
+    cache_key = (s3.bucket_name, s3_file_key)
+
+    def fetch():
+        s3_object = fetch_object(s3, s3_file_key, max_body_bytes = max_body_bytes)
+        if s3_object.body is not None:
+            for cache_tier in CACHE_TIERS:
+                cache_tier.put(cache_key, s3_object)
+        return s3_object
+    return IN_FLIGHT.do(cache_key, fetch)
+
+def is_cached(s3: S3Resource, s3_file_key: str) -> bool:
+    """
+    True when any cache tier holds the key
+    """
+    cache_key = (s3.bucket_name, s3_file_key)
+    return any(cache_tier.contains(cache_key) for cache_tier in CACHE_TIERS)
+
+def start_prewarm() -> bool:
+    """
+    Start prefetching the PREWARM_MANIFEST keys in the background, False when no manifest is set
+    """
+    if not PREWARM_MANIFEST:
+        return False
+    PREWARMER.start(get_s3_resource, PREWARM_MANIFEST,
+                    prefetch = lambda s3, s3_file_key, max_body_bytes: fetch_into_cache(
+                        s3, s3_file_key, max_body_bytes = min(max_body_bytes, REDIRECT_THRESHOLD_BYTES)
+                        if REDIRECT_THRESHOLD_BYTES else max_body_bytes)[0],
+                    is_cached = is_cached, known_size = known_object_size)
+    return True
+
+def start_metadata_index() -> bool:
+    """
+    Start building and refreshing the metadata index in the background, False when it is disabled
+    """
+    if METADATA_INDEX is None:
+        return False
+    METADATA_INDEX.start(get_s3_resource, read_manifest)
+    return True
+
+def revalidate_object(s3: S3Resource, s3_file_key: str, s3_object, max_body_bytes: int = None):
+    """
+    Check a stale cached object against S3 using its ETag and update every cache tier
+    """
+    cache_key = (s3.bucket_name, s3_file_key)
     try:
-        client_response = s3.resource.Object(s3.bucket_name, s3_file_key)
-        logger.debug("Response from S3 '%s' : ", client_response.get())
-        body = base64.b64encode(client_response.get()['Body'].read())
-        content_type = client_response.get()['ContentType']
-        logger.info(
-            "Successfully retreived object '%s' from Bucket '%s'.", s3_file_key, s3.bucket_name)
-        response = {
+        fetched = fetch_object(s3, s3_file_key, if_none_match = s3_object.etag,
+                               max_body_bytes = max_body_bytes)
+    except ClientError:
+        for cache_tier in CACHE_TIERS:
+            cache_tier.invalidate(cache_key)
+        raise
+    if fetched is None:
+        for cache_tier in CACHE_TIERS:
+            cache_tier.mark_not_modified(cache_key)
+        return s3_object
+    for cache_tier in CACHE_TIERS:
+        if fetched.body is None:
+            cache_tier.invalidate(cache_key)
+        else:
+            cache_tier.put(cache_key, fetched)
+    return fetched
+
+def get_fresh_cached_object(s3: S3Resource, s3_file_key: str):
+    """
+    Return an object from the first cache tier holding a fresh copy, or None
+    """
+    cache_key = (s3.bucket_name, s3_file_key)
+    for cache_tier in CACHE_TIERS:
+        cached = cache_tier.get(cache_key)
+        if cached is not None and cached[1]:
+            return cached[0]
+    return None
+
+def load_metadata(s3: S3Resource, s3_file_key: str):
+    """
+    Return the metadata of an object from a fresh cache entry, the metadata index, or a HeadObject.
+    An index entry without a content type is not enough to build headers matching a GET, the
+    HeadObject answer is then recorded in the index for the next requests.
+    """
+    s3_metadata = get_fresh_cached_object(s3, s3_file_key)
+    if s3_metadata is not None:
+        return s3_metadata
+    indexed = METADATA_INDEX.lookup(s3_file_key) if METADATA_INDEX is not None else None
+    if indexed is not None and indexed.content_type is not None:
+        return indexed
+    s3_metadata = head_object(s3, s3_file_key)
+    if indexed is not None:
+        METADATA_INDEX.update(s3_file_key, s3_metadata.content_length, s3_metadata.etag,
+                              s3_metadata.last_modified, s3_metadata.content_type)
+    return s3_metadata
+
+def remember_large_object(s3: S3Resource, s3_file_key: str, size: int):
+    """
+    Record the size of an object found over REDIRECT_THRESHOLD_BYTES
+    """
+    with _LARGE_OBJECTS_LOCK:
+        LARGE_OBJECTS[(s3.bucket_name, s3_file_key)] = (size, monotonic())
+        LARGE_OBJECTS.move_to_end((s3.bucket_name, s3_file_key))
+        if len(LARGE_OBJECTS) > LARGE_OBJECTS_SIZE:
+            LARGE_OBJECTS.popitem(last = False)
+
+def known_object_size(s3: S3Resource, s3_file_key: str):
+    """
+    Size of an object known without calling S3: remembered as too large while a cached object
+    would still be fresh, or listed by the metadata index. None when unknown.
+    """
+    with _LARGE_OBJECTS_LOCK:
+        remembered = LARGE_OBJECTS.get((s3.bucket_name, s3_file_key))
+    if remembered is not None and monotonic() - remembered[1] < OBJECT_CACHE.ttl_seconds:
+        return remembered[0]
+    if METADATA_INDEX is not None:
+        s3_metadata = METADATA_INDEX.lookup(s3_file_key)
+        if s3_metadata is not None:
+            return s3_metadata.content_length
+    return None
+
+def is_too_large(size) -> bool:
+    """
+    True when a body of this size must be redirected rather than returned through ALB
+    """
+    return bool(REDIRECT_THRESHOLD_BYTES) and size is not None and size > REDIRECT_THRESHOLD_BYTES
+
+def object_exists(s3: S3Resource, s3_file_key: str) -> bool:
+    """
+    True when an object exists, answered by the metadata index when it knows the key
+    """
+    if METADATA_INDEX is not None:
+        if METADATA_INDEX.lookup(s3_file_key) is not None:
+            return True
+        if METADATA_INDEX.is_missing(s3_file_key):
+            return False
+    try:
+        head_object(s3, s3_file_key)
+    except ClientError:
+        return False
+    return True
+
+def head_response(s3: S3Resource, s3_file_key: str) -> dict:
+    """
+    200 response of a HEAD request: the headers of the stored object with an empty body, from a
+    fresh cache entry, the metadata index or a HeadObject, never a GetObject
+    """
+    s3_metadata = load_metadata(s3, s3_file_key)
+    content_length = s3_metadata.content_length
+    if content_length is None and s3_metadata.body is not None:
+        content_length = len(s3_metadata.body)
+    current_metrics().set('ObjectSize', content_length)
+    response_headers = object_headers(s3_metadata, s3_file_key)
+    response_headers['Content-Length'] = str(content_length)
+    return {
+        "headers": response_headers,
+        "isBase64Encoded": False,
+        "statusCode": 200,
+        "body": ""
+    }
+
+def validator_headers(s3_object) -> dict:
+    """
+    ETag and Last-Modified response headers of an object
+    """
+    headers = {}
+    if s3_object.etag:
+        headers['ETag'] = s3_object.etag
+    if s3_object.last_modified:
+        headers['Last-Modified'] = format_http_date(s3_object.last_modified)
+    return headers
+
+def object_headers(s3_object, s3_file_key: str, content_encoding: str = None) -> dict:
+    """
+    Response headers of a 200 or 206 response for an object
+    """
+    headers = {
+        "Content-Type": s3_object.content_type,
+        'Access-Control-Allow-Origin': '*',
+        'Accept-Ranges': 'bytes',
+        **CACHE_POLICY.headers_for(s3_file_key, s3_object.content_type),
+        **validator_headers(s3_object)
+    }
+    if is_compressible(s3_object.content_type):
+        merge_vary(headers, 'Accept-Encoding')
+    if is_transcodable(s3_object.content_type):
+        merge_vary(headers, 'Accept')
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    return headers
+
+def not_modified_etag(headers: dict, s3_metadata):
+    """
+    Return the ETag of the representation the client already holds, or None when it is outdated.
+    Encoded representations carry their own ETag, so each one the function may serve is checked.
+    """
+    etags = [s3_metadata.etag]
+    if s3_metadata.etag and is_compressible(s3_metadata.content_type):
+        etags.extend(variant_etag(s3_metadata.etag, coding) for coding in PREFERRED_CODINGS)
+    for etag in etags:
+        if is_not_modified(headers, etag, s3_metadata.last_modified):
+            return etag
+    return None
+
+def find_precompressed_codings(s3: S3Resource, s3_file_key: str, etag: str) -> list:
+    """
+    Codings of the precompressed siblings (key.br, key.gz) uploaded next to an object
+    """
+    index_key = (s3.bucket_name, s3_file_key, etag)
+    with _PRECOMPRESSED_LOCK:
+        codings = PRECOMPRESSED_INDEX.get(index_key)
+        if codings is not None:
+            PRECOMPRESSED_INDEX.move_to_end(index_key)
+            return codings
+    codings = []
+    for coding in PREFERRED_CODINGS:
+        if object_exists(s3, s3_file_key + SIBLING_SUFFIXES[coding]):
+            codings.append(coding)
+    with _PRECOMPRESSED_LOCK:
+        PRECOMPRESSED_INDEX[index_key] = codings
+        if len(PRECOMPRESSED_INDEX) > PRECOMPRESSED_INDEX_SIZE:
+            PRECOMPRESSED_INDEX.popitem(last = False)
+    return codings
+
+def load_encoded_variant(s3: S3Resource, s3_file_key: str, s3_object, headers: dict):
+    """
+    Return (s3_object, content_encoding, source_etag) for the best representation the client accepts:
+    a precompressed sibling object, a cached on-the-fly compression, or the object itself.
+    Siblings are served under the variant ETag of the object, so they revalidate like compressions;
+    source_etag is then the sibling's own ETag, None for the other representations.
+    """
+    if not is_compressible(s3_object.content_type):
+        return s3_object, None, None
+    accepted = parse_accept_encoding(get_header(headers, 'accept-encoding'))
+    if not accepted:
+        return s3_object, None, None
+    if PRECOMPRESSED_SIBLINGS:
+        for coding in acceptable_codings(accepted, find_precompressed_codings(s3, s3_file_key, s3_object.etag)):
+            sibling_key = s3_file_key + SIBLING_SUFFIXES[coding]
+            try:
+                sibling = load_object(s3, sibling_key)
+            except ClientError as sibling_error:
+                if not is_missing_key(sibling_error):
+                    raise
+                logger.warning("Precompressed sibling '%s' of object '%s' is gone from Bucket '%s'.",
+                               sibling_key, s3_file_key, s3.bucket_name)
+                with _PRECOMPRESSED_LOCK:
+                    PRECOMPRESSED_INDEX.pop((s3.bucket_name, s3_file_key, s3_object.etag), None)
+                continue
+            return S3Object(body = sibling.body,
+                            content_type = s3_object.content_type,
+                            content_length = len(sibling.body),
+                            etag = variant_etag(s3_object.etag, coding),
+                            last_modified = s3_object.last_modified), coding, sibling.etag
+    if len(s3_object.body) < COMPRESSION_MIN_BYTES:
+        return s3_object, None, None
+    for coding in acceptable_codings(accepted, compression_codings()):
+        cache_key = (s3.bucket_name, s3_file_key, coding, s3_object.etag)
+        cached = OBJECT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached[0], coding, None
+        compressed_body = compress(s3_object.body, coding)
+        if len(compressed_body) >= len(s3_object.body):
+            return s3_object, None, None
+        variant = S3Object(body = compressed_body,
+                           content_type = s3_object.content_type,
+                           content_length = len(compressed_body),
+                           etag = variant_etag(s3_object.etag, coding),
+                           last_modified = s3_object.last_modified)
+        OBJECT_CACHE.put(cache_key, variant)
+        return variant, coding, None
+    return s3_object, None, None
+
+def load_derivative(s3: S3Resource, s3_file_key: str, derived_file_key: str, image_format: str, width: int):
+    """
+    Return an image derivative from the cache tiers or the derived prefix of the bucket. On a miss
+    the source is transcoded once, and the result is written back to the bucket and cached. None
+    when the source is over REDIRECT_THRESHOLD_BYTES or IMAGE_MAX_PIXELS, the original is served.
+    """
+    try:
+        return load_object(s3, derived_file_key)
+    except ClientError as missing_error:
+        if not is_missing_key(missing_error):
+            raise
+    source = load_object(s3, s3_file_key, max_body_bytes = REDIRECT_THRESHOLD_BYTES)
+    if source.body is None:
+        remember_large_object(s3, s3_file_key, source.content_length)
+        return None
+    try:
+        body = transcode(source.body, image_format, width)
+    except ImageTooLargeError as size_error:
+        logger.warning("Not transcoding object '%s': '%s'.", s3_file_key, str(size_error))
+        return None
+    derived_object = S3Object(body = body,
+                              content_type = FORMAT_CONTENT_TYPES[image_format],
+                              content_length = len(body),
+                              etag = '"%s"' % md5(body).hexdigest(),
+                              last_modified = datetime.now(timezone.utc))
+    try:
+        s3.client.put_object(Bucket = s3.bucket_name, Key = derived_file_key, Body = body,
+                             ContentType = derived_object.content_type)
+    except ClientError as write_error:
+        logger.warning("Unable to store derivative '%s' in Bucket '%s': '%s'.",
+                       derived_file_key, s3.bucket_name, str(write_error))
+    for cache_tier in CACHE_TIERS:
+        cache_tier.put((s3.bucket_name, derived_file_key), derived_object)
+    logger.info("Transcoded object '%s' to '%s' (%d -> %d bytes).",
+                s3_file_key, derived_file_key, source.content_length or len(source.body), len(body))
+    return derived_object
+
+def get_image_variant_response(s3: S3Resource, s3_file_key: str, headers: dict, query: dict):
+    """
+    Serve a WebP or AVIF derivative of a JPEG or PNG to clients accepting it, or a narrower copy
+    for a 'w' query parameter. Returns None when the original should be served instead.
+    """
+    image_format = negotiate_format(get_header(headers, 'accept'))
+    width = parse_width(query)
+    if (image_format is None and width is None) or guess_type(s3_file_key)[0] not in TRANSCODABLE_TYPES:
+        return None
+    s3_metadata = load_metadata(s3, s3_file_key)
+    source_format = TRANSCODABLE_TYPES.get((s3_metadata.content_type or '').split(';', 1)[0].strip().lower())
+    if source_format is None or not s3_metadata.etag or is_too_large(s3_metadata.content_length):
+        return None
+    image_format = image_format or source_format
+    if image_format == source_format and width is None:
+        return None
+    derived_file_key = derived_key(s3_file_key, s3_metadata.etag, image_format, width)
+    derived_object = IN_FLIGHT.do((s3.bucket_name, derived_file_key, 'derive'), lambda: load_derivative(
+        s3, s3_file_key, derived_file_key, image_format, width))[0]
+    if derived_object is None:
+        return None
+    if REDIRECT_THRESHOLD_BYTES and len(derived_object.body) > REDIRECT_THRESHOLD_BYTES:
+        return None
+    if width is None and s3_metadata.content_length and len(derived_object.body) >= s3_metadata.content_length:
+        return None
+
+    if is_not_modified(headers, derived_object.etag, derived_object.last_modified):
+        response_headers = derivative_headers(derived_object, s3_file_key)
+        response_headers.pop('Content-Type', None)
+        return {
+            "headers": response_headers,
+            "isBase64Encoded": False,
+            "statusCode": 304,
+            "body": ""
+        }
+    current_metrics().set('ObjectSize', len(derived_object.body))
+    logger.info("Successfully retreived derivative '%s' from Bucket '%s'.", derived_file_key, s3.bucket_name)
+    return build_object_response(s3, s3_file_key, derived_object,
+                                 variant = derived_file_key.rsplit('/', 1)[1],
+                                 build_headers = lambda: derivative_headers(derived_object, s3_file_key))
+
+def derivative_headers(derived_object, s3_file_key: str) -> dict:
+    """
+    Response headers of an image derivative, which Range requests do not apply to
+    """
+    response_headers = object_headers(derived_object, s3_file_key)
+    response_headers.pop('Accept-Ranges', None)
+    merge_vary(response_headers, 'Accept')
+    return response_headers
+
+def build_object_response(s3: S3Resource, s3_file_key: str, s3_object, content_encoding: str = None,
+                          variant: str = None, build_headers = None, source_etag: str = None) -> dict:
+    """
+    200 response of a representation. The encoded body and headers are cached in the memory tier,
+    sharing its byte budget, keyed by key, representation ETag, coding and variant, so warm hits
+    skip encoding. Only a policy Expires header is recomputed on a hit. source_etag is the ETag of
+    the object the body was read from when the representation ETag does not follow it, such as a
+    precompressed sibling, so a re-uploaded sibling is not answered from an older entry.
+    """
+    metrics = current_metrics()
+    cache_key = (s3.bucket_name, s3_file_key, 'response', s3_object.etag, content_encoding, variant, source_etag)
+    encoded = OBJECT_CACHE.peek(cache_key) if s3_object.etag else None
+    if encoded is not None:
+        metrics.set('CacheTier', 'response')
+        response_headers = dict(encoded.headers)
+        if 'Expires' in response_headers:
+            response_headers.update(CACHE_POLICY.headers_for(s3_file_key, s3_object.content_type))
+    else:
+        with metrics.phase('Encode'):
+            body, is_base64_encoded = encode_body(s3_object.body, s3_object.content_type, content_encoding)
+        with metrics.phase('ResponseBuild'):
+            response_headers = (build_headers() if build_headers is not None
+                                else object_headers(s3_object, s3_file_key, content_encoding))
+        encoded = EncodedResponse(body, is_base64_encoded, response_headers)
+        if s3_object.etag:
+            OBJECT_CACHE.put(cache_key, encoded)
+        response_headers = dict(response_headers)
+    return {
+        "headers": response_headers,
+        "isBase64Encoded": encoded.is_base64_encoded,
+        "statusCode": 200,
+        "body": encoded.body
+    }
+
+def range_not_satisfiable_response(size) -> dict:
+    """
+    416 response for a Range request that does not overlap the object
+    """
+    return {
+        "headers": {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Range': "bytes */%s" % size
+        },
+        "isBase64Encoded": False,
+        "statusCode": 416,
+        "body": ""
+    }
+
+def get_range_response(s3: S3Resource, s3_file_key: str, range_specs: list, headers: dict):
+    """
+    Build a 206 or 416 response for a Range request. A single range is passed through as a
+    ranged GetObject, multiple ranges become a multipart/byteranges body. Ranges spanning more
+    than REDIRECT_THRESHOLD_BYTES are redirected to a presigned URL, which S3 serves ranged too.
+    Returns None when If-Range no longer matches and the whole object must be served instead.
+    """
+    cached = get_fresh_cached_object(s3, s3_file_key)
+    if get_header(headers, 'if-range') is not None:
+        s3_metadata = cached or load_metadata(s3, s3_file_key)
+        if not if_range_matches(headers, s3_metadata.etag, s3_metadata.last_modified):
+            return None
+    head_metadata = None
+    requested_bytes = max_range_bytes(range_specs)
+    if cached is None and REDIRECT_THRESHOLD_BYTES and (requested_bytes is None or is_too_large(requested_bytes)):
+        size = known_object_size(s3, s3_file_key)
+        if size is None:
+            head_metadata = head_object(s3, s3_file_key)
+            size = head_metadata.content_length
+            if is_too_large(size):
+                remember_large_object(s3, s3_file_key, size)
+        if is_too_large(sum(end + 1 - start for start, end in resolve_ranges(range_specs, size))):
+            logger.info("Redirecting to a presigned URL for %d range(s) of object '%s' from Bucket '%s'.",
+                        len(range_specs), s3_file_key, s3.bucket_name)
+            return redirect_response(s3, s3_file_key)
+    if cached is not None:
+        s3_metadata = cached
+        size = len(cached.body)
+        parts = [(start, end, cached.body[start:end + 1])
+                 for start, end in resolve_ranges(range_specs, size)]
+    elif len(range_specs) == 1:
+        try:
+            s3_metadata, start, end = fetch_range(s3, s3_file_key, format_range_spec(*range_specs[0]))
+        except ClientError as range_error:
+            if range_error.response.get('Error', {}).get('Code') != 'InvalidRange':
+                raise
+            return range_not_satisfiable_response(
+                range_error.response['Error'].get('ActualObjectSize', '*'))
+        size = s3_metadata.content_length
+        parts = [(start, end, s3_metadata.body)]
+    else:
+        s3_metadata = head_metadata or head_object(s3, s3_file_key)
+        size = s3_metadata.content_length
+        parts = []
+        for start, end in resolve_ranges(range_specs, size):
+            ranged_object, start, end = fetch_range(s3, s3_file_key, format_range_spec(start, end))
+            parts.append((start, end, ranged_object.body))
+    if not parts:
+        return range_not_satisfiable_response(size)
+
+    response_headers = object_headers(s3_metadata, s3_file_key)
+    if len(parts) == 1:
+        start, end, body = parts[0]
+        response_headers['Content-Range'] = "bytes %d-%d/%d" % (start, end, size)
+    else:
+        from uuid import uuid4
+        boundary = uuid4().hex
+        body = build_multipart_byteranges(parts, s3_metadata.content_type, size, boundary)
+        response_headers['Content-Type'] = "multipart/byteranges; boundary=%s" % boundary
+    logger.info("Successfully retreived %d range(s) of object '%s' from Bucket '%s'.",
+                len(parts), s3_file_key, s3.bucket_name)
+    metrics = current_metrics()
+    metrics.set('ObjectSize', len(body))
+    with metrics.phase('Encode'):
+        body = encode_base64(body)
+    return {
+        "headers": response_headers,
+        "isBase64Encoded": True,
+        "statusCode": 206,
+        "body": body
+    }
+
+def redirect_response(s3: S3Resource, s3_file_key: str) -> dict:
+    """
+    Redirect to a short-lived presigned S3 URL for an object too large to return through ALB
+    """
+    return {
+        "headers": {
+            'Location': PRESIGNED_URLS.get_url(s3, s3_file_key),
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-store'
+        },
+        "isBase64Encoded": False,
+        "statusCode": REDIRECT_STATUS_CODE,
+        "body": ""
+    }
+
+def known_missing(s3: S3Resource, s3_file_key: str):
+    """
+    Message of a 404 for a key the negative cache or the metadata index knows is missing, or None
+    """
+    missing_message = NEGATIVE_CACHE.get((s3.bucket_name, s3_file_key))
+    if missing_message is not None:
+        current_metrics().set('CacheTier', 'negative')
+        logger.info("Object '%s' from Bucket '%s' is known to be missing.", s3_file_key, s3.bucket_name)
+        return missing_message
+    if METADATA_INDEX is not None and METADATA_INDEX.is_missing(s3_file_key):
+        current_metrics().set('CacheTier', 'index')
+        logger.info("Object '%s' from Bucket '%s' is not in the metadata index.", s3_file_key, s3.bucket_name)
+        return "The specified key does not exist."
+    return None
+
+def remember_missing(s3: S3Resource, s3_file_key: str, missing_error: ClientError):
+    """
+    Negative-cache a key S3 reported missing. Errors naming another key, such as a sibling, are ignored.
+    """
+    if missing_error.response.get('Error', {}).get('Key', s3_file_key) == s3_file_key:
+        NEGATIVE_CACHE.put((s3.bucket_name, s3_file_key), str(missing_error))
+
+def load_bundled_object(s3: S3Resource, s3_file_key: str):
+    """
+    Load one key of a bundle, answering missing keys from the negative cache and the metadata index
+    like single requests, and recording the keys S3 reports missing
+    """
+    missing_message = known_missing(s3, s3_file_key)
+    if missing_message is not None:
+        raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': missing_message, 'Key': s3_file_key},
+                           'ResponseMetadata': {'HTTPStatusCode': 404}}, 'GetObject')
+    try:
+        return load_object(s3, s3_file_key, max_body_bytes = REDIRECT_THRESHOLD_BYTES)
+    except ClientError as missing_error:
+        if is_missing_key(missing_error):
+            remember_missing(s3, s3_file_key, missing_error)
+        raise
+
+def get_bundle_from_s3(s3: S3Resource, event: dict) -> dict:
+    """
+    Serve several objects in one response, fetched concurrently on a bounded thread pool
+    sharing the S3 client and the cache tiers
+    """
+    try:
+        keys = parse_bundle_keys(event)
+    except BundleRequestError as request_error:
+        return {
+            "statusCode": 400,
+            "body": "Invalid request: " + str(request_error)
+        }
+    entries = load_bundle(keys, s3.request_counter.propagate(
+        lambda s3_file_key: load_bundled_object(s3, s3_file_key)))
+    logger.info("Successfully bundled %d of %d objects from Bucket '%s'.",
+                sum(1 for entry in entries.values() if entry["status"] == 200), len(keys), s3.bucket_name)
+    return build_bundle_response(entries, wants_zip(event))
+
+def served_etag(s3: S3Resource, s3_file_key: str, response: dict):
+    """
+    ETag of the object a response was built from: the fresh cached copy a fetch left, else the
+    metadata index entry a 304 or HEAD was answered from. A range response carries it itself.
+    None when it is not known.
+    """
+    s3_metadata = get_fresh_cached_object(s3, s3_file_key)
+    if s3_metadata is None and METADATA_INDEX is not None:
+        s3_metadata = METADATA_INDEX.lookup(s3_file_key)
+    if s3_metadata is not None:
+        return s3_metadata.etag
+    if response.get('statusCode') == 206:
+        return response['headers'].get('ETag')
+    return None
+
+def get_fingerprinted_data(s3: S3Resource, event: dict, static_path: str, s3_file_key: str,
+                           requested_hash: str, current_hash: str) -> dict:
+    """
+    Serve '<hash>/<key>' as immutable when the hash is current, else redirect to the current URL.
+    The hash is checked against the ETag the response was built from: an object overwritten since
+    the manifest was built, or one whose ETag is not known, keeps its normal Cache-Control.
+    """
+    if requested_hash != current_hash:
+        query = '&'.join('%s=%s' % parameter for parameter in (event.get('queryStringParameters') or {}).items())
+        return {
             "headers": {
-                "Content-Type": content_type,
+                'Location': "%s%s/%s%s" % (static_path, current_hash, s3_file_key, '?' + query if query else ''),
                 'Access-Control-Allow-Origin': '*',
-                'Cache-Control': 'no-store'
+                'Cache-Control': 'no-cache'
             },
-            "isBase64Encoded": True,
-            "statusCode": 200,
-            "body": body
+            "isBase64Encoded": False,
+            "statusCode": 302,
+            "body": ""
         }
+    response = get_data_from_s3(s3 = s3, s3_file_key = s3_file_key, headers = event.get('headers') or {},
+                                query = event.get('queryStringParameters') or {},
+                                method = request_method(event))
+    if response.get('statusCode') in (200, 206, 304):
+        etag = served_etag(s3, s3_file_key, response)
+        if not etag or fingerprint(etag) != requested_hash:
+            if etag:
+                logger.warning("Object '%s' no longer matches fingerprint '%s', the manifest is outdated.",
+                               s3_file_key, requested_hash)
+            return response
+        response['headers'].pop('Expires', None)
+        response['headers']['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def get_data_from_s3( s3: S3Resource,
+                         s3_file_key: str,
+                         headers: dict = None,
+                         query: dict = None,
+                         method: str = 'GET'):
+    response = {}
+    metrics = current_metrics()
+    metrics.set('Key', s3_file_key)
+    try:
+        missing_message = known_missing(s3, s3_file_key)
+        if missing_message is not None:
+            response['body'] = "Not Found: " + missing_message
+            response['statusCode'] = 404
+            return response
+        if has_conditional_headers(headers):
+            s3_metadata = load_metadata(s3, s3_file_key)
+            matched_etag = not_modified_etag(headers, s3_metadata)
+            if matched_etag is not None:
+                logger.info(
+                    "Object '%s' from Bucket '%s' not modified.", s3_file_key, s3.bucket_name)
+                response_headers = {
+                    'Access-Control-Allow-Origin': '*',
+                    **CACHE_POLICY.headers_for(s3_file_key, s3_metadata.content_type),
+                    **validator_headers(s3_metadata)
+                }
+                response_headers['ETag'] = matched_etag
+                if is_compressible(s3_metadata.content_type):
+                    merge_vary(response_headers, 'Accept-Encoding')
+                if is_transcodable(s3_metadata.content_type):
+                    merge_vary(response_headers, 'Accept')
+                response = {
+                    "headers": response_headers,
+                    "isBase64Encoded": False,
+                    "statusCode": 304,
+                    "body": ""
+                }
+                return response
+        if method == 'HEAD':
+            response = head_response(s3, s3_file_key)
+            return response
+        range_specs = parse_range_header(get_header(headers, 'range', ''))
+        if range_specs is not None:
+            range_response = get_range_response(s3, s3_file_key, range_specs, headers)
+            if range_response is not None:
+                response = range_response
+                return response
+        image_response = get_image_variant_response(s3, s3_file_key, headers, query)
+        if image_response is not None:
+            response = image_response
+            return response
+        known_size = known_object_size(s3, s3_file_key)
+        if is_too_large(known_size) and not is_cached(s3, s3_file_key):
+            metrics.set('ObjectSize', known_size)
+            logger.info("Redirecting to a presigned URL for object '%s' of %s bytes from Bucket '%s'.",
+                        s3_file_key, known_size, s3.bucket_name)
+            response = redirect_response(s3, s3_file_key)
+            return response
+        s3_object = load_object(s3, s3_file_key, max_body_bytes = REDIRECT_THRESHOLD_BYTES)
+        metrics.set('ObjectSize', s3_object.content_length if s3_object.body is None else len(s3_object.body))
+        if s3_object.body is None or is_too_large(len(s3_object.body)):
+            remember_large_object(s3, s3_file_key, s3_object.content_length)
+            logger.info("Redirecting to a presigned URL for object '%s' of %s bytes from Bucket '%s'.",
+                        s3_file_key, s3_object.content_length, s3.bucket_name)
+            response = redirect_response(s3, s3_file_key)
+            return response
+        s3_object, content_encoding, source_etag = load_encoded_variant(s3, s3_file_key, s3_object, headers)
+        logger.info(
+            "Successfully retreived object '%s' from Bucket '%s'.", s3_file_key, s3.bucket_name)
+        response = build_object_response(s3, s3_file_key, s3_object, content_encoding, source_etag = source_etag)
 
     except ClientError as index_error:
-        logger.exception("Exception is thrown for object '%s' from Bucket '%s': '%s'.", 
-                         s3_file_key, s3.bucket_name, str(index_error))
+        if is_missing_key(index_error):
+            remember_missing(s3, s3_file_key, index_error)
+            logger.info("Object '%s' not found in Bucket '%s': '%s'.", s3_file_key, s3.bucket_name, str(index_error))
+        else:
+            logger.exception("Exception is thrown for object '%s' from Bucket '%s': '%s'.", 
+                             s3_file_key, s3.bucket_name, str(index_error))
         response['body'] = "Not Found: " + str(index_error)
         response['statusCode'] = 404
     except Exception as other_error:               
@@ -68,5 +971,24 @@ def get_data_from_s3( s3: S3Resource,
         response['body'] = "ERROR: " + str(other_error)
         response['statusCode'] = 500
     finally:
-        logger.debug("Return Response is '%s'", response)
-        return response
\ No newline at end of file
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Object cache stats '%s', disk cache stats '%s', negative cache stats '%s', "
+                         "S3 call stats '%s', first request stats '%s', hedged read stats '%s'",
+                         OBJECT_CACHE.stats(), DISK_CACHE.stats(), NEGATIVE_CACHE.stats(),
+                         s3.request_counter.stats(), FIRST_REQUESTS.stats(),
+                         s3.hedged_reads.stats() if s3.hedged_reads is not None else None)
+            logger.debug("Return Response is '%s' with a body of %d characters",
+                         {name: value for name, value in response.items() if name != 'body'},
+                         len(response.get('body') or ''))
+        return response
+
+# Logical key -> content hash map resolving '/static/<hash>/<key>' URLs, loaded on first use.
+FINGERPRINTS = FingerprintManifest.from_environ(get_s3_resource, read_manifest)
+
+# Measured init costs of this execution environment, reported on the cold start.
+INIT_TIMINGS = {'import_seconds': perf_counter() - _IMPORT_STARTED, 'client_init_seconds': 0.0}
+# Build the client in the init phase, which runs before the first request is received.
+if environ.get('S3_BUCKET_NAME'):
+    get_s3_resource()
+start_prewarm()
+start_metadata_index()
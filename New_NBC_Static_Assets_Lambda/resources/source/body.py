@@ -0,0 +1,79 @@
+import binascii
+from botocore.exceptions import IncompleteReadError
+
+TEXT_TYPES = frozenset((
+    'application/javascript',
+    'application/json',
+    'application/ld+json',
+    'application/manifest+json',
+    'application/xml',
+    'application/xhtml+xml',
+    'application/rss+xml',
+    'image/svg+xml'
+))
+
+class EncodedResponse:
+    """
+    Encoded body and headers of a 200 response, cached so warm hits skip encoding. The body str
+    is referenced by every response built from it, never copied.
+    """
+    __slots__ = ('body', 'is_base64_encoded', 'headers')
+
+    def __init__(self, body: str, is_base64_encoded: bool, headers: dict):
+        self.body = body
+        self.is_base64_encoded = is_base64_encoded
+        self.headers = headers
+
+def read_body(stream, content_length: int = None):
+    """
+    Read a GetObject body with readinto into one buffer presized from ContentLength, instead
+    of concatenating chunks. Returns a read-only memoryview so cached bodies cannot be mutated.
+    """
+    if content_length is None:
+        return stream.read()
+    buffer = bytearray(content_length)
+    view = memoryview(buffer)
+    offset = 0
+    while offset < content_length:
+        amount_read = stream.readinto(view[offset:])
+        if not amount_read:
+            raise IncompleteReadError(actual_bytes = offset, expected_bytes = content_length)
+        offset += amount_read
+    return view.toreadonly()
+
+def encode_base64(body) -> str:
+    """
+    Base64-encode a body, buffer or memoryview alike, and return it as a str, the type the
+    Lambda runtime serializes without another conversion. One b2a_base64 call over the whole
+    buffer: benchmarks/body_pipeline.py shows chunked encoding into a preallocated output is
+    slower and does not lower the peak, the final str copy is needed either way.
+    """
+    return binascii.b2a_base64(body, newline = False).decode('ascii')
+
+def is_text(content_type: str) -> bool:
+    """
+    True for UTF-8 (or unspecified charset) text content types that ALB can carry without base64
+    """
+    if not content_type:
+        return False
+    media_type, _, parameters = content_type.partition(';')
+    media_type = media_type.strip().lower()
+    if not media_type.startswith('text/') and media_type not in TEXT_TYPES:
+        return False
+    for parameter in parameters.split(';'):
+        name, _, value = parameter.partition('=')
+        if name.strip().lower() == 'charset' and value.strip().strip('"').lower() not in ('utf-8', 'utf8', 'us-ascii'):
+            return False
+    return True
+
+def encode_body(body, content_type: str, content_encoding: str = None):
+    """
+    Return (body, is_base64_encoded) for an ALB response: the raw text of an unencoded
+    text object, otherwise its base64 encoding
+    """
+    if content_encoding is None and is_text(content_type):
+        try:
+            return str(body, 'utf-8'), False
+        except UnicodeDecodeError:
+            pass
+    return encode_base64(body), True
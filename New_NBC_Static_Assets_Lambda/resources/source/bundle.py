@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from threading import Lock
+from urllib.parse import unquote
+import base64
+import binascii
+import io
+import json
+import logging
+from botocore.exceptions import ClientError
+from body import encode_base64
+from http_utils import get_header
+
+logger = logging.getLogger()
+
+BUNDLE_KEY = '_bundle'
+BUNDLE_MAX_KEYS = int(environ.get('BUNDLE_MAX_KEYS', 50))
+BUNDLE_MAX_WORKERS = int(environ.get('BUNDLE_MAX_WORKERS', 8))
+# Bodies beyond this budget are reported with status 413, ALB rejects responses over 1 MB.
+BUNDLE_MAX_BYTES = int(environ.get('BUNDLE_MAX_BYTES', 700 * 1024))
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = Lock()
+
+class BundleRequestError(ValueError):
+    """
+    Raised for a bundle request that does not list its keys correctly
+    """
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the bounded thread pool shared by every bundle request, built on first use
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers = BUNDLE_MAX_WORKERS,
+                                               thread_name_prefix = 'bundle')
+    return _EXECUTOR
+
+def parse_bundle_keys(event: dict) -> list:
+    """
+    Read the requested keys from a 'keys=a,b,c' query string parameter, or from a POST body
+    holding a JSON list of keys or {"keys": [...]}. Duplicates are dropped, order is kept.
+    """
+    query_keys = (event.get('queryStringParameters') or {}).get('keys')
+    if query_keys:
+        keys = [unquote(key) for key in query_keys.split(',')]
+    elif event.get('body'):
+        body = event['body']
+        try:
+            if event.get('isBase64Encoded'):
+                body = base64.b64decode(body, validate = True)
+            payload = json.loads(body)
+        except binascii.Error:
+            raise BundleRequestError("Bundle body is not valid base64")
+        except ValueError:
+            raise BundleRequestError("Bundle body must be JSON")
+        keys = payload.get('keys') if isinstance(payload, dict) else payload
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            raise BundleRequestError("Bundle body must list the keys as strings")
+    else:
+        raise BundleRequestError("Bundle request lists no keys")
+    keys = list(dict.fromkeys(key.strip().lstrip('/') for key in keys if key.strip()))
+    if not keys:
+        raise BundleRequestError("Bundle request lists no keys")
+    if len(keys) > BUNDLE_MAX_KEYS:
+        raise BundleRequestError("Bundle request lists more than %d keys" % BUNDLE_MAX_KEYS)
+    return keys
+
+def wants_zip(event: dict) -> bool:
+    """
+    True when the client asks for a zip archive instead of the JSON map
+    """
+    query_format = (event.get('queryStringParameters') or {}).get('format')
+    if query_format:
+        return query_format.lower() == 'zip'
+    return 'application/zip' in (get_header(event.get('headers'), 'accept') or '')
+
+def _load_entry(load_object, s3_file_key: str) -> dict:
+    try:
+        s3_object = load_object(s3_file_key)
+    except ClientError as client_error:
+        status_code = client_error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 404)
+        return {"status": status_code if status_code >= 400 else 404,
+                "error": client_error.response.get('Error', {}).get('Code', 'NotFound')}
+    except Exception as other_error:
+        logger.exception("Exception is thrown for bundled object '%s'.", s3_file_key)
+        return {"status": 500, "error": str(other_error)}
+    if s3_object.body is None:
+        return {"status": 413, "error": "Object too large to bundle"}
+    return {"status": 200, "object": s3_object}
+
+def load_bundle(keys: list, load_object) -> dict:
+    """
+    Load every key concurrently on the shared thread pool. Each entry holds its own status,
+    so a missing or failing key never fails the whole bundle.
+    """
+    executor = get_executor()
+    futures = [(key, executor.submit(_load_entry, load_object, key)) for key in keys]
+    entries = {}
+    remaining_bytes = BUNDLE_MAX_BYTES
+    for key, future in futures:
+        entry = future.result()
+        if entry["status"] == 200:
+            size = len(entry["object"].body)
+            if size > remaining_bytes:
+                entry = {"status": 413, "error": "Bundle size limit reached"}
+            else:
+                remaining_bytes -= size
+        entries[key] = entry
+    return entries
+
+def build_bundle_response(entries: dict, as_zip: bool) -> dict:
+    """
+    Build the ALB response of a bundle, a JSON map of base64 bodies or a zip archive
+    holding the objects and a _status.json with every key's status
+    """
+    statuses = {}
+    for key, entry in entries.items():
+        status = {"status": entry["status"]}
+        if entry["status"] == 200:
+            s3_object = entry["object"]
+            status.update({"content_type": s3_object.content_type, "etag": s3_object.etag,
+                           "length": len(s3_object.body)})
+        else:
+            status["error"] = entry["error"]
+        statuses[key] = status
+
+    if as_zip:
+        import zipfile
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zip_file:
+            for key, entry in entries.items():
+                if entry["status"] == 200:
+                    zip_file.writestr(key, bytes(entry["object"].body))
+            zip_file.writestr('_status.json', json.dumps(statuses))
+        return {
+            "headers": {
+                "Content-Type": "application/zip",
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': 'no-store'
+            },
+            "isBase64Encoded": True,
+            "statusCode": 200,
+            "body": encode_base64(archive.getbuffer())
+        }
+
+    for key, entry in entries.items():
+        if entry["status"] == 200:
+            statuses[key]["body"] = encode_base64(entry["object"].body)
+    return {
+        "headers": {
+            "Content-Type": "application/json",
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-store'
+        },
+        "isBase64Encoded": False,
+        "statusCode": 200,
+        "body": json.dumps({"objects": statuses})
+    }
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from os import environ
+from threading import Lock
+import logging
+import time
+
+logger = logging.getLogger()
+
+DEFAULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_CACHE_TTL_SECONDS = 60
+
+class _CacheEntry:
+    """
+    Cached S3 object, or any value with a body, with the time it was last validated against S3
+    """
+    __slots__ = ('s3_object', 'size', 'validated_at')
+
+    def __init__(self, s3_object, validated_at):
+        self.s3_object = s3_object
+        self.size = len(s3_object.body)
+        self.validated_at = validated_at
+
+class ObjectCache:
+    """
+    In-memory LRU cache of S3 objects, bounded by the total size of the cached bodies
+    """
+    tier_name = 'memory'
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, clock=time.monotonic):
+        """
+        Initialize an empty cache, a max_bytes of 0 disables caching
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Build the cache from the CACHE_MAX_BYTES and CACHE_TTL_SECONDS environment variables
+        """
+        return cls(max_bytes = int(environ.get('CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)),
+                   ttl_seconds = float(environ.get('CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL_SECONDS)))
+
+    def contains(self, cache_key) -> bool:
+        """
+        True when a key is cached, fresh or stale, without counting a hit or a miss
+        """
+        with self._lock:
+            return cache_key in self._entries
+
+    def get(self, cache_key):
+        """
+        Return (s3_object, is_fresh) for a cached key, or None on a miss.
+        A stale entry must be revalidated by the caller.
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            if self._clock() - entry.validated_at < self.ttl_seconds:
+                self.hits += 1
+                return entry.s3_object, True
+            self.revalidations += 1
+            return entry.s3_object, False
+
+    def peek(self, cache_key):
+        """
+        Return a cached value whatever its age, or None, without counting a hit or a miss.
+        For entries keyed by content, such as encoded responses keyed by ETag, which never go stale.
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry.s3_object
+
+    def put(self, cache_key, s3_object):
+        """
+        Cache an object, evicting the least recently used entries to stay within max_bytes
+        """
+        entry = _CacheEntry(s3_object, self._clock())
+        if self.max_bytes <= 0 or entry.size > self.max_bytes:
+            self.invalidate(cache_key)
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self.current_bytes -= previous.size
+            self._entries[cache_key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last = False)
+                self.current_bytes -= evicted.size
+                self.evictions += 1
+
+    def mark_not_modified(self, cache_key):
+        """
+        Restart the TTL of an entry after S3 answered a revalidation with 304 Not Modified
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                entry.validated_at = self._clock()
+                self.not_modified += 1
+
+    def invalidate(self, cache_key):
+        """
+        Drop a single entry
+        """
+        with self._lock:
+            entry = self._entries.pop(cache_key, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+
+    def invalidate_where(self, predicate) -> int:
+        """
+        Drop every entry whose key matches predicate(cache_key), returns how many were dropped
+        """
+        with self._lock:
+            matched = [cache_key for cache_key in self._entries if predicate(cache_key)]
+            for cache_key in matched:
+                self.current_bytes -= self._entries.pop(cache_key).size
+            return len(matched)
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = self.misses = self.revalidations = 0
+            self.not_modified = self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Counters used to tune the byte budget against the hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidations
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.not_modified) / lookups if lookups else 0.0
+            }
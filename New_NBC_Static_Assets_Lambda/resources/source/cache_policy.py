@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+from fnmatch import translate
+from os import environ, path
+import json
+import logging
+import re
+from http_utils import format_http_date
+
+logger = logging.getLogger()
+
+DEFAULT_POLICY_FILE = path.join(path.dirname(path.abspath(__file__)), 'cache_policy.json')
+DEFAULT_CACHE_CONTROL = 'no-cache'
+_MATCHERS = ('prefix', 'glob', 'content_type')
+
+class _PolicyRule:
+    """
+    Response headers applied when a rule matches
+    """
+    __slots__ = ('cache_control', 'expires', 'vary')
+
+    def __init__(self, cache_control = DEFAULT_CACHE_CONTROL, expires = None, vary = None):
+        self.cache_control = cache_control
+        self.expires = expires
+        self.vary = vary
+
+    def headers(self, now) -> dict:
+        headers = {'Cache-Control': self.cache_control}
+        if self.expires is not None:
+            headers['Expires'] = format_http_date(now + timedelta(seconds = self.expires))
+        if self.vary:
+            headers['Vary'] = self.vary
+        return headers
+
+class CachePolicy:
+    """
+    Maps object keys and content types to Cache-Control, Expires and Vary headers.
+    Rules are checked in order and the first match wins. They are precompiled into a prefix
+    table, one combined glob regex and content type tables, so a lookup costs the same
+    however many rules there are.
+    """
+    def __init__(self, rules: list, default: dict = None):
+        """
+        Compile the rules, each a dict with one of 'prefix', 'glob' or 'content_type'
+        plus any of 'cache_control', 'expires' (seconds) and 'vary'
+        """
+        self.default = _PolicyRule(**(default or {}))
+        self._rules = []
+        self._prefixes = {}
+        self._content_types = {}
+        self._major_types = {}
+        globs = []
+        for index, rule in enumerate(rules):
+            rule = dict(rule)
+            matchers = [name for name in _MATCHERS if name in rule]
+            if len(matchers) != 1:
+                raise ValueError("Cache policy rule %d needs exactly one of %s" % (index, ', '.join(_MATCHERS)))
+            pattern = rule.pop(matchers[0])
+            self._rules.append(_PolicyRule(**rule))
+            if matchers[0] == 'prefix':
+                self._prefixes.setdefault(len(pattern), {}).setdefault(pattern, index)
+            elif matchers[0] == 'glob':
+                globs.append("(?P<rule%d>%s)" % (index, translate(pattern)))
+            elif pattern.endswith('/*'):
+                self._major_types.setdefault(pattern[:-2].lower(), index)
+            else:
+                self._content_types.setdefault(pattern.lower(), index)
+        self._prefix_lengths = sorted(self._prefixes)
+        self._globs = re.compile('|'.join(globs)) if globs else None
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Load the policy from the CACHE_POLICY environment variable (inline JSON), the file named
+        by CACHE_POLICY_FILE (JSON or YAML), or the cache_policy.json bundled with the function
+        """
+        inline_policy = environ.get('CACHE_POLICY')
+        if inline_policy:
+            return cls.from_dict(json.loads(inline_policy))
+        return cls.from_file(environ.get('CACHE_POLICY_FILE', DEFAULT_POLICY_FILE))
+
+    @classmethod
+    def from_file(cls, file_name: str):
+        """
+        Load the policy from a JSON file, or a YAML file when PyYAML is installed
+        """
+        with open(file_name, "r", encoding='UTF-8') as file_handle:
+            if file_name.endswith(('.yaml', '.yml')):
+                import yaml
+                return cls.from_dict(yaml.safe_load(file_handle))
+            return cls.from_dict(json.load(file_handle))
+
+    @classmethod
+    def from_dict(cls, policy: dict):
+        return cls(rules = policy.get('rules', []), default = policy.get('default'))
+
+    def match(self, s3_file_key: str, content_type: str = None):
+        """
+        Return the first rule matching the key or content type, or the default rule
+        """
+        index = len(self._rules)
+        for length in self._prefix_lengths:
+            if length > len(s3_file_key):
+                break
+            candidate = self._prefixes[length].get(s3_file_key[:length])
+            if candidate is not None and candidate < index:
+                index = candidate
+        if self._globs is not None:
+            matched = self._globs.match(s3_file_key)
+            if matched is not None:
+                index = min(index, int(matched.lastgroup[4:]))
+        if content_type:
+            media_type = content_type.split(';', 1)[0].strip().lower()
+            for candidate in (self._content_types.get(media_type),
+                              self._major_types.get(media_type.split('/', 1)[0])):
+                if candidate is not None and candidate < index:
+                    index = candidate
+        return self._rules[index] if index < len(self._rules) else self.default
+
+    def headers_for(self, s3_file_key: str, content_type: str = None) -> dict:
+        """
+        Cache-Control, and optionally Expires and Vary, response headers for an object
+        """
+        return self.match(s3_file_key, content_type).headers(datetime.now(timezone.utc))
@@ -0,0 +1,41 @@
+from os import environ
+import logging
+
+logger = logging.getLogger()
+
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 2.0
+DEFAULT_READ_TIMEOUT_SECONDS = 10.0
+DEFAULT_RETRY_MODE = 'standard'
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_MODES = ('legacy', 'standard', 'adaptive')
+
+def _env_bool(name: str, default: bool) -> bool:
+    return environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes')
+
+def client_settings_from_environ() -> dict:
+    """
+    Read the S3 client settings from the environment, once per execution environment
+    """
+    retry_mode = environ.get('S3_RETRY_MODE', DEFAULT_RETRY_MODE).strip().lower()
+    if retry_mode not in RETRY_MODES:
+        raise ValueError("S3_RETRY_MODE must be one of %s, got '%s'" % (', '.join(RETRY_MODES), retry_mode))
+    return {
+        "max_pool_connections": int(environ.get('S3_MAX_POOL_CONNECTIONS', DEFAULT_MAX_POOL_CONNECTIONS)),
+        "tcp_keepalive": _env_bool('S3_TCP_KEEPALIVE', True),
+        "connect_timeout": float(environ.get('S3_CONNECT_TIMEOUT_SECONDS', DEFAULT_CONNECT_TIMEOUT_SECONDS)),
+        "read_timeout": float(environ.get('S3_READ_TIMEOUT_SECONDS', DEFAULT_READ_TIMEOUT_SECONDS)),
+        "retries": {
+            "mode": retry_mode,
+            "max_attempts": int(environ.get('S3_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        }
+    }
+
+def client_config_from_environ():
+    """
+    Build the botocore Config of the S3 client from the environment
+    """
+    from botocore.config import Config
+    settings = client_settings_from_environ()
+    logger.debug("S3 client settings '%s'", settings)
+    return Config(**settings)
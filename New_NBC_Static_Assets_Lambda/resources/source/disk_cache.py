@@ -0,0 +1,260 @@
+from collections import OrderedDict
+from datetime import datetime
+from os import environ
+from threading import Lock
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from fetch import S3Object
+from cache import DEFAULT_CACHE_TTL_SECONDS
+
+logger = logging.getLogger()
+
+DEFAULT_DISK_CACHE_DIR = '/tmp/s3_object_cache'
+DEFAULT_DISK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Every cache file is a 4 byte header length, a JSON header with the object metadata, then the body.
+_HEADER_LENGTH = struct.Struct('>I')
+_FILE_SUFFIX = '.obj'
+
+class _DiskEntry:
+    """
+    Index record of a cache file
+    """
+    __slots__ = ('path', 'size', 'validated_at')
+
+    def __init__(self, path, size, validated_at):
+        self.path = path
+        self.size = size
+        self.validated_at = validated_at
+
+class DiskCache:
+    """
+    Second-tier object cache in the Lambda ephemeral storage, bounded by total file size.
+    Hits are read back through mmap so the body is not copied into Python bytes.
+    """
+    tier_name = 'disk'
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float, clock=time.monotonic):
+        """
+        Initialize the cache and index the files left by earlier invocations
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.evictions = 0
+        if self.max_bytes > 0:
+            os.makedirs(self.directory, exist_ok = True)
+            self._load_index()
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Build the cache from the DISK_CACHE_DIR, DISK_CACHE_MAX_BYTES and CACHE_TTL_SECONDS environment variables
+        """
+        return cls(directory = environ.get('DISK_CACHE_DIR', DEFAULT_DISK_CACHE_DIR),
+                   max_bytes = int(environ.get('DISK_CACHE_MAX_BYTES', DEFAULT_DISK_CACHE_MAX_BYTES)),
+                   ttl_seconds = float(environ.get('CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL_SECONDS)))
+
+    def _path(self, cache_key) -> str:
+        digest = hashlib.sha256('/'.join(cache_key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + _FILE_SUFFIX)
+
+    def _load_index(self):
+        """
+        Index existing cache files, oldest first. Their age is unknown so they start stale.
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(_FILE_SUFFIX):
+                if name.startswith('.tmp-'):
+                    os.remove(path)
+                continue
+            try:
+                with open(path, 'rb') as file_handle:
+                    header = self._read_header(file_handle)
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                os.remove(path)
+                continue
+            files.append((stat.st_mtime, (header['bucket'], header['key']), path, stat.st_size))
+        for _, cache_key, path, size in sorted(files):
+            self._entries[cache_key] = _DiskEntry(path, size, float('-inf'))
+            self.current_bytes += size
+
+    @staticmethod
+    def _read_header(file_handle) -> dict:
+        (header_length,) = _HEADER_LENGTH.unpack(file_handle.read(_HEADER_LENGTH.size))
+        return json.loads(file_handle.read(header_length))
+
+    def contains(self, cache_key) -> bool:
+        """
+        True when a key is cached, fresh or stale, without counting a hit or a miss
+        """
+        with self._lock:
+            return cache_key in self._entries
+
+    def get(self, cache_key):
+        """
+        Return (s3_object, is_fresh) for a cached key, or None on a miss.
+        The body of the returned object is a read-only memoryview over an mmap of the cache file.
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+        try:
+            s3_object = self._read(entry.path)
+        except (OSError, ValueError):
+            logger.warning("Dropping unreadable cache file '%s'.", entry.path)
+            self.invalidate(cache_key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            if self._clock() - entry.validated_at < self.ttl_seconds:
+                self.hits += 1
+                return s3_object, True
+            self.revalidations += 1
+            return s3_object, False
+
+    def _read(self, path: str) -> S3Object:
+        with open(path, 'rb') as file_handle:
+            header = self._read_header(file_handle)
+            body_offset = file_handle.tell()
+            if os.fstat(file_handle.fileno()).st_size - body_offset != header['content_length']:
+                raise ValueError("truncated cache file")
+            if header['content_length'] == 0:
+                body = b''
+            else:
+                mapped = mmap.mmap(file_handle.fileno(), 0, access = mmap.ACCESS_READ)
+                body = memoryview(mapped)[body_offset:]
+        last_modified = header['last_modified']
+        return S3Object(body = body,
+                        content_type = header['content_type'],
+                        content_length = header['content_length'],
+                        etag = header['etag'],
+                        last_modified = datetime.fromisoformat(last_modified) if last_modified else None)
+
+    def put(self, cache_key, s3_object):
+        """
+        Write an object to a temporary file and rename it into place, so a container
+        frozen mid-write never leaves a truncated file under the final name
+        """
+        if self.max_bytes <= 0:
+            return
+        header = json.dumps({
+            "bucket": cache_key[0],
+            "key": cache_key[1],
+            "content_type": s3_object.content_type,
+            "content_length": len(s3_object.body),
+            "etag": s3_object.etag,
+            "last_modified": s3_object.last_modified.isoformat() if s3_object.last_modified else None
+        }).encode('utf-8')
+        size = _HEADER_LENGTH.size + len(header) + len(s3_object.body)
+        if size > self.max_bytes:
+            self.invalidate(cache_key)
+            return
+        path = self._path(cache_key)
+        temp_path = None
+        try:
+            file_descriptor, temp_path = tempfile.mkstemp(dir = self.directory, prefix = '.tmp-')
+            with os.fdopen(file_descriptor, 'wb') as file_handle:
+                file_handle.write(_HEADER_LENGTH.pack(len(header)))
+                file_handle.write(header)
+                file_handle.write(s3_object.body)
+            os.replace(temp_path, path)
+        except OSError as write_error:
+            logger.warning("Unable to write cache file for '%s': '%s'.", cache_key[1], str(write_error))
+            if temp_path is not None:
+                self._remove(temp_path)
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self.current_bytes -= previous.size
+            self._entries[cache_key] = _DiskEntry(path, size, self._clock())
+            self.current_bytes += size
+            evicted = []
+            while self.current_bytes > self.max_bytes:
+                _, entry = self._entries.popitem(last = False)
+                self.current_bytes -= entry.size
+                self.evictions += 1
+                evicted.append(entry.path)
+        for evicted_path in evicted:
+            self._remove(evicted_path)
+
+    def mark_not_modified(self, cache_key):
+        """
+        Restart the TTL of an entry after S3 answered a revalidation with 304 Not Modified
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                entry.validated_at = self._clock()
+                self.not_modified += 1
+
+    def invalidate(self, cache_key):
+        """
+        Drop a single entry and its file
+        """
+        with self._lock:
+            entry = self._entries.pop(cache_key, None)
+            if entry is None:
+                return
+            self.current_bytes -= entry.size
+        self._remove(entry.path)
+
+    def clear(self):
+        """
+        Drop every entry and file and reset the counters
+        """
+        with self._lock:
+            paths = [entry.path for entry in self._entries.values()]
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = self.misses = self.revalidations = 0
+            self.not_modified = self.evictions = 0
+        for path in paths:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Counters used to tune the byte budget against the hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidations
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.not_modified) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,104 @@
+import logging
+from importlib.util import find_spec
+
+logger = logging.getLogger()
+
+# Codings in order of preference when the client weighs them equally, with the key suffix
+# of the precompressed sibling objects uploaded next to the original.
+PREFERRED_CODINGS = ('br', 'gzip')
+SIBLING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+_COMPRESSION_CODINGS = None
+
+COMPRESSIBLE_TYPES = frozenset((
+    'application/javascript',
+    'application/json',
+    'application/ld+json',
+    'application/manifest+json',
+    'application/xml',
+    'application/xhtml+xml',
+    'application/rss+xml',
+    'application/wasm',
+    'image/svg+xml',
+    'image/x-icon',
+    'font/ttf',
+    'font/otf'
+))
+
+def is_compressible(content_type: str) -> bool:
+    """
+    True for text-like content types that shrink well under gzip or brotli
+    """
+    if not content_type:
+        return False
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return media_type.startswith('text/') or media_type in COMPRESSIBLE_TYPES
+
+def parse_accept_encoding(value: str) -> dict:
+    """
+    Parse an Accept-Encoding header into a {coding: q} mapping
+    """
+    accepted = {}
+    if not value:
+        return accepted
+    for item in value.split(','):
+        coding, _, parameters = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        parameter_name, _, parameter_value = parameters.partition('=')
+        if parameter_name.strip().lower() == 'q':
+            try:
+                quality = float(parameter_value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+def acceptable_codings(accepted: dict, available) -> list:
+    """
+    Codings from available that the client accepts, best first
+    """
+    wildcard = accepted.get('*', 0.0)
+    ranked = [(accepted.get(coding, wildcard), -PREFERRED_CODINGS.index(coding), coding)
+              for coding in available]
+    return [coding for quality, _, coding in sorted(ranked, reverse = True) if quality > 0]
+
+def compression_codings() -> tuple:
+    """
+    Codings this function can compress with on the fly, brotli needs the optional brotli package
+    """
+    global _COMPRESSION_CODINGS
+    if _COMPRESSION_CODINGS is None:
+        _COMPRESSION_CODINGS = PREFERRED_CODINGS if find_spec('brotli') is not None else ('gzip',)
+    return _COMPRESSION_CODINGS
+
+def compress(body, coding: str) -> bytes:
+    """
+    Compress a body with the given coding, the compressors are imported on first use
+    """
+    if coding == 'br':
+        import brotli
+        return brotli.compress(bytes(body), mode = brotli.MODE_TEXT)
+    import gzip
+    return gzip.compress(body, compresslevel = 6, mtime = 0)
+
+def variant_etag(etag: str, coding: str) -> str:
+    """
+    ETag of an encoded representation, distinct from the identity one as RFC 7232 requires
+    """
+    if not etag:
+        return etag
+    weak = etag.startswith('W/')
+    opaque = etag[2:] if weak else etag
+    return '%s"%s-%s"' % ('W/' if weak else '', opaque.strip('"'), coding)
+
+def merge_vary(headers: dict, field: str):
+    """
+    Add a field to the Vary response header without duplicating it
+    """
+    current = headers.get('Vary')
+    if not current:
+        headers['Vary'] = field
+    elif field.lower() not in [value.strip().lower() for value in current.split(',')]:
+        headers['Vary'] = current + ', ' + field
@@ -0,0 +1,279 @@
+from bisect import bisect_left
+from threading import Lock, local
+from time import perf_counter
+import logging
+from botocore.exceptions import ClientError, ConnectionError as S3ConnectionError, HTTPClientError
+from body import read_body
+from metrics import current_metrics
+
+logger = logging.getLogger()
+
+class S3Object:
+    """
+    Body and metadata of an S3 object, read from a single GetObject response
+    """
+    __slots__ = ('body', 'content_type', 'content_length', 'etag', 'last_modified')
+
+    def __init__(self, body, content_type, content_length, etag=None, last_modified=None):
+        """
+        Initialize an S3 Object
+        """
+        self.body = body
+        self.content_type = content_type
+        self.content_length = content_length
+        self.etag = etag
+        self.last_modified = last_modified
+
+# Upper bounds, in milliseconds, of the S3 call latency histogram buckets, the last one is open.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LATENCY_BUCKET_LABELS = tuple('le_%d' % bound for bound in LATENCY_BUCKETS_MS) + ('gt_%d' % LATENCY_BUCKETS_MS[-1],)
+
+class S3CallStats:
+    """
+    Calls, retry attempts and a latency histogram per operation name, bounded whatever the call count
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.counts = {}
+        self.retries = {}
+        self.histograms = {}
+
+    def count(self, operation_name: str):
+        with self._lock:
+            self.counts[operation_name] = self.counts.get(operation_name, 0) + 1
+
+    def record(self, operation_name: str, retry_attempts: int, seconds: float = None):
+        with self._lock:
+            if retry_attempts:
+                self.retries[operation_name] = self.retries.get(operation_name, 0) + retry_attempts
+            if seconds is not None:
+                histogram = self.histograms.setdefault(operation_name, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+                histogram[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                operation_name: {
+                    "calls": calls,
+                    "retries": self.retries.get(operation_name, 0),
+                    "latency_ms": {label: samples for label, samples in
+                                   zip(LATENCY_BUCKET_LABELS, self.histograms.get(operation_name, ())) if samples}
+                }
+                for operation_name, calls in self.counts.items()
+            }
+
+class S3RequestCounter:
+    """
+    Counts the S3 API calls issued through a client, per operation name, with their retry attempts
+    and latency including retries. Counts are kept per request: each thread records into the stats
+    of the request it serves, so background threads and concurrent requests sharing the client do
+    not mix their counts, and lifetime totals are kept apart.
+    """
+    def __init__(self):
+        """
+        Initialize an empty counter
+        """
+        self._local = local()
+        self.totals = S3CallStats()
+
+    def attach(self, client):
+        """
+        Register the counter on the client's call events so every API call is counted and timed
+        """
+        client.meta.events.register('before-call.s3', self._on_call,
+                                    unique_id='s3-request-counter-%d' % id(self))
+        client.meta.events.register('after-call.s3', self._on_call_done,
+                                    unique_id='s3-request-timer-%d' % id(self))
+        client.meta.events.register('after-call-error.s3', self._on_call_error,
+                                    unique_id='s3-request-error-timer-%d' % id(self))
+
+    def current(self) -> S3CallStats:
+        """
+        Stats of the request served by this thread
+        """
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = S3CallStats()
+        return stats
+
+    def propagate(self, call):
+        """
+        Wrap a callable run on a pool thread so its S3 calls count towards the calling request
+        """
+        stats = self.current()
+
+        def counted(*args, **kwargs):
+            previous = getattr(self._local, 'stats', None)
+            self._local.stats = stats
+            try:
+                return call(*args, **kwargs)
+            finally:
+                self._local.stats = previous
+        return counted
+
+    def _on_call(self, model, context = None, **kwargs):
+        if context is not None:
+            context['s3_request_started'] = perf_counter()
+            context['s3_operation_name'] = model.name
+        self.current().count(model.name)
+        self.totals.count(model.name)
+
+    def _on_call_done(self, model, parsed, context = None, **kwargs):
+        retry_attempts = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        self._record(model.name, retry_attempts, context)
+
+    def _on_call_error(self, exception, context = None, **kwargs):
+        operation_name = (context or {}).get('s3_operation_name', 'Unknown')
+        self._record(operation_name, 0, context)
+
+    def _record(self, operation_name: str, retry_attempts: int, context):
+        started = (context or {}).pop('s3_request_started', None)
+        seconds = perf_counter() - started if started is not None else None
+        self.current().record(operation_name, retry_attempts, seconds)
+        self.totals.record(operation_name, retry_attempts, seconds)
+        if retry_attempts:
+            logger.info("S3 %s call was retried %d times.", operation_name, retry_attempts)
+
+    @property
+    def retries(self) -> dict:
+        """
+        Retry attempts of the current request per operation
+        """
+        return self.current().retries
+
+    def get(self, operation_name: str) -> int:
+        """
+        Number of calls the current request made for one operation, e.g. 'GetObject'
+        """
+        return self.current().counts.get(operation_name, 0)
+
+    def total(self) -> int:
+        """
+        Number of calls the current request made for all operations
+        """
+        return sum(self.current().counts.values())
+
+    def stats(self) -> dict:
+        """
+        Calls, retry attempts and latency histogram in milliseconds per operation of the current request
+        """
+        return self.current().as_dict()
+
+    def reset(self):
+        """
+        Start counting a new request on this thread, called at the start of every invocation
+        """
+        self._local.stats = S3CallStats()
+
+def is_not_modified(error: ClientError) -> bool:
+    """
+    True when S3 answered a conditional request with 304 Not Modified
+    """
+    return error.response.get('Error', {}).get('Code') in ('304', 'NotModified')
+
+def is_missing_key(error: ClientError) -> bool:
+    """
+    True when S3 reports that the key does not exist. AccessDenied, which S3 also returns for
+    missing keys without s3:ListBucket, and throttling are not, they may clear up on a retry.
+    """
+    return error.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound')
+
+def is_server_error(error: Exception) -> bool:
+    """
+    True for S3 5xx answers and connection failures, which a replica of the bucket may not have
+    """
+    if isinstance(error, ClientError):
+        return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500 or \
+            error.response.get('Error', {}).get('Code') in ('InternalError', 'ServiceUnavailable', 'SlowDown')
+    return isinstance(error, (S3ConnectionError, HTTPClientError))
+
+def fetch_object(s3, s3_file_key: str, if_none_match: str = None, max_body_bytes: int = None) -> S3Object:
+    """
+    Issue exactly one GetObject and read the body and metadata from that response.
+    With if_none_match the request is conditional and None is returned when S3 answers 304.
+    When ContentLength exceeds max_body_bytes the body is not downloaded and is left as None.
+    With a replica bucket configured the GetObject is hedged, see HedgedReads.
+    """
+    hedged_reads = getattr(s3, 'hedged_reads', None)
+    if hedged_reads is None:
+        return get_object(s3, s3_file_key, if_none_match, max_body_bytes)
+    outcome = hedged_reads.run(
+        s3.request_counter.propagate(
+            lambda on_first_byte: get_object(s3, s3_file_key, if_none_match, max_body_bytes, on_first_byte)),
+        hedged_reads.replica.request_counter.propagate(
+            lambda on_first_byte: get_object(hedged_reads.replica, s3_file_key, if_none_match, max_body_bytes,
+                                             on_first_byte)))
+    metrics = current_metrics()
+    if outcome.first_byte_seconds is not None:
+        metrics.add('S3FirstByte', outcome.first_byte_seconds * 1000)
+        metrics.add('S3Download', (outcome.seconds - outcome.first_byte_seconds) * 1000)
+    metrics.set('S3Source', outcome.source)
+    if outcome.hedged:
+        metrics.set('HedgeFired', 1)
+        metrics.set('HedgeWon', 1 if outcome.source == 'replica' else 0)
+    elif outcome.source == 'replica':
+        metrics.set('ReplicaFallback', 1)
+    return outcome.result
+
+def get_object(s3, s3_file_key: str, if_none_match: str = None, max_body_bytes: int = None,
+               on_first_byte = None) -> S3Object:
+    """
+    GetObject of fetch_object against a single bucket. on_first_byte() is called once the response
+    headers arrive, when it returns False the body is not read and None is returned.
+    """
+    metrics = current_metrics()
+    params = {"Bucket": s3.bucket_name, "Key": s3_file_key}
+    if if_none_match:
+        params["IfNoneMatch"] = if_none_match
+    try:
+        with metrics.phase('S3FirstByte'):
+            client_response = s3.client.get_object(**params)
+    except ClientError as error:
+        if if_none_match and is_not_modified(error):
+            return None
+        raise
+    if on_first_byte is not None and not on_first_byte():
+        client_response['Body'].close()
+        return None
+    content_length = client_response.get('ContentLength')
+    if max_body_bytes and content_length is not None and content_length > max_body_bytes:
+        client_response['Body'].close()
+        body = None
+    else:
+        with metrics.phase('S3Download'):
+            body = read_body(client_response['Body'], content_length)
+    return S3Object(body = body,
+                    content_type = client_response.get('ContentType'),
+                    content_length = content_length,
+                    etag = client_response.get('ETag'),
+                    last_modified = client_response.get('LastModified'))
+
+def head_object(s3, s3_file_key: str) -> S3Object:
+    """
+    Issue a HeadObject and return the object metadata without a body
+    """
+    client_response = s3.client.head_object(Bucket = s3.bucket_name, Key = s3_file_key)
+    return S3Object(body = None,
+                    content_type = client_response.get('ContentType'),
+                    content_length = client_response.get('ContentLength'),
+                    etag = client_response.get('ETag'),
+                    last_modified = client_response.get('LastModified'))
+
+def fetch_range(s3, s3_file_key: str, range_spec: str):
+    """
+    Issue a ranged GetObject and return (s3_object, start, end). The object body holds only
+    the requested bytes and its content_length is the size of the whole object.
+    """
+    metrics = current_metrics()
+    with metrics.phase('S3FirstByte'):
+        client_response = s3.client.get_object(Bucket = s3.bucket_name, Key = s3_file_key, Range = range_spec)
+    byte_range, _, size = client_response['ContentRange'].partition(' ')[2].partition('/')
+    start, _, end = byte_range.partition('-')
+    with metrics.phase('S3Download'):
+        body = read_body(client_response['Body'], client_response.get('ContentLength'))
+    s3_object = S3Object(body = body,
+                         content_type = client_response.get('ContentType'),
+                         content_length = int(size),
+                         etag = client_response.get('ETag'),
+                         last_modified = client_response.get('LastModified'))
+    return s3_object, int(start), int(end)
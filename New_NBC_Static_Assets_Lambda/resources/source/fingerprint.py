@@ -0,0 +1,167 @@
+"""
+Content-fingerprinted asset URLs.
+
+The manifest maps every logical key to a short hash of its content, so '/static/<hash>/<key>'
+changes whenever the object is overwritten and can be cached by browsers and CDNs forever.
+Build it offline from the bucket (or a local copy of it) and upload it next to the assets:
+
+    python resources/source/fingerprint.py --bucket assets --output fingerprints.json
+    python resources/source/fingerprint.py --directory ./assets --upload-key _fingerprints.json --upload-bucket assets
+"""
+from hashlib import md5
+from os import environ, path, walk
+from threading import Lock
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+
+logger = logging.getLogger()
+
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_FINGERPRINT_MANIFEST_TTL_SECONDS = 60
+_FINGERPRINT = re.compile('^[0-9a-f]{%d}$' % FINGERPRINT_LENGTH)
+
+def fingerprint(etag: str) -> str:
+    """
+    Short content hash of an object from its S3 ETag. A single-part ETag is the MD5 of the
+    content, a multipart one ('<md5 of part md5s>-<parts>') is hashed again to stay hex.
+    """
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    opaque = opaque.strip('"')
+    if '-' in opaque:
+        opaque = md5(opaque.encode('ascii')).hexdigest()
+    return opaque[:FINGERPRINT_LENGTH].lower()
+
+def build_manifest_from_bucket(client, bucket: str, prefix: str = '') -> dict:
+    """
+    Fingerprint every object under a prefix with paged ListObjectsV2 calls, without downloading it.
+    Keys are kept whole, the handler fetches exactly the key a URL names.
+    """
+    assets = {}
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        page = client.list_objects_v2(**params)
+        for entry in page.get('Contents', []):
+            assets[entry['Key']] = fingerprint(entry['ETag'])
+        if not page.get('IsTruncated'):
+            return {'assets': assets}
+        params['ContinuationToken'] = page['NextContinuationToken']
+
+def build_manifest_from_directory(directory: str) -> dict:
+    """
+    Fingerprint every file of a local copy of the bucket, keys use '/' separators
+    """
+    assets = {}
+    for root, _, file_names in walk(directory):
+        for file_name in file_names:
+            file_path = path.join(root, file_name)
+            digest = md5()
+            with open(file_path, 'rb') as file_handle:
+                for chunk in iter(lambda: file_handle.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            key = path.relpath(file_path, directory).replace(path.sep, '/')
+            assets[key] = digest.hexdigest()[:FINGERPRINT_LENGTH]
+    return {'assets': assets}
+
+class FingerprintManifest:
+    """
+    Logical key to fingerprint map of the handler, loaded on first use. A request for a hash
+    the manifest does not know reloads it, at most once per ttl_seconds.
+    """
+    def __init__(self, load, ttl_seconds: float, clock = time.monotonic):
+        """
+        Initialize an unloaded manifest, load() returns the manifest dict
+        """
+        self._load = load
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._assets = None
+        self._loaded_at = None
+
+    @classmethod
+    def from_environ(cls, get_s3, read_manifest):
+        """
+        Build the manifest from FINGERPRINT_MANIFEST, a location read_manifest(s3, location)
+        understands, and FINGERPRINT_MANIFEST_TTL_SECONDS. None when no manifest is set.
+        """
+        location = environ.get('FINGERPRINT_MANIFEST')
+        if not location:
+            return None
+        return cls(load = lambda: read_manifest(get_s3(), location),
+                   ttl_seconds = float(environ.get('FINGERPRINT_MANIFEST_TTL_SECONDS',
+                                                   DEFAULT_FINGERPRINT_MANIFEST_TTL_SECONDS)))
+
+    def _assets_for(self, refresh: bool) -> dict:
+        with self._lock:
+            expired = self._loaded_at is None or self._clock() - self._loaded_at >= self.ttl_seconds
+            if self._assets is None or (refresh and expired):
+                try:
+                    self._assets = self._load().get('assets', {})
+                except Exception as manifest_error:
+                    logger.warning("Unable to load the fingerprint manifest: '%s'.", str(manifest_error))
+                    self._assets = self._assets or {}
+                self._loaded_at = self._clock()
+            return self._assets
+
+    def invalidate(self):
+        """
+        Reload the manifest on the next request, e.g. once it has been uploaded again
+        """
+        with self._lock:
+            self._assets = None
+
+    def resolve(self, path_key: str):
+        """
+        Return (s3_file_key, requested_hash, current_hash) for a '<hash>/<key>' path, or None
+        when the path is not a fingerprinted URL of a known key
+        """
+        requested_hash, _, s3_file_key = path_key.partition('/')
+        if not s3_file_key or not _FINGERPRINT.match(requested_hash):
+            return None
+        current_hash = self._assets_for(refresh = False).get(s3_file_key)
+        if current_hash != requested_hash:
+            current_hash = self._assets_for(refresh = True).get(s3_file_key)
+        if current_hash is None:
+            return None
+        return s3_file_key, requested_hash, current_hash
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required = True)
+    source.add_argument("--bucket", help = "bucket to list, also the upload target of --upload-key")
+    source.add_argument("--directory", help = "local copy of the bucket to hash instead")
+    parser.add_argument("--prefix", default = "", help = "key prefix to list, kept in the manifest keys")
+    parser.add_argument("--output", help = "file to write the manifest to, stdout by default")
+    parser.add_argument("--upload-key", help = "key of the bucket to upload the manifest to")
+    parser.add_argument("--upload-bucket", help = "bucket to upload to when --directory is used")
+    args = parser.parse_args()
+    if args.upload_key and not (args.upload_bucket or args.bucket):
+        parser.error("--upload-key needs --bucket or --upload-bucket")
+
+    client = None
+    if args.bucket or args.upload_key:
+        from botocore.session import get_session
+        client = get_session().create_client('s3')
+    if args.bucket:
+        manifest = build_manifest_from_bucket(client, args.bucket, args.prefix)
+    else:
+        manifest = build_manifest_from_directory(args.directory)
+    body = json.dumps(manifest, indent = 2, sort_keys = True)
+    if args.upload_key:
+        client.put_object(Bucket = args.upload_bucket or args.bucket, Key = args.upload_key,
+                          Body = body.encode('utf-8'), ContentType = 'application/json',
+                          CacheControl = 'no-cache')
+    if args.output:
+        with open(args.output, 'w', encoding = 'UTF-8') as file_handle:
+            file_handle.write(body + '\n')
+    elif not args.upload_key:
+        sys.stdout.write(body + '\n')
+    sys.stderr.write("%d assets fingerprinted\n" % len(manifest['assets']))
+
+if __name__ == "__main__":
+    main()
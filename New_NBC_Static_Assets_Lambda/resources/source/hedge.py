@@ -0,0 +1,195 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from os import environ
+from threading import Event, Lock
+from time import perf_counter
+import logging
+from fetch import S3RequestCounter, is_server_error
+
+logger = logging.getLogger()
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_INITIAL_DELAY_MS = 100
+DEFAULT_HEDGE_MIN_DELAY_MS = 10
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_WINDOW = 256
+DEFAULT_HEDGE_MAX_WORKERS = 32
+
+class ReplicaBucket:
+    """
+    Copy of the assets bucket, e.g. a Cross-Region Replication target, read with its own client
+    """
+    __slots__ = ('client', 'bucket_name', 'request_counter')
+
+    def __init__(self, client, bucket_name: str):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.request_counter = S3RequestCounter()
+        self.request_counter.attach(client)
+
+class HedgeOutcome:
+    """
+    Result of a hedged read, with the copy it came from and its timings
+    """
+    __slots__ = ('result', 'source', 'hedged', 'first_byte_seconds', 'seconds')
+
+    def __init__(self, result, source: str, hedged: bool, first_byte_seconds: float, seconds: float):
+        self.result = result
+        self.source = source
+        self.hedged = hedged
+        self.first_byte_seconds = first_byte_seconds
+        self.seconds = seconds
+
+class HedgedReads:
+    """
+    Reads from the primary bucket backed by a replica. When the primary has not sent its first
+    byte within the running percentile of its recent first-byte latencies, the same read is sent
+    to the replica and the first copy to succeed is returned. The other one is abandoned, it
+    stops once its response headers arrive. A primary 5xx or connection failure falls back to
+    the replica. Answers such as NoSuchKey from the primary are final.
+    """
+    def __init__(self, replica: ReplicaBucket, hedging: bool = True,
+                 percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 initial_delay_seconds: float = DEFAULT_HEDGE_INITIAL_DELAY_MS / 1000,
+                 min_delay_seconds: float = DEFAULT_HEDGE_MIN_DELAY_MS / 1000,
+                 min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES,
+                 window: int = DEFAULT_HEDGE_WINDOW,
+                 max_workers: int = DEFAULT_HEDGE_MAX_WORKERS):
+        """
+        Initialize without latency samples, initial_delay_seconds is used until min_samples are recorded
+        """
+        self.replica = replica
+        self.hedging = hedging
+        self.percentile = percentile
+        self.initial_delay_seconds = initial_delay_seconds
+        self.min_delay_seconds = min_delay_seconds
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._samples = deque(maxlen = window)
+        self._lock = Lock()
+        self._executor = None
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_environ(cls, create_client):
+        """
+        Build the hedged reads from S3_REPLICA_BUCKET_NAME, S3_REPLICA_REGION, S3_REPLICA_HEDGING,
+        HEDGE_PERCENTILE, HEDGE_INITIAL_DELAY_MS, HEDGE_MIN_DELAY_MS, HEDGE_MIN_SAMPLES, HEDGE_WINDOW
+        and HEDGE_MAX_WORKERS. create_client(region_name) builds the replica client. None without a replica.
+        """
+        bucket_name = environ.get('S3_REPLICA_BUCKET_NAME')
+        if not bucket_name:
+            return None
+        replica = ReplicaBucket(create_client(environ.get('S3_REPLICA_REGION') or None), bucket_name)
+        return cls(replica,
+                   hedging = environ.get('S3_REPLICA_HEDGING', 'true').lower() == 'true',
+                   percentile = float(environ.get('HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE)),
+                   initial_delay_seconds = float(environ.get('HEDGE_INITIAL_DELAY_MS',
+                                                             DEFAULT_HEDGE_INITIAL_DELAY_MS)) / 1000,
+                   min_delay_seconds = float(environ.get('HEDGE_MIN_DELAY_MS', DEFAULT_HEDGE_MIN_DELAY_MS)) / 1000,
+                   min_samples = int(environ.get('HEDGE_MIN_SAMPLES', DEFAULT_HEDGE_MIN_SAMPLES)),
+                   window = int(environ.get('HEDGE_WINDOW', DEFAULT_HEDGE_WINDOW)),
+                   max_workers = int(environ.get('HEDGE_MAX_WORKERS', DEFAULT_HEDGE_MAX_WORKERS)))
+
+    def record_first_byte(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def threshold_seconds(self) -> float:
+        """
+        Delay before hedging: the percentile of the recent primary first-byte latencies,
+        never below min_delay_seconds
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return max(self.initial_delay_seconds, self.min_delay_seconds)
+            samples = sorted(self._samples)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(samples[index], self.min_delay_seconds)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers = self.max_workers,
+                                                        thread_name_prefix = 'hedge')
+        return self._executor
+
+    def run(self, primary, replica) -> HedgeOutcome:
+        """
+        Read from the primary, hedged by the replica. primary and replica take an on_first_byte()
+        callback to call once their response headers arrive, which returns False when the read
+        is no longer needed.
+        """
+        started = perf_counter()
+        settled = Event()
+        progressed = Event()
+        first_bytes = {}
+
+        def attempt(source, call):
+            def on_first_byte():
+                elapsed = perf_counter() - started
+                first_bytes[source] = elapsed
+                if source == 'primary':
+                    self.record_first_byte(elapsed)
+                progressed.set()
+                return not settled.is_set()
+            return call(on_first_byte)
+
+        with self._lock:
+            self.requests += 1
+        executor = self._get_executor()
+        primary_future = executor.submit(attempt, 'primary', primary)
+        primary_future.add_done_callback(lambda future: progressed.set())
+        futures = {primary_future: 'primary'}
+        hedged = False
+        if self.hedging and not progressed.wait(self.threshold_seconds()):
+            hedged = True
+            with self._lock:
+                self.fired += 1
+            futures[executor.submit(attempt, 'replica', replica)] = 'replica'
+        errors = {}
+        try:
+            while futures:
+                done, _ = wait(futures, return_when = FIRST_COMPLETED)
+                for future in done:
+                    source = futures.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        if source == 'replica' and hedged:
+                            with self._lock:
+                                self.won += 1
+                        return HedgeOutcome(future.result(), source, hedged, first_bytes.get(source),
+                                            perf_counter() - started)
+                    errors[source] = error
+                    if source != 'primary':
+                        logger.warning("Replica read failed: '%s'.", str(error))
+                        continue
+                    if not is_server_error(error):
+                        raise error
+                    if 'replica' not in futures.values() and 'replica' not in errors:
+                        logger.warning("Primary read failed, falling back to the replica: '%s'.", str(error))
+                        with self._lock:
+                            self.fallbacks += 1
+                        futures[executor.submit(attempt, 'replica', replica)] = 'replica'
+            raise errors.get('primary') or errors['replica']
+        finally:
+            settled.set()
+
+    def stats(self) -> dict:
+        """
+        How often hedging fired and the replica won, and the current hedging delay
+        """
+        with self._lock:
+            counters = {
+                "requests": self.requests,
+                "fired": self.fired,
+                "won": self.won,
+                "fallbacks": self.fallbacks,
+                "samples": len(self._samples)
+            }
+        counters["threshold_ms"] = round(self.threshold_seconds() * 1000, 3)
+        return counters
@@ -0,0 +1,171 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+def get_header(headers: dict, name: str, default: str = None) -> str:
+    """
+    Case-insensitive lookup of a request header, ALB lower-cases names but other callers may not
+    """
+    if not headers:
+        return default
+    value = headers.get(name)
+    if value is not None:
+        return value
+    name = name.lower()
+    for header_name, value in headers.items():
+        if header_name.lower() == name:
+            return value
+    return default
+
+def format_http_date(value) -> str:
+    """
+    Format a datetime as an RFC 7231 HTTP date
+    """
+    return format_datetime(value.astimezone(timezone.utc), usegmt = True)
+
+def parse_http_date(value: str):
+    """
+    Parse an HTTP date, returning None when it is malformed
+    """
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo = timezone.utc)
+    return parsed
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    return etag
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of an ETag against an If-None-Match header value
+    """
+    if not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    etag = _opaque_tag(etag)
+    return any(_opaque_tag(candidate) == etag for candidate in if_none_match.split(','))
+
+def has_conditional_headers(headers: dict) -> bool:
+    """
+    True when the request carries If-None-Match or If-Modified-Since
+    """
+    return (get_header(headers, 'if-none-match') is not None
+            or get_header(headers, 'if-modified-since') is not None)
+
+def is_not_modified(headers: dict, etag: str, last_modified) -> bool:
+    """
+    Evaluate If-None-Match, or If-Modified-Since when no If-None-Match is present (RFC 7232)
+    """
+    if_none_match = get_header(headers, 'if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = get_header(headers, 'if-modified-since')
+    if if_modified_since is None or last_modified is None:
+        return False
+    since = parse_http_date(if_modified_since)
+    return since is not None and last_modified.replace(microsecond = 0) <= since
+
+# Requests asking for more ranges than this are served the whole object (RFC 7233 allows ignoring Range).
+MAX_RANGES = 16
+
+def parse_range_header(value: str):
+    """
+    Parse a 'bytes=' Range header into (first, last) pairs, where first is None for a suffix
+    range and last is None for an open-ended range. Returns None for a malformed or
+    unsupported header so the whole object is served instead.
+    """
+    unit, _, range_set = value.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    range_specs = []
+    for range_spec in range_set.split(','):
+        first, separator, last = range_spec.strip().partition('-')
+        first, last = first.strip(), last.strip()
+        if not separator or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            if not last:
+                return None
+            range_specs.append((None, int(last)))
+            continue
+        if last and int(last) < int(first):
+            return None
+        range_specs.append((int(first), int(last) if last else None))
+    if not range_specs or len(range_specs) > MAX_RANGES:
+        return None
+    return range_specs
+
+def resolve_ranges(range_specs: list, size: int) -> list:
+    """
+    Resolve parsed ranges against the object size into sorted (start, end) pairs with
+    inclusive ends, merging overlapping ones. An empty list means nothing is satisfiable.
+    """
+    resolved = []
+    for first, last in range_specs:
+        if first is None:
+            if last == 0 or size == 0:
+                continue
+            resolved.append((max(size - last, 0), size - 1))
+        elif first < size:
+            resolved.append((first, size - 1 if last is None else min(last, size - 1)))
+    merged = []
+    for start, end in sorted(resolved):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def max_range_bytes(range_specs: list):
+    """
+    Most bytes parsed ranges can select whatever the object size, None when one is open-ended
+    """
+    total = 0
+    for first, last in range_specs:
+        if first is None:
+            total += last
+        elif last is None:
+            return None
+        else:
+            total += last - first + 1
+    return total
+
+def format_range_spec(first, last) -> str:
+    """
+    Format one parsed range as an S3 GetObject Range parameter
+    """
+    if first is None:
+        return 'bytes=-%d' % last
+    return 'bytes=%d-%s' % (first, '' if last is None else last)
+
+def if_range_matches(headers: dict, etag: str, last_modified) -> bool:
+    """
+    Evaluate If-Range, True when it is absent or still matches the object
+    """
+    if_range = get_header(headers, 'if-range')
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return etag is not None and if_range == etag
+    since = parse_http_date(if_range)
+    return since is not None and last_modified is not None and last_modified.replace(microsecond = 0) == since
+
+def build_multipart_byteranges(parts: list, content_type: str, size: int, boundary: str) -> bytes:
+    """
+    Build a multipart/byteranges body from (start, end, data) parts
+    """
+    chunks = []
+    for start, end, data in parts:
+        chunks.append(('--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n'
+                       % (boundary, content_type, start, end, size)).encode('latin-1'))
+        chunks.append(data)
+        chunks.append(b'\r\n')
+    chunks.append(('--%s--\r\n' % boundary).encode('latin-1'))
+    return b''.join(chunks)
@@ -0,0 +1,112 @@
+from importlib.util import find_spec
+from os import environ
+import io
+import logging
+from encoding import parse_accept_encoding
+from fingerprint import fingerprint
+
+logger = logging.getLogger()
+
+IMAGE_VARIANTS = environ.get('IMAGE_VARIANTS', 'true').lower() == 'true'
+IMAGE_WIDTHS = tuple(sorted(int(width) for width in environ.get('IMAGE_WIDTHS', '320,640,960,1280,1920').split(',')
+                            if width.strip()))
+IMAGE_QUALITY = int(environ.get('IMAGE_QUALITY', 80))
+DERIVED_PREFIX = environ.get('IMAGE_DERIVED_PREFIX', '_derived/')
+IMAGE_MAX_PIXELS = int(environ.get('IMAGE_MAX_PIXELS', 40000000))
+
+# Raster types transcoded to smaller formats, and the formats derivatives can be written in,
+# best first when the client accepts them equally.
+TRANSCODABLE_TYPES = {'image/jpeg': 'jpeg', 'image/png': 'png'}
+FORMAT_CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+PREFERRED_FORMATS = ('avif', 'webp')
+_OUTPUT_FORMATS = None
+
+class ImageTooLargeError(ValueError):
+    """
+    Raised for a source image with more than IMAGE_MAX_PIXELS pixels, such as a decompression bomb
+    """
+
+def output_formats() -> tuple:
+    """
+    Modern formats this function can encode, WebP and AVIF need the optional Pillow package
+    (AVIF a Pillow built with libavif, or the pillow-avif-plugin package). Empty without Pillow.
+    """
+    global _OUTPUT_FORMATS
+    if _OUTPUT_FORMATS is None:
+        formats = []
+        if IMAGE_VARIANTS and find_spec('PIL') is not None:
+            from PIL import features
+            if ('avif' in features.modules and features.check_module('avif')) or find_spec('pillow_avif') is not None:
+                formats.append('avif')
+            if features.check_module('webp'):
+                formats.append('webp')
+        _OUTPUT_FORMATS = tuple(formats)
+    return _OUTPUT_FORMATS
+
+def is_transcodable(content_type: str) -> bool:
+    """
+    True for images served with Vary: Accept because a derivative may be served instead
+    """
+    if not content_type or not output_formats():
+        return False
+    return content_type.split(';', 1)[0].strip().lower() in TRANSCODABLE_TYPES
+
+def negotiate_format(accept: str) -> str:
+    """
+    Best modern format named in an Accept header, image/* alone does not imply support
+    """
+    accepted = parse_accept_encoding(accept)
+    ranked = [(accepted.get(FORMAT_CONTENT_TYPES[name], 0.0), -PREFERRED_FORMATS.index(name), name)
+              for name in output_formats()]
+    ranked = [entry for entry in sorted(ranked, reverse = True) if entry[0] > 0]
+    return ranked[0][2] if ranked else None
+
+def parse_width(query: dict) -> int:
+    """
+    Width asked with the 'w' query parameter, rounded up to the next of IMAGE_WIDTHS so a
+    bounded number of derivatives exists per image. None when absent or invalid.
+    """
+    value = (query or {}).get('w')
+    if not value or not value.isdigit() or not IMAGE_WIDTHS or not output_formats():
+        return None
+    width = int(value)
+    for allowed in IMAGE_WIDTHS:
+        if allowed >= width:
+            return allowed
+    return IMAGE_WIDTHS[-1]
+
+def derived_key(s3_file_key: str, etag: str, image_format: str, width: int = None) -> str:
+    """
+    Key of a derivative, named after the source ETag so an overwritten source gets new derivatives
+    """
+    return "%s%s/%s%s.%s" % (DERIVED_PREFIX, s3_file_key, fingerprint(etag),
+                             '-w%d' % width if width else '', image_format)
+
+def transcode(body, image_format: str, width: int = None) -> bytes:
+    """
+    Encode an image in another format, downscaled to width when it is wider. The dimensions are
+    read from the header first, a source over IMAGE_MAX_PIXELS raises ImageTooLargeError before
+    any pixel is decoded.
+    """
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    if image_format == 'avif':
+        Image.init()
+        if 'AVIF' not in Image.SAVE:
+            import pillow_avif  # registers the AVIF plugin
+    try:
+        image = Image.open(io.BytesIO(body))
+    except Image.DecompressionBombError as error:
+        raise ImageTooLargeError(str(error)) from error
+    with image:
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            raise ImageTooLargeError("Image of %dx%d pixels exceeds %d pixels"
+                                     % (image.width, image.height, IMAGE_MAX_PIXELS))
+        image.load()
+        if width and image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if image_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format = image_format.upper(), quality = IMAGE_QUALITY)
+        return output.getvalue()
@@ -0,0 +1,175 @@
+"""
+Local HTTP server running the Lambda handler outside Lambda.
+
+Every HTTP request is turned into an ALB-shaped event and handled on a thread pool, so the
+handler can be load-tested under concurrency against moto or a local S3 stand-in, or used for
+internal static serving. Concurrent misses for the same key share one GetObject through the
+handler's single-flight layer.
+
+    S3_BUCKET_NAME=assets AWS_ENDPOINT_URL=http://localhost:5000 \\
+        python resources/source/local_server.py --port 8080 --workers 32
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from os import environ
+import argparse
+import asyncio
+import base64
+import logging
+
+logger = logging.getLogger()
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+class BadRequest(ValueError):
+    """
+    Raised for an HTTP request the server cannot parse
+    """
+
+def build_event(method: str, target: str, headers: dict, body: bytes) -> dict:
+    """
+    Build the ALB event of an HTTP request. Query string values are passed on URL-encoded
+    and repeated headers are joined with commas, as ALB does without multi-value headers.
+    """
+    path, _, query = target.partition('?')
+    query_parameters = {}
+    for pair in query.split('&'):
+        if pair:
+            name, _, value = pair.partition('=')
+            query_parameters[name] = value
+    return {
+        "httpMethod": method,
+        "path": path,
+        "queryStringParameters": query_parameters,
+        "headers": headers,
+        "body": base64.b64encode(body).decode('ascii') if body else "",
+        "isBase64Encoded": bool(body)
+    }
+
+def build_http_response(response: dict, keep_alive: bool, head_request: bool = False) -> bytes:
+    """
+    Serialize the handler's ALB response as an HTTP/1.1 response. The response to a HEAD
+    request keeps the Content-Length set by the handler and has no body.
+    """
+    body = response.get('body') or b''
+    if response.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    content_length = len(body)
+    if head_request:
+        content_length = next((value for name, value in (response.get('headers') or {}).items()
+                               if name.lower() == 'content-length'), content_length)
+        body = b''
+    status_code = response.get('statusCode', 200)
+    try:
+        reason = HTTPStatus(status_code).phrase
+    except ValueError:
+        reason = ''
+    lines = ['HTTP/1.1 %d %s' % (status_code, reason)]
+    for name, value in (response.get('headers') or {}).items():
+        if name.lower() not in ('content-length', 'connection', 'transfer-encoding'):
+            lines.append('%s: %s' % (name, value))
+    lines.append('Content-Length: %s' % content_length)
+    lines.append('Connection: %s' % ('keep-alive' if keep_alive else 'close'))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+async def read_request(reader: asyncio.StreamReader):
+    """
+    Read one request from a connection, returning (method, target, version, headers, body)
+    or None when the client closed the connection
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as incomplete:
+        if incomplete.partial.strip():
+            raise BadRequest("Truncated request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise BadRequest("Request head too large")
+    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = request_line.split(' ')
+    except ValueError:
+        raise BadRequest("Malformed request line")
+    headers = {}
+    for header_line in header_lines:
+        if not header_line:
+            continue
+        name, separator, value = header_line.partition(':')
+        if not separator:
+            raise BadRequest("Malformed header")
+        name, value = name.strip().lower(), value.strip()
+        headers[name] = headers[name] + ',' + value if name in headers else value
+    content_length = headers.get('content-length', '0')
+    if not content_length.isdigit() or int(content_length) > MAX_BODY_BYTES:
+        raise BadRequest("Invalid Content-Length")
+    body = await reader.readexactly(int(content_length)) if int(content_length) else b''
+    return method, target, version, headers, body
+
+async def handle_connection(reader, writer, handler, executor):
+    """
+    Serve the requests of one connection, keeping it open between requests unless asked not to
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (BadRequest, asyncio.IncompleteReadError) as request_error:
+                writer.write(build_http_response({"statusCode": 400, "body": "Bad request: %s" % request_error}, False))
+                await writer.drain()
+                break
+            if request is None:
+                break
+            method, target, version, headers, body = request
+            keep_alive = (headers.get('connection', '').lower() != 'close'
+                          and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+            event = build_event(method, target, headers, body)
+            try:
+                response = await loop.run_in_executor(executor, handler, event, None)
+            except Exception as handler_error:
+                logger.exception("Handler failed for '%s %s'.", method, target)
+                response = {"statusCode": 502, "body": "Handler error: %s" % handler_error}
+            writer.write(build_http_response(response, keep_alive, head_request = method == 'HEAD'))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def start_server(host: str, port: int, handler, executor: ThreadPoolExecutor):
+    """
+    Start listening and return the asyncio server, port 0 picks a free port
+    """
+    return await asyncio.start_server(
+        lambda reader, writer: handle_connection(reader, writer, handler, executor),
+        host, port, limit = MAX_HEADER_BYTES)
+
+async def serve(host: str, port: int, workers: int):
+    from app import lambda_handler
+    with ThreadPoolExecutor(max_workers = workers, thread_name_prefix = 'handler') as executor:
+        server = await start_server(host, port, lambda_handler, executor)
+        logger.info("Serving '%s' on %s.", environ['LAMBDA_PATH'],
+                    ', '.join('%s:%d' % sock.getsockname()[:2] for sock in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--workers', type = int, default = 32, help = "handler threads")
+    arguments = parser.parse_args(argv)
+    environ.setdefault('LAMBDA_PATH', '/static/')
+    logging.basicConfig(level = environ.get('LOG_LEVEL', 'INFO'))
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.workers))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
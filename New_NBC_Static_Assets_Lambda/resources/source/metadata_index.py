@@ -0,0 +1,319 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from os import environ
+from threading import Event, Lock, Thread
+import logging
+import time
+from fetch import S3Object
+
+logger = logging.getLogger()
+
+DEFAULT_METADATA_INDEX_REFRESH_SECONDS = 60
+DEFAULT_METADATA_INDEX_REBUILD_SECONDS = 6 * 3600
+DEFAULT_METADATA_INDEX_MAX_AGE_SECONDS = 300
+_NO_DIGEST = bytes(16)
+
+class PackedKeys:
+    """
+    Sorted keys as one UTF-8 buffer and an offsets array, about 8 bytes per key on top of the key
+    itself instead of a str object each. Indexing returns the encoded key, so bisect works on it.
+    """
+    __slots__ = ('buffer', 'offsets')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0])
+
+    def append(self, encoded_key: bytes):
+        self.buffer += encoded_key
+        self.offsets.append(len(self.buffer))
+
+    def __getitem__(self, position: int) -> bytes:
+        return self.buffer[self.offsets[position]:self.offsets[position + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+class MetadataSnapshot:
+    """
+    Size, ETag and modification time of every object under a prefix, as packed sorted keys with
+    parallel columns instead of a dict per key. MD5 ETags are kept as 16 raw bytes in one buffer,
+    multipart ones in a small side table.
+    """
+    __slots__ = ('keys', 'sizes', 'mtimes', 'digests', 'other_etags', 'content_types', 'built_at')
+
+    def __init__(self, built_at: float):
+        self.keys = PackedKeys()
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.digests = bytearray()
+        self.other_etags = {}
+        self.content_types = {}
+        self.built_at = built_at
+
+    def append(self, key: str, size: int, etag: str, mtime: float, content_type: str = None):
+        """
+        Add an object, keys must be appended in UTF-8 binary order as ListObjectsV2 returns them
+        """
+        opaque = (etag or '').strip('"')
+        if len(opaque) == 32 and '-' not in opaque:
+            try:
+                self.digests += bytes.fromhex(opaque)
+            except ValueError:
+                self.digests += _NO_DIGEST
+                self.other_etags[len(self.keys)] = etag
+        else:
+            self.digests += _NO_DIGEST
+            self.other_etags[len(self.keys)] = etag
+        if content_type:
+            self.content_types[len(self.keys)] = content_type
+        self.keys.append(key.encode('utf-8'))
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+
+    def index_of(self, key: str) -> int:
+        encoded_key = key.encode('utf-8')
+        position = bisect_left(self.keys, encoded_key)
+        if position < len(self.keys) and self.keys[position] == encoded_key:
+            return position
+        return -1
+
+    def etag_at(self, position: int) -> str:
+        etag = self.other_etags.get(position)
+        if etag is not None:
+            return etag
+        return '"%s"' % self.digests[position * 16:position * 16 + 16].hex()
+
+    def lookup(self, key: str):
+        """
+        (size, etag, mtime, content_type) of a key, or None when it is not listed
+        """
+        position = self.index_of(key)
+        if position < 0:
+            return None
+        return (self.sizes[position], self.etag_at(position), self.mtimes[position],
+                self.content_types.get(position))
+
+    def __len__(self):
+        return len(self.keys)
+
+def list_snapshot(client, bucket: str, prefix: str = '', clock = time.time) -> MetadataSnapshot:
+    """
+    Build a snapshot from paged ListObjectsV2 calls, which return keys in sorted order
+    """
+    snapshot = MetadataSnapshot(clock())
+    params = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        page = client.list_objects_v2(**params)
+        for entry in page.get('Contents', []):
+            snapshot.append(entry['Key'], entry['Size'], entry['ETag'], entry['LastModified'].timestamp())
+        if not page.get('IsTruncated'):
+            return snapshot
+        params['ContinuationToken'] = page['NextContinuationToken']
+
+def manifest_snapshot(manifest: dict, clock = time.time) -> MetadataSnapshot:
+    """
+    Build a snapshot from a manifest {"objects": [[key, size, etag, mtime, content_type], ...]},
+    content_type being optional
+    """
+    snapshot = MetadataSnapshot(clock())
+    rows = sorted(manifest.get('objects', []), key = lambda row: row[0].encode('utf-8'))
+    for row in rows:
+        snapshot.append(*row)
+    return snapshot
+
+class MetadataIndex:
+    """
+    In-container index of the objects under a bucket prefix, so 404s, HEAD requests and ETag
+    checks are answered without calling S3. A background thread rebuilds the snapshot and swaps
+    it in; changes between rebuilds go to a small overlay, from bucket notifications or from a
+    delta manifest read every refresh_seconds. With a delta manifest the full rebuild only runs
+    every rebuild_seconds, without one every refresh is a rebuild. Answers are only trusted while
+    the last rebuild or delta is younger than max_age_seconds.
+    """
+    def __init__(self, prefix: str, refresh_seconds: float, max_age_seconds: float,
+                 manifest_location: str = None, clock = time.time, rebuild_seconds: float = None,
+                 delta_location: str = None):
+        """
+        Initialize an empty index, see start()
+        """
+        self.prefix = prefix
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds if rebuild_seconds is not None else refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.manifest_location = manifest_location
+        self.delta_location = delta_location
+        self._clock = clock
+        self._lock = Lock()
+        self._snapshot = None
+        self._synced_at = None
+        self._overlay = {}
+        self._stop = Event()
+        self._thread = None
+        self.refreshes = 0
+        self.deltas = 0
+        self.errors = 0
+        self.hits = 0
+        self.missing = 0
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Build the index from METADATA_INDEX, METADATA_INDEX_PREFIX, METADATA_INDEX_REFRESH_SECONDS,
+        METADATA_INDEX_REBUILD_SECONDS, METADATA_INDEX_MAX_AGE_SECONDS, METADATA_INDEX_MANIFEST and
+        METADATA_INDEX_DELTA_MANIFEST. None when it is disabled.
+        """
+        if environ.get('METADATA_INDEX', 'false').lower() != 'true':
+            return None
+        delta_location = environ.get('METADATA_INDEX_DELTA_MANIFEST')
+        refresh_seconds = float(environ.get('METADATA_INDEX_REFRESH_SECONDS', DEFAULT_METADATA_INDEX_REFRESH_SECONDS))
+        return cls(prefix = environ.get('METADATA_INDEX_PREFIX', ''),
+                   refresh_seconds = refresh_seconds,
+                   rebuild_seconds = float(environ.get('METADATA_INDEX_REBUILD_SECONDS',
+                                                       DEFAULT_METADATA_INDEX_REBUILD_SECONDS))
+                   if delta_location else refresh_seconds,
+                   max_age_seconds = float(environ.get('METADATA_INDEX_MAX_AGE_SECONDS',
+                                                       DEFAULT_METADATA_INDEX_MAX_AGE_SECONDS)),
+                   manifest_location = environ.get('METADATA_INDEX_MANIFEST'),
+                   delta_location = delta_location)
+
+    def refresh(self, s3, read_manifest = None):
+        """
+        Rebuild the snapshot and swap it in, keeping overlay entries newer than the rebuild
+        """
+        if self.manifest_location:
+            snapshot = manifest_snapshot(read_manifest(s3, self.manifest_location), self._clock)
+        else:
+            snapshot = list_snapshot(s3.client, s3.bucket_name, self.prefix, self._clock)
+        with self._lock:
+            self._snapshot = snapshot
+            self._synced_at = snapshot.built_at
+            self._overlay = {key: entry for key, entry in self._overlay.items() if entry[0] >= snapshot.built_at}
+            self.refreshes += 1
+        logger.info("Metadata index refreshed: %d objects under prefix '%s'.", len(snapshot), self.prefix)
+
+    def apply_delta(self, s3, read_manifest):
+        """
+        Read the delta manifest {"objects": [[key, size, etag, mtime, content_type], ...],
+        "removed": [key, ...]}, the latest state of every key changed since its writer last truncated
+        it, into the overlay. Applying the same delta again changes nothing.
+        """
+        delta = read_manifest(s3, self.delta_location)
+        applied_at = self._clock()
+        with self._lock:
+            for key, size, etag, mtime, *content_type in delta.get('objects', []):
+                if key.startswith(self.prefix):
+                    self._overlay[key] = (applied_at, (size, etag, mtime, content_type[0] if content_type else None))
+            for key in delta.get('removed', []):
+                if key.startswith(self.prefix):
+                    self._overlay[key] = (applied_at, None)
+            if self._snapshot is not None:
+                self._synced_at = applied_at
+            self.deltas += 1
+
+    def needs_rebuild(self) -> bool:
+        """
+        True when there is no snapshot yet, no delta manifest, or the snapshot is rebuild_seconds old
+        """
+        with self._lock:
+            snapshot = self._snapshot
+        return (snapshot is None or not self.delta_location
+                or self._clock() - snapshot.built_at >= self.rebuild_seconds)
+
+    def start(self, get_s3, read_manifest = None) -> Thread:
+        """
+        Build the index and keep it current on a daemon thread, with a delta every refresh_seconds
+        and a full rebuild every rebuild_seconds
+        """
+        def run():
+            while not self._stop.is_set():
+                try:
+                    if self.needs_rebuild():
+                        self.refresh(get_s3(), read_manifest)
+                    else:
+                        self.apply_delta(get_s3(), read_manifest)
+                except Exception as refresh_error:
+                    with self._lock:
+                        self.errors += 1
+                    logger.warning("Unable to refresh the metadata index: '%s'.", str(refresh_error))
+                self._stop.wait(self.refresh_seconds)
+        self._thread = Thread(target = run, name = 'metadata-index', daemon = True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def update(self, key: str, size: int, etag: str, last_modified: datetime, content_type: str = None):
+        """
+        Record an object created or overwritten since the last rebuild
+        """
+        with self._lock:
+            self._overlay[key] = (self._clock(), (size, etag, last_modified.timestamp(), content_type))
+
+    def remove(self, key: str):
+        """
+        Record an object deleted since the last rebuild
+        """
+        with self._lock:
+            self._overlay[key] = (self._clock(), None)
+
+    def _entry(self, key: str):
+        """
+        (known, metadata): known is False when the index cannot tell, metadata None when missing
+        """
+        if not key.startswith(self.prefix):
+            return False, None
+        with self._lock:
+            snapshot = self._snapshot
+            synced_at = self._synced_at
+            overlay = self._overlay.get(key)
+        if overlay is not None:
+            return True, overlay[1]
+        if snapshot is None or self._clock() - synced_at >= self.max_age_seconds:
+            return False, None
+        return True, snapshot.lookup(key)
+
+    def is_missing(self, key: str) -> bool:
+        """
+        True only when a fresh snapshot or the overlay says the key does not exist
+        """
+        known, metadata = self._entry(key)
+        if known and metadata is None:
+            with self._lock:
+                self.missing += 1
+            return True
+        return False
+
+    def lookup(self, key: str):
+        """
+        Metadata of a listed key as an S3Object without a body, or None when unknown. ListObjectsV2
+        does not return content types, so content_type is None unless the manifest or an update
+        provided it.
+        """
+        known, metadata = self._entry(key)
+        if not known or metadata is None:
+            return None
+        with self._lock:
+            self.hits += 1
+        size, etag, mtime, content_type = metadata
+        return S3Object(body = None,
+                        content_type = content_type,
+                        content_length = size,
+                        etag = etag,
+                        last_modified = datetime.fromtimestamp(mtime, timezone.utc))
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                "objects": len(snapshot) if snapshot is not None else None,
+                "age_seconds": round(self._clock() - snapshot.built_at, 3) if snapshot is not None else None,
+                "overlay": len(self._overlay),
+                "refreshes": self.refreshes,
+                "deltas": self.deltas,
+                "errors": self.errors,
+                "hits": self.hits,
+                "missing": self.missing
+            }
@@ -0,0 +1,198 @@
+from os import environ
+from threading import local
+from time import perf_counter, time
+import json
+import sys
+
+# Per-request phase timings written to stdout in CloudWatch Embedded Metric Format (EMF),
+# which CloudWatch Logs turns into metrics without any PutMetricData call.
+METRICS_ENABLED = environ.get('EMF_METRICS', 'false').lower() == 'true'
+METRICS_NAMESPACE = environ.get('EMF_NAMESPACE', 'StaticAssets')
+
+# Timers, in milliseconds, and other metrics a request may record, with their EMF units.
+METRIC_UNITS = {
+    'InitImport': 'Milliseconds',
+    'InitClient': 'Milliseconds',
+    'S3FirstByte': 'Milliseconds',
+    'S3Download': 'Milliseconds',
+    'Encode': 'Milliseconds',
+    'ResponseBuild': 'Milliseconds',
+    'Total': 'Milliseconds',
+    'ObjectSize': 'Bytes',
+    'ColdStart': 'Count',
+    'HedgeFired': 'Count',
+    'HedgeWon': 'Count',
+    'ReplicaFallback': 'Count'
+}
+
+_CURRENT = local()
+
+class _NullPhase:
+    """
+    Timer doing nothing, shared by every phase while metrics are disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class _NullMetrics:
+    """
+    Request metrics doing nothing, so instrumented code costs one attribute lookup when disabled
+    """
+    __slots__ = ()
+    _PHASE = _NullPhase()
+
+    def phase(self, name: str):
+        return self._PHASE
+
+    def add(self, name: str, value):
+        pass
+
+    def set(self, name: str, value):
+        pass
+
+    def emit(self, response: dict = None):
+        pass
+
+    def get(self, name: str, default = None):
+        return default
+
+NULL_METRICS = _NullMetrics()
+
+class TrackedRequest(_NullMetrics):
+    """
+    Request followed only for the access log while EMF is disabled: properties such as the key and
+    cache tier are kept, phases are not timed and metric values are dropped
+    """
+    __slots__ = ('started', 'properties')
+
+    def __init__(self, trace_id: str = None):
+        self.started = perf_counter()
+        self.properties = {'TraceId': trace_id}
+
+    def elapsed_ms(self) -> float:
+        return (perf_counter() - self.started) * 1000
+
+    def set(self, name: str, value):
+        if name not in METRIC_UNITS:
+            self.properties[name] = value
+
+    def get(self, name: str, default = None):
+        return self.properties.get(name, default)
+
+    def emit(self, response: dict = None):
+        if getattr(_CURRENT, 'metrics', None) is self:
+            _CURRENT.metrics = NULL_METRICS
+
+class _Phase:
+    """
+    Timer adding the elapsed milliseconds of a block to a metric
+    """
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.name, (perf_counter() - self.started) * 1000)
+        return False
+
+class RequestMetrics:
+    """
+    Metrics and properties of one request, emitted as a single EMF line
+    """
+    def __init__(self, trace_id: str = None, cold_start: bool = False, stream = None):
+        """
+        Start timing a request correlated by its X-Amzn-Trace-Id
+        """
+        self.started = perf_counter()
+        self.values = {'ColdStart': 1 if cold_start else 0}
+        self.properties = {'TraceId': trace_id}
+        self.stream = stream
+
+    def elapsed_ms(self) -> float:
+        return (perf_counter() - self.started) * 1000
+
+    def get(self, name: str, default = None):
+        """
+        Value of a metric or property recorded so far
+        """
+        return self.values.get(name, self.properties.get(name, default))
+
+    def phase(self, name: str) -> _Phase:
+        """
+        Time a block, repeated phases of a request add up
+        """
+        return _Phase(self, name)
+
+    def add(self, name: str, value):
+        self.values[name] = self.values.get(name, 0) + value
+
+    def set(self, name: str, value):
+        """
+        Record a metric, or a property when it is not one of METRIC_UNITS
+        """
+        if name in METRIC_UNITS:
+            self.values[name] = value
+        else:
+            self.properties[name] = value
+
+    def record(self, response: dict = None) -> dict:
+        """
+        Build the EMF record of the request, with CacheTier as its only dimension
+        """
+        self.values['Total'] = self.elapsed_ms()
+        if response is not None:
+            self.properties['StatusCode'] = response.get('statusCode')
+        self.properties.setdefault('CacheTier', 'none')
+        return {
+            '_aws': {
+                'Timestamp': int(time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['CacheTier']],
+                    'Metrics': [{'Name': name, 'Unit': METRIC_UNITS[name]} for name in self.values]
+                }]
+            },
+            **self.properties,
+            **{name: round(value, 3) if isinstance(value, float) else value
+               for name, value in self.values.items()}
+        }
+
+    def emit(self, response: dict = None):
+        """
+        Write the EMF record to stdout as one JSON line and stop tracking the request
+        """
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(self.record(response), separators = (',', ':')) + '\n')
+        stream.flush()
+        if getattr(_CURRENT, 'metrics', None) is self:
+            _CURRENT.metrics = NULL_METRICS
+
+def start_request(trace_id: str = None, cold_start: bool = False, track: bool = False):
+    """
+    Start the metrics of the request handled by this thread, a no-op object when disabled.
+    With track, and metrics disabled, only the properties the access log reads are kept.
+    """
+    if METRICS_ENABLED:
+        _CURRENT.metrics = RequestMetrics(trace_id, cold_start)
+    elif track:
+        _CURRENT.metrics = TrackedRequest(trace_id)
+    else:
+        return NULL_METRICS
+    return _CURRENT.metrics
+
+def current_metrics():
+    """
+    Metrics of the request handled by this thread, or the no-op object
+    """
+    return getattr(_CURRENT, 'metrics', NULL_METRICS)
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from os import environ
+from threading import Lock
+import logging
+import time
+
+logger = logging.getLogger()
+
+DEFAULT_NEGATIVE_CACHE_MAX_ENTRIES = 10000
+DEFAULT_NEGATIVE_CACHE_TTL_SECONDS = 10
+
+class NegativeCache:
+    """
+    Bounded LRU of keys S3 reported missing, so repeated requests for broken links are
+    answered with a 404 without calling S3 until the short TTL expires
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, clock=time.monotonic):
+        """
+        Initialize an empty cache, a max_entries or ttl_seconds of 0 disables it
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Build the cache from the NEGATIVE_CACHE_MAX_ENTRIES and NEGATIVE_CACHE_TTL_SECONDS environment variables
+        """
+        return cls(max_entries = int(environ.get('NEGATIVE_CACHE_MAX_ENTRIES', DEFAULT_NEGATIVE_CACHE_MAX_ENTRIES)),
+                   ttl_seconds = float(environ.get('NEGATIVE_CACHE_TTL_SECONDS', DEFAULT_NEGATIVE_CACHE_TTL_SECONDS)))
+
+    def get(self, cache_key):
+        """
+        Return the error message recorded for a missing key, or None when the key is not known missing
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and self._clock() < entry[1]:
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[cache_key]
+            self.misses += 1
+            return None
+
+    def put(self, cache_key, message: str):
+        """
+        Record a key as missing, evicting the oldest entries beyond max_entries
+        """
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[cache_key] = (message, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+    def invalidate(self, cache_key):
+        """
+        Forget a single key, e.g. once it has been uploaded
+        """
+        with self._lock:
+            self._entries.pop(cache_key, None)
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+import json
+
+# Event sources of the Records entries of an S3 event notification delivered directly, through
+# an SQS queue or through an SNS topic.
+NOTIFICATION_SOURCES = ('aws:s3', 'aws:sqs', 'aws:sns')
+
+class BucketChange:
+    """
+    Object created, overwritten or deleted in a bucket, as reported by an S3 event notification
+    """
+    __slots__ = ('bucket', 'key', 'removed', 'size', 'etag', 'event_time')
+
+    def __init__(self, bucket: str, key: str, removed: bool, size: int = None, etag: str = None,
+                 event_time: datetime = None):
+        self.bucket = bucket
+        self.key = key
+        self.removed = removed
+        self.size = size
+        self.etag = etag
+        self.event_time = event_time
+
+def _record_source(record) -> str:
+    if not isinstance(record, dict):
+        return None
+    return record.get('eventSource') or record.get('EventSource')
+
+def is_bucket_notification(event) -> bool:
+    """
+    True for an S3, SQS or SNS event, as opposed to an ALB request
+    """
+    records = event.get('Records') if isinstance(event, dict) else None
+    return bool(records) and isinstance(records, list) and _record_source(records[0]) in NOTIFICATION_SOURCES
+
+def s3_records(record: dict) -> list:
+    """
+    S3 records carried by one Records entry, unwrapping SQS bodies and SNS messages, an SNS
+    message delivered to SQS included. s3:TestEvent messages carry none.
+    """
+    source = _record_source(record)
+    if source == 'aws:s3':
+        return [record]
+    if source == 'aws:sqs':
+        payload = json.loads(record['body'])
+    elif source == 'aws:sns':
+        payload = json.loads(record['Sns']['Message'])
+    else:
+        return []
+    if payload.get('Type') == 'Notification' and 'Message' in payload:
+        payload = json.loads(payload['Message'])
+    return [inner for inner in payload.get('Records', []) if _record_source(inner) == 'aws:s3']
+
+def parse_event_time(value: str) -> datetime:
+    """
+    Parse the ISO 8601 eventTime of a record, None when absent or malformed
+    """
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+    except (AttributeError, ValueError):
+        return None
+
+def bucket_change(s3_record: dict) -> BucketChange:
+    """
+    Change described by an S3 record, None for events other than creations and removals.
+    Object keys are URL-encoded in notifications.
+    """
+    event_name = s3_record.get('eventName', '')
+    if event_name.startswith('ObjectCreated'):
+        removed = False
+    elif event_name.startswith('ObjectRemoved') or event_name == 'LifecycleExpiration:Delete':
+        removed = True
+    else:
+        return None
+    s3_entity = s3_record['s3']
+    s3_object = s3_entity['object']
+    return BucketChange(bucket = s3_entity['bucket']['name'],
+                        key = unquote_plus(s3_object['key']),
+                        removed = removed,
+                        size = s3_object.get('size'),
+                        etag = '"%s"' % s3_object['eTag'] if s3_object.get('eTag') else None,
+                        event_time = parse_event_time(s3_record.get('eventTime')))
+
+def bucket_changes(record: dict) -> list:
+    """
+    Changes carried by one Records entry of a notification event
+    """
+    changes = (bucket_change(s3_record) for s3_record in s3_records(record))
+    return [change for change in changes if change is not None]
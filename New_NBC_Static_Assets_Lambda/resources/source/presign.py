@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from os import environ
+from threading import Lock
+import logging
+import time
+
+logger = logging.getLogger()
+
+DEFAULT_PRESIGNED_URL_EXPIRY_SECONDS = 300
+DEFAULT_PRESIGNED_URL_REFRESH_SECONDS = 60
+
+class PresignedUrlCache:
+    """
+    Presigned GetObject URLs per key, reused until shortly before they expire so hot
+    large objects are not re-signed on every request
+    """
+    def __init__(self, expires_in: int, refresh_margin: int, max_entries: int = 4096, clock=time.monotonic):
+        """
+        Initialize an empty cache, URLs are replaced refresh_margin seconds before they expire
+        """
+        self.expires_in = expires_in
+        self.refresh_margin = min(refresh_margin, expires_in)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = Lock()
+        self._urls = OrderedDict()
+        self.signed = 0
+        self.reused = 0
+
+    @classmethod
+    def from_environ(cls):
+        """
+        Build the cache from the PRESIGNED_URL_EXPIRY_SECONDS and PRESIGNED_URL_REFRESH_SECONDS environment variables
+        """
+        return cls(expires_in = int(environ.get('PRESIGNED_URL_EXPIRY_SECONDS', DEFAULT_PRESIGNED_URL_EXPIRY_SECONDS)),
+                   refresh_margin = int(environ.get('PRESIGNED_URL_REFRESH_SECONDS', DEFAULT_PRESIGNED_URL_REFRESH_SECONDS)))
+
+    def get_url(self, s3, s3_file_key: str) -> str:
+        """
+        Return a presigned GetObject URL valid for at least refresh_margin more seconds
+        """
+        cache_key = (s3.bucket_name, s3_file_key)
+        now = self._clock()
+        with self._lock:
+            cached = self._urls.get(cache_key)
+            if cached is not None and now < cached[1]:
+                self._urls.move_to_end(cache_key)
+                self.reused += 1
+                return cached[0]
+        url = s3.client.generate_presigned_url('get_object',
+                                               Params = {"Bucket": s3.bucket_name, "Key": s3_file_key},
+                                               ExpiresIn = self.expires_in)
+        with self._lock:
+            self._urls[cache_key] = (url, now + self.expires_in - self.refresh_margin)
+            self._urls.move_to_end(cache_key)
+            if len(self._urls) > self.max_entries:
+                self._urls.popitem(last = False)
+            self.signed += 1
+        return url
+
+    def invalidate(self, cache_key):
+        """
+        Drop the URL of a single key
+        """
+        with self._lock:
+            self._urls.pop(cache_key, None)
+
+    def clear(self):
+        """
+        Drop every URL and reset the counters
+        """
+        with self._lock:
+            self._urls.clear()
+            self.signed = self.reused = 0
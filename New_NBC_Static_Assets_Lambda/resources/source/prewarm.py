@@ -0,0 +1,188 @@
+from os import environ, path
+from threading import Lock, Thread
+import json
+import logging
+import time
+
+logger = logging.getLogger()
+
+PREWARM_MAX_BYTES = int(environ.get('PREWARM_MAX_BYTES', 16 * 1024 * 1024))
+PREWARM_MAX_SECONDS = float(environ.get('PREWARM_MAX_SECONDS', 5))
+
+class FirstRequestStats:
+    """
+    Cache outcome of the first request for each key in this execution environment:
+    'hit' when it was cached, 'coalesced' when it waited on a prefetch already in flight,
+    'miss' when it went to S3
+    """
+    def __init__(self, max_keys: int = 100000):
+        """
+        Initialize with no key seen, at most max_keys are remembered
+        """
+        self.max_keys = max_keys
+        self._lock = Lock()
+        self._seen = set()
+        self.counts = {'hit': 0, 'coalesced': 0, 'miss': 0}
+
+    def record(self, cache_key, outcome: str):
+        """
+        Count the outcome of a request if it is the first one for its key
+        """
+        with self._lock:
+            if cache_key in self._seen or len(self._seen) >= self.max_keys:
+                return
+            self._seen.add(cache_key)
+            self.counts[outcome] += 1
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+            self.counts = {'hit': 0, 'coalesced': 0, 'miss': 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {**self.counts,
+                    "hit_ratio": self.counts['hit'] / total if total else 0.0}
+
+def parse_manifest(manifest: dict) -> list:
+    """
+    Keys of a hot-key manifest, highest priority first. Entries are key strings or
+    {"key": ..., "priority": ...} objects, a missing priority counts as 0.
+    """
+    entries = []
+    for position, entry in enumerate(manifest.get('keys', [])):
+        if isinstance(entry, str):
+            entries.append((0, position, entry))
+        else:
+            entries.append((-float(entry.get('priority', 0)), position, entry['key']))
+    return [key for _, _, key in sorted(entries)]
+
+def parse_manifest_sizes(manifest: dict) -> dict:
+    """
+    Sizes in bytes of the hot-key manifest entries giving one, as {"key": ..., "size": ...}
+    """
+    return {entry['key']: int(entry['size']) for entry in manifest.get('keys', [])
+            if not isinstance(entry, str) and entry.get('size') is not None}
+
+def read_manifest(s3, location: str) -> dict:
+    """
+    Read a JSON manifest from 's3://bucket/key', from 's3:key' in the assets bucket, or from a
+    file bundled with the function (relative paths are resolved against this directory)
+    """
+    if location.startswith('s3:'):
+        bucket_and_key = location[len('s3://'):] if location.startswith('s3://') else None
+        if bucket_and_key is None:
+            bucket, key = s3.bucket_name, location[len('s3:'):]
+        else:
+            bucket, _, key = bucket_and_key.partition('/')
+        body = s3.client.get_object(Bucket = bucket, Key = key)['Body'].read()
+        return json.loads(body)
+    if not path.isabs(location):
+        location = path.join(path.dirname(path.abspath(__file__)), location)
+    with open(location, "r", encoding='UTF-8') as file_handle:
+        return json.load(file_handle)
+
+def load_manifest(s3, location: str) -> list:
+    """
+    Load the keys of a hot-key manifest, see read_manifest for the locations
+    """
+    return parse_manifest(read_manifest(s3, location))
+
+class Prewarmer:
+    """
+    Prefetches the keys of a hot-key manifest into the cache during the init phase,
+    on a background thread, within a byte and time budget
+    """
+    def __init__(self, max_bytes: int = PREWARM_MAX_BYTES, max_seconds: float = PREWARM_MAX_SECONDS):
+        """
+        Initialize an idle prewarmer
+        """
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self._thread = None
+        self.state = 'idle'
+        self.duration_seconds = None
+        self.keys_loaded = 0
+        self.bytes_loaded = 0
+        self.keys_skipped = 0
+        self.errors = 0
+
+    def start(self, get_s3, location: str, prefetch, is_cached, known_size = None) -> Thread:
+        """
+        Run the prewarm on a daemon thread, see run()
+        """
+        self._thread = Thread(target = self.run, args = (get_s3, location, prefetch, is_cached, known_size),
+                              name = 'prewarm', daemon = True)
+        self.state = 'running'
+        self._thread.start()
+        return self._thread
+
+    def run(self, get_s3, location: str, prefetch, is_cached, known_size = None):
+        """
+        Load the manifest and prefetch its keys in priority order until a budget runs out.
+        prefetch(s3, key, max_body_bytes) fetches a key into the cache and returns the object,
+        without its body when it is larger than the byte budget left. is_cached(s3, key) tells
+        whether a key is already cached, known_size(s3, key) returns the size of a key known
+        without calling S3 or None. Keys whose manifest or known size exceeds the budget left
+        are skipped without a GetObject.
+        """
+        self.state = 'running'
+        started = time.monotonic()
+        try:
+            s3 = get_s3()
+            manifest = read_manifest(s3, location)
+            keys = parse_manifest(manifest)
+            sizes = parse_manifest_sizes(manifest)
+            for position, key in enumerate(keys):
+                remaining_bytes = self.max_bytes - self.bytes_loaded
+                if time.monotonic() - started >= self.max_seconds or remaining_bytes <= 0:
+                    self.keys_skipped += len(keys) - position
+                    break
+                if is_cached(s3, key):
+                    continue
+                size = sizes.get(key)
+                if size is None and known_size is not None:
+                    size = known_size(s3, key)
+                if size is not None and size > remaining_bytes:
+                    self.keys_skipped += 1
+                    continue
+                try:
+                    s3_object = prefetch(s3, key, remaining_bytes)
+                except Exception as prefetch_error:
+                    self.errors += 1
+                    logger.warning("Unable to prewarm object '%s': '%s'.", key, str(prefetch_error))
+                    continue
+                if s3_object.body is None:
+                    self.keys_skipped += 1
+                else:
+                    self.keys_loaded += 1
+                    self.bytes_loaded += len(s3_object.body)
+            self.state = 'done'
+        except Exception as manifest_error:
+            self.state = 'failed'
+            logger.warning("Unable to prewarm from manifest '%s': '%s'.", location, str(manifest_error))
+        finally:
+            self.duration_seconds = time.monotonic() - started
+            logger.info("Prewarm %s in %.1f ms: %d objects, %d bytes, %d skipped, %d errors.",
+                        self.state, self.duration_seconds * 1000, self.keys_loaded,
+                        self.bytes_loaded, self.keys_skipped, self.errors)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the prewarm thread, True when it has finished
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "duration_ms": None if self.duration_seconds is None else round(self.duration_seconds * 1000, 3),
+            "keys_loaded": self.keys_loaded,
+            "bytes_loaded": self.bytes_loaded,
+            "keys_skipped": self.keys_skipped,
+            "errors": self.errors
+        }
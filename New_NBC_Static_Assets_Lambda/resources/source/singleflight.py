@@ -0,0 +1,63 @@
+from threading import Event, Lock
+
+class _Call:
+    """
+    A call in flight and its outcome
+    """
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the function and
+    the others wait for its result, so N concurrent cache misses cost one S3 fetch
+    """
+    def __init__(self):
+        """
+        Initialize with no call in flight
+        """
+        self._lock = Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        """
+        Run function once for all concurrent callers of key and return (result, shared),
+        where shared is True for callers that waited on another caller's run
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                is_leader = True
+            else:
+                self.shared += 1
+                is_leader = False
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self, key) -> bool:
+        """
+        True while a call for key is running
+        """
+        with self._lock:
+            return key in self._calls
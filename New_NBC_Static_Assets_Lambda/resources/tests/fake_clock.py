@@ -0,0 +1,9 @@
+class FakeClock:
+    """
+    Manually advanced clock for TTL, expiry and staleness tests
+    """
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
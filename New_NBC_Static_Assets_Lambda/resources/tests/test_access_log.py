@@ -0,0 +1,73 @@
+import sys
+import json
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.insert(1, 'resources/source')
+from access_log import AccessLog
+from metrics import TrackedRequest
+
+class UnformattableBody(str):
+    """
+    Body that fails the test if the access log formats it instead of taking its length
+    """
+    def __str__(self):
+        raise AssertionError("body was formatted")
+
+    __repr__ = __format__ = __str__
+
+class TestAccessLog(TestCase):
+    """
+    Test class for the sampled access log
+    """
+
+    def setUp(self) -> None:
+        """
+        Create an access log writing to a mocked logger
+        """
+        self.logger = MagicMock()
+        self.logger.isEnabledFor.return_value = True
+        self.access_log = AccessLog(level = logging.INFO, sample_rate = 1.0, max_field_chars = 16,
+                                    logger = self.logger, sample = lambda: 0.5)
+
+    def test_one_compact_line_from_computed_fields(self) -> None:
+        """
+        Verify the line holds the key, status, body length and cache tier, never the body
+        """
+        request_metrics = TrackedRequest("Root=1-abc")
+        request_metrics.set("Key", "css/site.css")
+        request_metrics.set("CacheTier", "memory")
+        self.access_log.log(request_metrics, {"statusCode": 200, "body": UnformattableBody("x" * 5000)}, "GET")
+
+        level, message_format, line = self.logger.log.call_args[0]
+        record = json.loads(line)
+        self.assertEqual(level, logging.INFO)
+        self.assertEqual(record["key"], "css/site.css")
+        self.assertEqual(record["method"], "GET")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["bytes"], 5000)
+        self.assertEqual(record["cache_tier"], "memory")
+        self.assertNotIn(" ", line)
+
+    def test_long_fields_are_capped(self) -> None:
+        """
+        Verify string fields are truncated to max_field_chars
+        """
+        request_metrics = TrackedRequest()
+        request_metrics.set("Key", "k" * 100)
+        self.access_log.log(request_metrics, {"statusCode": 404})
+
+        record = json.loads(self.logger.log.call_args[0][2])
+        self.assertEqual(record["key"], "k" * 16 + "...")
+
+    def test_disabled_level_and_sampling_skip_the_request(self) -> None:
+        """
+        Verify nothing is logged when the level is disabled or the request is not sampled
+        """
+        self.assertTrue(self.access_log.should_log())
+        self.access_log.sample_rate = 0.25
+        self.assertFalse(self.access_log.should_log())
+        self.access_log.sample_rate = 1.0
+        self.logger.isEnabledFor.return_value = False
+        self.assertFalse(self.access_log.should_log())
@@ -0,0 +1,47 @@
+import sys
+import io
+import base64
+from unittest import TestCase
+from botocore.exceptions import IncompleteReadError
+
+sys.path.insert(1, 'resources/source')
+from body import encode_base64, encode_body, is_text, read_body
+
+class TestBody(TestCase):
+    """
+    Test class for the response body pipeline
+    """
+
+    def test_read_body_fills_presized_buffer(self) -> None:
+        """
+        Verify the body is read whole into a read-only buffer
+        """
+        body = read_body(io.BytesIO(b"Hello World"), 11)
+        self.assertEqual(bytes(body), b"Hello World")
+        self.assertTrue(body.readonly)
+
+    def test_read_body_detects_truncated_stream(self) -> None:
+        """
+        Verify a stream shorter than its ContentLength raises IncompleteReadError
+        """
+        with self.assertRaises(IncompleteReadError):
+            read_body(io.BytesIO(b"Hello"), 11)
+
+    def test_encode_base64_matches_b64encode(self) -> None:
+        """
+        Verify encoding matches base64.b64encode for bytes and memoryviews, including padding
+        """
+        for size in (0, 1, 2, 3, 1000):
+            body = bytes(index % 251 for index in range(size))
+            self.assertEqual(encode_base64(memoryview(body)), base64.b64encode(body).decode('ascii'))
+
+    def test_encode_body_returns_raw_text(self) -> None:
+        """
+        Verify UTF-8 text is returned as is and anything else is base64-encoded
+        """
+        self.assertEqual(encode_body(memoryview("café".encode()), "text/css; charset=utf-8"), ("café", False))
+        self.assertEqual(encode_body(b"\xff", "text/plain"), ("/w==", True))
+        self.assertEqual(encode_body(b"a", "text/plain", "gzip"), ("YQ==", True))
+        self.assertFalse(is_text("text/plain; charset=iso-8859-1"))
+        self.assertFalse(is_text("image/png"))
+        self.assertTrue(is_text("image/svg+xml"))
@@ -0,0 +1,109 @@
+import sys
+import os
+import io
+import json
+import base64
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+from boto3 import resource, client
+import moto
+
+sys.path.insert(1, 'resources/source')
+from app import S3Resource, lambda_handler, OBJECT_CACHE, DISK_CACHE, NEGATIVE_CACHE
+from bundle import BundleRequestError, parse_bundle_keys
+
+@moto.mock_s3
+class TestBundle(TestCase):
+    """
+    Test class for the asset bundle route
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a mocked bucket holding a few small assets
+        """
+        self.test_s3_bucket_name = "unit_test_s3_bucket"
+        os.environ["S3_BUCKET_NAME"] = self.test_s3_bucket_name
+        os.environ["LAMBDA_PATH"] = "/static/"
+
+        s3_client = client('s3', region_name="us-east-1")
+        s3_client.create_bucket(Bucket = self.test_s3_bucket_name)
+        s3_client.put_object(Body=b"a {}", Bucket=self.test_s3_bucket_name, Key="css/a.css",
+                             ContentType="text/css")
+        s3_client.put_object(Body=b"var b;", Bucket=self.test_s3_bucket_name, Key="js/b.js",
+                             ContentType="application/javascript")
+        self.mocked_s3_class = S3Resource()
+        OBJECT_CACHE.clear()
+        DISK_CACHE.clear()
+        NEGATIVE_CACHE.clear()
+        self.patcher = patch("app.get_s3_resource", return_value=self.mocked_s3_class)
+        self.patcher.start()
+
+    def bundle_event(self, **overrides) -> dict:
+        event = {"httpMethod": "GET", "path": "/static/_bundle", "queryStringParameters": {},
+                 "headers": {}, "body": "", "isBase64Encoded": False}
+        event.update(overrides)
+        return event
+
+    def test_json_bundle_reports_per_key_status(self) -> None:
+        """
+        Verify found keys are returned base64 encoded, a missing key does not fail the bundle and is
+        then answered from the negative cache.
+        """
+        test_return_value = lambda_handler(self.bundle_event(
+            queryStringParameters={"keys": "css/a.css,js%2Fb.js,missing.js"}), None)
+        objects = json.loads(test_return_value["body"])["objects"]
+
+        self.assertEqual(test_return_value["statusCode"], 200)
+        self.assertEqual(list(objects), ["css/a.css", "js/b.js", "missing.js"])
+        self.assertEqual(base64.b64decode(objects["css/a.css"]["body"]), b"a {}")
+        self.assertEqual(objects["js/b.js"]["content_type"], "application/javascript")
+        self.assertEqual(objects["missing.js"]["status"], 404)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 3)
+
+        second_return_value = lambda_handler(self.bundle_event(
+            queryStringParameters={"keys": "missing.js"}), None)
+        self.assertEqual(json.loads(second_return_value["body"])["objects"]["missing.js"]["status"], 404)
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+    def test_zip_bundle_from_post_body(self) -> None:
+        """
+        Verify keys listed in a POST body can be returned as a zip archive.
+        """
+        test_return_value = lambda_handler(self.bundle_event(
+            httpMethod="POST", queryStringParameters={"format": "zip"},
+            body=json.dumps({"keys": ["css/a.css", "missing.js"]})), None)
+        archive = zipfile.ZipFile(io.BytesIO(base64.b64decode(test_return_value["body"])))
+
+        self.assertEqual(test_return_value["headers"]["Content-Type"], "application/zip")
+        self.assertEqual(archive.read("css/a.css"), b"a {}")
+        self.assertEqual(json.loads(archive.read("_status.json"))["missing.js"]["status"], 404)
+
+    def test_invalid_bundle_requests_return_400(self) -> None:
+        """
+        Verify a bundle request without keys is rejected.
+        """
+        test_return_value = lambda_handler(self.bundle_event(), None)
+
+        self.assertEqual(test_return_value["statusCode"], 400)
+        with self.assertRaises(BundleRequestError):
+            parse_bundle_keys({"body": "not json"})
+
+    def test_invalid_base64_body_returns_400(self) -> None:
+        """
+        Verify a base64 flagged POST body that does not decode is rejected instead of failing the handler.
+        """
+        test_return_value = lambda_handler(self.bundle_event(
+            httpMethod="POST", body="!!!notb64", isBase64Encoded=True), None)
+
+        self.assertEqual(test_return_value["statusCode"], 400)
+        self.assertIn("base64", test_return_value["body"])
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        s3_resource = resource("s3",region_name="us-east-1")
+        s3_bucket = s3_resource.Bucket( self.test_s3_bucket_name )
+        for key in s3_bucket.objects.all():
+            key.delete()
+        s3_bucket.delete()
@@ -0,0 +1,91 @@
+import sys
+from unittest import TestCase
+
+sys.path.insert(1, 'resources/source')
+sys.path.insert(1, 'resources/tests')
+from cache import ObjectCache
+from fetch import S3Object
+from body import EncodedResponse
+from fake_clock import FakeClock
+
+class TestObjectCache(TestCase):
+    """
+    Test class for the in-memory object cache
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a small cache driven by a fake clock
+        """
+        self.clock = FakeClock()
+        self.cache = ObjectCache(max_bytes = 10, ttl_seconds = 5, clock = self.clock)
+
+    def make_object(self, size: int) -> S3Object:
+        return S3Object(body = b"x" * size, content_type = "plain/text",
+                        content_length = size, etag = '"etag"')
+
+    def test_evicts_least_recently_used_entries_over_byte_budget(self) -> None:
+        """
+        Verify the cache is bounded by total bytes and evicts the least recently used entry.
+        """
+        self.cache.put("a", self.make_object(4))
+        self.cache.put("b", self.make_object(4))
+        self.cache.get("a")
+        self.cache.put("c", self.make_object(4))
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+        self.assertEqual(self.cache.stats()["bytes"], 8)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_does_not_cache_objects_larger_than_budget(self) -> None:
+        """
+        Verify an object larger than the whole budget is never cached.
+        """
+        self.cache.put("big", self.make_object(11))
+
+        self.assertIsNone(self.cache.get("big"))
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+
+    def test_entries_go_stale_after_ttl(self) -> None:
+        """
+        Verify entries are fresh within the TTL and need revalidation after it.
+        """
+        self.cache.put("a", self.make_object(1))
+        self.assertTrue(self.cache.get("a")[1])
+
+        self.clock.now = 5
+        self.assertFalse(self.cache.get("a")[1])
+
+        self.cache.mark_not_modified("a")
+        self.assertTrue(self.cache.get("a")[1])
+        self.assertEqual(self.cache.stats()["hits"], 2)
+        self.assertEqual(self.cache.stats()["revalidations"], 1)
+        self.assertEqual(self.cache.stats()["not_modified"], 1)
+
+    def test_peek_shares_the_budget_without_counting(self) -> None:
+        """
+        Verify encoded responses share the byte budget, never go stale and are not counted as lookups.
+        """
+        self.cache.put("a", self.make_object(4))
+        self.cache.put(("a", "response"), EncodedResponse("eHh4", True, {}))
+        self.clock.now = 5
+
+        self.assertEqual(self.cache.peek(("a", "response")).body, "eHh4")
+        self.assertIsNone(self.cache.peek("missing"))
+        self.assertEqual(self.cache.stats()["bytes"], 8)
+        self.assertEqual(self.cache.stats()["hits"] + self.cache.stats()["misses"], 0)
+
+    def test_invalidate_where_drops_matching_entries(self) -> None:
+        """
+        Verify every entry derived from a key is dropped and the byte count follows.
+        """
+        self.cache.put(("bucket", "a"), self.make_object(2))
+        self.cache.put(("bucket", "a", "response", '"etag"', None, None), self.make_object(3))
+        self.cache.put(("bucket", "b"), self.make_object(4))
+
+        self.assertEqual(self.cache.invalidate_where(lambda cache_key: cache_key[1] == "a"), 2)
+        self.assertFalse(self.cache.contains(("bucket", "a")))
+        self.assertTrue(self.cache.contains(("bucket", "b")))
+        self.assertEqual(self.cache.stats()["bytes"], 4)
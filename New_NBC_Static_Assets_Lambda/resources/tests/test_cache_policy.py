@@ -0,0 +1,76 @@
+import sys
+import json
+import os
+from unittest import TestCase
+
+sys.path.insert(1, 'resources/source')
+from cache_policy import CachePolicy, DEFAULT_POLICY_FILE
+
+class TestCachePolicy(TestCase):
+    """
+    Test class for the Cache-Control policy
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a policy with one rule of every kind
+        """
+        self.policy = CachePolicy(rules = [
+            {"glob": "*.min.js", "cache_control": "public, max-age=31536000, immutable"},
+            {"prefix": "annual_disclosure/", "cache_control": "public, max-age=300", "expires": 300},
+            {"content_type": "image/*", "cache_control": "public, max-age=86400", "vary": "Accept"},
+            {"content_type": "application/pdf", "cache_control": "public, max-age=600"},
+            {"prefix": "annual_disclosure/archive/", "cache_control": "never matched"}
+        ], default = {"cache_control": "no-cache"})
+
+    def test_first_matching_rule_wins(self) -> None:
+        """
+        Verify rules are applied in order across prefixes, globs and content types.
+        """
+        self.assertEqual(self.policy.headers_for("annual_disclosure/archive/a.pdf", "application/pdf")
+                         ["Cache-Control"], "public, max-age=300")
+        self.assertEqual(self.policy.headers_for("reports/a.pdf", "application/pdf")
+                         ["Cache-Control"], "public, max-age=600")
+        self.assertEqual(self.policy.headers_for("annual_disclosure/app.min.js", "text/javascript")
+                         ["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_content_type_wildcards_and_parameters(self) -> None:
+        """
+        Verify 'type/*' rules match and media type parameters are ignored.
+        """
+        headers = self.policy.headers_for("logo.png", "image/png; charset=binary")
+        self.assertEqual(headers["Cache-Control"], "public, max-age=86400")
+        self.assertEqual(headers["Vary"], "Accept")
+
+    def test_expires_and_default(self) -> None:
+        """
+        Verify Expires is emitted for rules with a lifetime and the default applies otherwise.
+        """
+        self.assertTrue(self.policy.headers_for("annual_disclosure/a.pdf")["Expires"].endswith(" GMT"))
+        self.assertEqual(self.policy.headers_for("sample.txt", "plain/text"), {"Cache-Control": "no-cache"})
+
+    def test_rule_needs_exactly_one_matcher(self) -> None:
+        """
+        Verify ambiguous rules are rejected when the policy is loaded.
+        """
+        with self.assertRaises(ValueError):
+            CachePolicy(rules = [{"prefix": "a/", "glob": "*.pdf", "cache_control": "no-cache"}])
+
+    def test_loads_bundled_and_inline_policies(self) -> None:
+        """
+        Verify the bundled policy file and the CACHE_POLICY environment variable load.
+        """
+        bundled_policy = CachePolicy.from_file(DEFAULT_POLICY_FILE)
+        self.assertEqual(bundled_policy.headers_for("annual_disclosure/hello_world.pdf")["Cache-Control"],
+                         "public, max-age=300")
+        self.assertEqual(bundled_policy.headers_for("app.0123abcd.js")["Cache-Control"],
+                         "public, max-age=31536000, immutable")
+        self.assertEqual(bundled_policy.headers_for("annual_disclosure/report.20231231.pdf")["Cache-Control"],
+                         "public, max-age=300")
+        self.assertEqual(bundled_policy.headers_for("report.20231231.pdf")["Cache-Control"], "no-cache")
+
+        os.environ["CACHE_POLICY"] = json.dumps({"default": {"cache_control": "no-store"}})
+        try:
+            self.assertEqual(CachePolicy.from_environ().headers_for("a"), {"Cache-Control": "no-store"})
+        finally:
+            del os.environ["CACHE_POLICY"]
@@ -0,0 +1,48 @@
+import sys
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.insert(1, 'resources/source')
+from client_config import client_config_from_environ, client_settings_from_environ
+
+class TestClientConfig(TestCase):
+    """
+    Test class for the S3 client configuration read from the environment
+    """
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_defaults(self) -> None:
+        """
+        Verify the defaults enable keep-alive, bounded timeouts and standard retries.
+        """
+        settings = client_settings_from_environ()
+
+        self.assertEqual(settings["max_pool_connections"], 32)
+        self.assertTrue(settings["tcp_keepalive"])
+        self.assertEqual(settings["connect_timeout"], 2.0)
+        self.assertEqual(settings["read_timeout"], 10.0)
+        self.assertEqual(settings["retries"], {"mode": "standard", "max_attempts": 3})
+
+    @patch.dict(os.environ, {"S3_MAX_POOL_CONNECTIONS": "64", "S3_TCP_KEEPALIVE": "false",
+                             "S3_CONNECT_TIMEOUT_SECONDS": "0.5", "S3_READ_TIMEOUT_SECONDS": "3",
+                             "S3_RETRY_MODE": "Adaptive", "S3_MAX_ATTEMPTS": "5"})
+    def test_environment_overrides(self) -> None:
+        """
+        Verify every setting can be tuned from the function environment.
+        """
+        config = client_config_from_environ()
+
+        self.assertEqual(config.max_pool_connections, 64)
+        self.assertFalse(config.tcp_keepalive)
+        self.assertEqual(config.connect_timeout, 0.5)
+        self.assertEqual(config.read_timeout, 3.0)
+        self.assertEqual(config.retries, {"mode": "adaptive", "max_attempts": 5})
+
+    @patch.dict(os.environ, {"S3_RETRY_MODE": "aggressive"})
+    def test_rejects_unknown_retry_mode(self) -> None:
+        """
+        Verify a misspelt retry mode fails at init instead of silently using the default.
+        """
+        with self.assertRaises(ValueError):
+            client_settings_from_environ()
@@ -0,0 +1,78 @@
+import sys
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import TestCase
+
+sys.path.insert(1, 'resources/source')
+from disk_cache import DiskCache
+from fetch import S3Object
+
+class TestDiskCache(TestCase):
+    """
+    Test class for the /tmp object cache
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a cache in a fresh temporary directory
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(directory = self.temp_dir.name, max_bytes = 4096, ttl_seconds = 60)
+
+    def make_object(self, body: bytes) -> S3Object:
+        return S3Object(body = body, content_type = "application/pdf", content_length = len(body),
+                        etag = '"etag"', last_modified = datetime(2023, 5, 30, tzinfo = timezone.utc))
+
+    def test_round_trips_body_and_metadata_through_mmap(self) -> None:
+        """
+        Verify a cached object is read back with its metadata and an mmap-backed body.
+        """
+        self.cache.put(("bucket", "a.pdf"), self.make_object(b"%PDF-1.7"))
+        s3_object, is_fresh = self.cache.get(("bucket", "a.pdf"))
+
+        self.assertTrue(is_fresh)
+        self.assertIsInstance(s3_object.body, memoryview)
+        self.assertEqual(bytes(s3_object.body), b"%PDF-1.7")
+        self.assertEqual(s3_object.content_type, "application/pdf")
+        self.assertEqual(s3_object.etag, '"etag"')
+        self.assertEqual(s3_object.last_modified, datetime(2023, 5, 30, tzinfo = timezone.utc))
+        self.assertEqual(os.listdir(self.temp_dir.name), [os.path.basename(self.cache._path(("bucket", "a.pdf")))])
+
+    def test_evicts_oldest_files_over_byte_budget(self) -> None:
+        """
+        Verify the total size of the cache files stays within the byte budget.
+        """
+        for name in ("a", "b", "c"):
+            self.cache.put(("bucket", name), self.make_object(b"x" * 1500))
+
+        self.assertIsNone(self.cache.get(("bucket", "a")))
+        self.assertIsNotNone(self.cache.get(("bucket", "c")))
+        self.assertLessEqual(self.cache.stats()["bytes"], 4096)
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 2)
+
+    def test_reindexes_existing_files_as_stale(self) -> None:
+        """
+        Verify a new cache instance picks up files written earlier and revalidates them first.
+        """
+        self.cache.put(("bucket", "a"), self.make_object(b"hello"))
+        reopened_cache = DiskCache(directory = self.temp_dir.name, max_bytes = 4096, ttl_seconds = 60)
+        s3_object, is_fresh = reopened_cache.get(("bucket", "a"))
+
+        self.assertFalse(is_fresh)
+        self.assertEqual(bytes(s3_object.body), b"hello")
+
+    def test_drops_truncated_files(self) -> None:
+        """
+        Verify a cache file shorter than its recorded length is never served.
+        """
+        self.cache.put(("bucket", "a"), self.make_object(b"hello"))
+        path = self.cache._path(("bucket", "a"))
+        with open(path, "r+b") as file_handle:
+            file_handle.truncate(os.path.getsize(path) - 1)
+
+        self.assertIsNone(self.cache.get(("bucket", "a")))
+        self.assertFalse(os.path.exists(path))
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
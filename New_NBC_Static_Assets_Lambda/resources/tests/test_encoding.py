@@ -0,0 +1,47 @@
+import sys
+from unittest import TestCase
+
+sys.path.insert(1, 'resources/source')
+from encoding import acceptable_codings, is_compressible, merge_vary, parse_accept_encoding, variant_etag
+
+class TestEncoding(TestCase):
+    """
+    Test class for the Content-Encoding negotiation helpers
+    """
+
+    def test_parse_accept_encoding(self) -> None:
+        """
+        Verify codings and their q-values are parsed.
+        """
+        self.assertEqual(parse_accept_encoding("gzip, deflate;q=0.5, br;q=0"),
+                         {"gzip": 1.0, "deflate": 0.5, "br": 0.0})
+        self.assertEqual(parse_accept_encoding(None), {})
+
+    def test_acceptable_codings_ranks_by_quality_then_preference(self) -> None:
+        """
+        Verify refused codings are dropped and brotli is preferred on equal quality.
+        """
+        self.assertEqual(acceptable_codings({"gzip": 1.0, "br": 1.0}, ("br", "gzip")), ["br", "gzip"])
+        self.assertEqual(acceptable_codings({"gzip": 1.0, "br": 0.5}, ("br", "gzip")), ["gzip", "br"])
+        self.assertEqual(acceptable_codings({"br": 0.0, "*": 1.0}, ("br", "gzip")), ["gzip"])
+        self.assertEqual(acceptable_codings({"identity": 1.0}, ("br", "gzip")), [])
+
+    def test_is_compressible(self) -> None:
+        """
+        Verify text-like content types are compressible and binary ones are not.
+        """
+        self.assertTrue(is_compressible("text/html; charset=utf-8"))
+        self.assertTrue(is_compressible("image/svg+xml"))
+        self.assertFalse(is_compressible("application/pdf"))
+        self.assertFalse(is_compressible(None))
+
+    def test_variant_etag_and_vary(self) -> None:
+        """
+        Verify encoded representations get their own ETag and Vary is merged.
+        """
+        self.assertEqual(variant_etag('"abc"', "gzip"), '"abc-gzip"')
+        self.assertEqual(variant_etag('W/"abc"', "br"), 'W/"abc-br"')
+        headers = {"Vary": "Accept"}
+        merge_vary(headers, "Accept-Encoding")
+        merge_vary(headers, "accept-encoding")
+        self.assertEqual(headers["Vary"], "Accept, Accept-Encoding")
@@ -0,0 +1,69 @@
+import sys
+import os
+import tempfile
+from hashlib import md5
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.insert(1, 'resources/source')
+sys.path.insert(1, 'resources/tests')
+from fingerprint import FingerprintManifest, build_manifest_from_bucket, build_manifest_from_directory, fingerprint
+from fake_clock import FakeClock
+
+class TestFingerprint(TestCase):
+    """
+    Test class for the content fingerprint manifest
+    """
+
+    def test_fingerprint_of_single_and_multipart_etags(self) -> None:
+        """
+        Verify a single-part ETag gives the MD5 prefix and a multipart one a hex hash
+        """
+        content_md5 = md5(b"Hello World").hexdigest()
+        self.assertEqual(fingerprint('"%s"' % content_md5), content_md5[:12])
+        multipart = fingerprint('"%s-3"' % content_md5)
+        self.assertEqual(len(multipart), 12)
+        self.assertTrue(all(character in "0123456789abcdef" for character in multipart))
+
+    def test_directory_and_bucket_manifests_agree(self) -> None:
+        """
+        Verify a local copy hashes to the same fingerprints as the ETags S3 lists, under the same full keys
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "assets", "css"))
+            with open(os.path.join(directory, "assets", "css", "site.css"), "wb") as file_handle:
+                file_handle.write(b"body {}")
+            directory_manifest = build_manifest_from_directory(directory)
+
+        client = MagicMock()
+        client.list_objects_v2.side_effect = [
+            {"Contents": [{"Key": "assets/css/site.css", "ETag": '"%s"' % md5(b"body {}").hexdigest()}],
+             "IsTruncated": True, "NextContinuationToken": "next"},
+            {"Contents": [{"Key": "assets/js/app.js", "ETag": '"%s"' % md5(b"var a;").hexdigest()}],
+             "IsTruncated": False}
+        ]
+        bucket_manifest = build_manifest_from_bucket(client, "bucket", "assets/")
+
+        self.assertEqual(bucket_manifest["assets"]["assets/css/site.css"],
+                         directory_manifest["assets"]["assets/css/site.css"])
+        self.assertEqual(sorted(bucket_manifest["assets"]), ["assets/css/site.css", "assets/js/app.js"])
+        self.assertEqual(client.list_objects_v2.call_args[1]["ContinuationToken"], "next")
+
+    def test_resolve_reloads_for_unknown_hashes_once_per_ttl(self) -> None:
+        """
+        Verify an outdated hash resolves to the current one and reloads are rate limited
+        """
+        clock = FakeClock()
+        load = MagicMock(return_value = {"assets": {"css/site.css": "0123456789ab"}})
+        manifest = FingerprintManifest(load, ttl_seconds = 60, clock = clock)
+
+        self.assertEqual(manifest.resolve("0123456789ab/css/site.css"),
+                         ("css/site.css", "0123456789ab", "0123456789ab"))
+        self.assertEqual(manifest.resolve("ffffffffffff/css/site.css"),
+                         ("css/site.css", "ffffffffffff", "0123456789ab"))
+        self.assertIsNone(manifest.resolve("css/site.css"))
+        self.assertIsNone(manifest.resolve("0123456789ab/unknown.css"))
+        self.assertEqual(load.call_count, 1)
+        clock.now = 60
+        manifest.resolve("ffffffffffff/css/site.css")
+        self.assertEqual(load.call_count, 2)
@@ -1,15 +1,25 @@
 import sys
 import os
 import json
-from unittest import TestCase
+import io
+from unittest import TestCase, skipUnless
+from importlib.util import find_spec
 from unittest.mock import MagicMock, patch
 from boto3 import resource, client
 import moto
 import base64
+import gzip
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(1, 'resources/source')
-from app import S3Resource
+from app import S3Resource, get_s3_resource
 from app import lambda_handler, get_data_from_s3
+from app import OBJECT_CACHE, DISK_CACHE, NEGATIVE_CACHE, PRECOMPRESSED_INDEX, PRESIGNED_URLS, LARGE_OBJECTS
+from fingerprint import FingerprintManifest, fingerprint
+from metadata_index import MetadataIndex
+from body import encode_body
+from botocore.exceptions import ClientError
 
 @moto.mock_s3
 class TestSampleLambda(TestCase):
@@ -31,6 +41,14 @@ class TestSampleLambda(TestCase):
         s3_client.create_bucket(Bucket = self.test_s3_bucket_name )
         
         self.mocked_s3_class = S3Resource()
+        OBJECT_CACHE.clear()
+        OBJECT_CACHE.ttl_seconds = 60
+        DISK_CACHE.clear()
+        DISK_CACHE.ttl_seconds = 60
+        PRECOMPRESSED_INDEX.clear()
+        PRESIGNED_URLS.clear()
+        NEGATIVE_CACHE.clear()
+        LARGE_OBJECTS.clear()
         self.bucket_key = "sample.txt"
         s3_client.put_object(
             Body=f"Hello World".encode('utf-8'),
@@ -52,11 +70,393 @@ class TestSampleLambda(TestCase):
                         self.bucket_key
                         )
 
-        body = self.mocked_s3_class.bucket.Object(self.bucket_key).get()['Body'].read()
-        self.assertEqual(test_return_value["body"], base64.b64encode(body))
+        body = self.mocked_s3_class.client.get_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)['Body'].read()
+        self.assertEqual(test_return_value["body"], base64.b64encode(body).decode())
         self.assertEqual(test_return_value["statusCode"], 200)
         self.assertEqual(test_return_value["headers"]["Content-Type"], "plain/text")
 
+    def test_get_data_from_s3_returns_text_without_base64(self) -> None:
+        """
+        Verify a text object is returned as raw text with isBase64Encoded false.
+        """
+        client('s3', region_name="us-east-1").put_object(
+            Body=b"body { color: red }", Bucket=self.test_s3_bucket_name, Key="site.css", ContentType="text/css")
+
+        test_return_value = get_data_from_s3(self.mocked_s3_class, "site.css")
+
+        self.assertEqual(test_return_value["statusCode"], 200)
+        self.assertFalse(test_return_value["isBase64Encoded"])
+        self.assertEqual(test_return_value["body"], "body { color: red }")
+
+    def test_get_data_from_s3_issues_single_get_object(self) -> None:
+        """
+        Verify the body and metadata of a document are read from a single GetObject call.
+        """
+        self.mocked_s3_class.request_counter.reset()
+        test_return_value = get_data_from_s3(
+                        self.mocked_s3_class,
+                        self.bucket_key
+                        )
+
+        self.assertEqual(test_return_value["statusCode"], 200)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 1)
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 1)
+
+    def test_request_counter_records_latency_and_retries(self) -> None:
+        """
+        Verify the latency and retry attempts of every S3 call are recorded.
+        """
+        self.mocked_s3_class.request_counter.reset()
+        get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        self.mocked_s3_class.request_counter._on_call_done(
+            model=MagicMock(), parsed={"ResponseMetadata": {"RetryAttempts": 2}})
+        call_stats = self.mocked_s3_class.request_counter.stats()["GetObject"]
+
+        self.assertEqual(call_stats["calls"], 1)
+        self.assertEqual(sum(call_stats["latency_ms"].values()), 1)
+        self.assertEqual(sum(self.mocked_s3_class.request_counter.retries.values()), 2)
+
+    def test_request_counter_is_per_request(self) -> None:
+        """
+        Verify calls from another thread, such as prewarm or a concurrent request, neither show up
+        in nor reset the counts of the current request, while lifetime totals see them all.
+        """
+        counter = self.mocked_s3_class.request_counter
+        counter.reset()
+        calls_before = counter.totals.counts.get("GetObject", 0)
+        get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        def background_request():
+            counter.reset()
+            OBJECT_CACHE.clear()
+            DISK_CACHE.clear()
+            get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+            return counter.get("GetObject")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            background_calls = executor.submit(background_request).result()
+
+        self.assertEqual(background_calls, 1)
+        self.assertEqual(counter.get("GetObject"), 1)
+        self.assertEqual(counter.totals.counts["GetObject"] - calls_before, 2)
+
+    def test_get_data_from_s3_serves_warm_requests_from_cache(self) -> None:
+        """
+        Verify a second request for the same document is served from the in-memory cache.
+        """
+        first_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        self.mocked_s3_class.request_counter.reset()
+        second_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        self.assertEqual(second_return_value, first_return_value)
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+        self.assertEqual(OBJECT_CACHE.stats()["hits"], 1)
+        self.assertEqual(OBJECT_CACHE.stats()["misses"], 1)
+
+    def test_get_data_from_s3_reuses_encoded_response(self) -> None:
+        """
+        Verify a warm hit reuses the cached encoded body instead of encoding it again.
+        """
+        with patch("app.encode_body", wraps=encode_body) as encode_body_spy:
+            first_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+            second_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        self.assertEqual(encode_body_spy.call_count, 1)
+        self.assertIs(second_return_value["body"], first_return_value["body"])
+        self.assertIsNot(second_return_value["headers"], first_return_value["headers"])
+        self.assertEqual(OBJECT_CACHE.stats()["bytes"], len(b"Hello World") + len(first_return_value["body"]))
+
+    def test_get_data_from_s3_serves_memory_misses_from_disk_cache(self) -> None:
+        """
+        Verify a document evicted from memory is served from the /tmp cache without calling S3.
+        """
+        first_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        OBJECT_CACHE.clear()
+        self.mocked_s3_class.request_counter.reset()
+        second_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        self.assertEqual(second_return_value, first_return_value)
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+        self.assertEqual(DISK_CACHE.stats()["hits"], 1)
+
+    def test_get_data_from_s3_revalidates_expired_entries(self) -> None:
+        """
+        Verify an expired cache entry is revalidated with a conditional GetObject.
+        """
+        OBJECT_CACHE.ttl_seconds = 0
+        DISK_CACHE.ttl_seconds = 0
+        get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        self.assertEqual(test_return_value["statusCode"], 200)
+        self.assertEqual(OBJECT_CACHE.stats()["revalidations"], 1)
+        self.assertEqual(OBJECT_CACHE.stats()["not_modified"], 1)
+
+        client('s3', region_name="us-east-1").put_object(
+            Body=b"Hello again",
+            Bucket=self.test_s3_bucket_name,
+            Key=self.bucket_key,
+            ContentType='plain/text'
+        )
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        self.assertEqual(test_return_value["body"], base64.b64encode(b"Hello again").decode())
+        self.assertEqual(OBJECT_CACHE.stats()["not_modified"], 1)
+
+    def test_get_data_from_s3_returns_validators(self) -> None:
+        """
+        Verify ETag and Last-Modified headers are returned from the S3 object.
+        """
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        s3_head = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)
+
+        self.assertEqual(test_return_value["headers"]["ETag"], s3_head["ETag"])
+        self.assertTrue(test_return_value["headers"]["Last-Modified"].endswith(" GMT"))
+
+    def test_get_data_from_s3_if_none_match_returns_304(self) -> None:
+        """
+        Verify a matching If-None-Match returns a bodyless 304 after a HeadObject only.
+        """
+        s3_head = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)
+        self.mocked_s3_class.request_counter.reset()
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"if-none-match": s3_head["ETag"]})
+
+        self.assertEqual(test_return_value["statusCode"], 304)
+        self.assertEqual(test_return_value["body"], "")
+        self.assertEqual(test_return_value["headers"]["ETag"], s3_head["ETag"])
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 0)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("HeadObject"), 1)
+
+    def test_get_data_from_s3_if_modified_since_uses_cache(self) -> None:
+        """
+        Verify If-Modified-Since is answered from a cached entry without calling S3.
+        """
+        first_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        self.mocked_s3_class.request_counter.reset()
+        test_return_value = get_data_from_s3(
+            self.mocked_s3_class, self.bucket_key,
+            headers={"if-modified-since": first_return_value["headers"]["Last-Modified"]})
+
+        self.assertEqual(test_return_value["statusCode"], 304)
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+    def test_get_data_from_s3_stale_validator_returns_200(self) -> None:
+        """
+        Verify a non-matching If-None-Match returns the full document.
+        """
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"if-none-match": '"outdated"'})
+
+        self.assertEqual(test_return_value["statusCode"], 200)
+        self.assertEqual(test_return_value["body"], base64.b64encode(b"Hello World").decode())
+
+    def test_get_data_from_s3_single_range_returns_206(self) -> None:
+        """
+        Verify a single byte range is served from one ranged GetObject as 206 Partial Content.
+        """
+        self.mocked_s3_class.request_counter.reset()
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"range": "bytes=6-"})
+
+        self.assertEqual(test_return_value["statusCode"], 206)
+        self.assertEqual(test_return_value["body"], base64.b64encode(b"World").decode())
+        self.assertEqual(test_return_value["headers"]["Content-Range"], "bytes 6-10/11")
+        self.assertEqual(test_return_value["headers"]["Accept-Ranges"], "bytes")
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 1)
+
+    def test_get_data_from_s3_cached_range_skips_s3(self) -> None:
+        """
+        Verify a byte range of a cached document is sliced from the cache.
+        """
+        get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        self.mocked_s3_class.request_counter.reset()
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"range": "bytes=-5"})
+
+        self.assertEqual(test_return_value["statusCode"], 206)
+        self.assertEqual(test_return_value["body"], base64.b64encode(b"World").decode())
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+    def test_get_data_from_s3_multiple_ranges_returns_multipart(self) -> None:
+        """
+        Verify multiple byte ranges are returned as a multipart/byteranges body.
+        """
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"range": "bytes=0-4, 6-10"})
+
+        content_type = test_return_value["headers"]["Content-Type"]
+        boundary = content_type.split("boundary=", 1)[1]
+        body = base64.b64decode(test_return_value["body"])
+        self.assertEqual(test_return_value["statusCode"], 206)
+        self.assertTrue(content_type.startswith("multipart/byteranges"))
+        self.assertIn(b"Content-Range: bytes 0-4/11\r\n\r\nHello\r\n", body)
+        self.assertIn(b"Content-Range: bytes 6-10/11\r\n\r\nWorld\r\n", body)
+        self.assertTrue(body.endswith(("--%s--\r\n" % boundary).encode()))
+
+    def test_get_data_from_s3_unsatisfiable_range_returns_416(self) -> None:
+        """
+        Verify a range starting past the end of the document returns 416.
+        """
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"range": "bytes=50-60"})
+
+        self.assertEqual(test_return_value["statusCode"], 416)
+        self.assertEqual(test_return_value["headers"]["Content-Range"], "bytes */11")
+
+    def test_get_data_from_s3_compresses_text_on_the_fly(self) -> None:
+        """
+        Verify compressible documents are gzipped for clients accepting it and the result is cached.
+        """
+        stylesheet = b"body { color: black; }\n" * 100
+        client('s3', region_name="us-east-1").put_object(
+            Body=stylesheet, Bucket=self.test_s3_bucket_name, Key="site.css", ContentType="text/css")
+        request_headers = {"accept-encoding": "gzip, deflate"}
+
+        test_return_value = get_data_from_s3(self.mocked_s3_class, "site.css", headers=request_headers)
+        self.mocked_s3_class.request_counter.reset()
+        cached_return_value = get_data_from_s3(self.mocked_s3_class, "site.css", headers=request_headers)
+
+        self.assertEqual(test_return_value["headers"]["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", test_return_value["headers"]["Vary"])
+        self.assertTrue(test_return_value["headers"]["ETag"].endswith('-gzip"'))
+        self.assertEqual(gzip.decompress(base64.b64decode(test_return_value["body"])), stylesheet)
+        self.assertEqual(cached_return_value["body"], test_return_value["body"])
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+        not_modified_value = get_data_from_s3(
+            self.mocked_s3_class, "site.css",
+            headers={**request_headers, "if-none-match": test_return_value["headers"]["ETag"]})
+        self.assertEqual(not_modified_value["statusCode"], 304)
+
+    def test_get_data_from_s3_serves_precompressed_sibling(self) -> None:
+        """
+        Verify a precompressed key.br sibling is served to clients accepting brotli.
+        """
+        s3_client = client('s3', region_name="us-east-1")
+        s3_client.put_object(Body=b"var a = 1;", Bucket=self.test_s3_bucket_name,
+                             Key="app.js", ContentType="application/javascript")
+        s3_client.put_object(Body=b"brotli bytes", Bucket=self.test_s3_bucket_name,
+                             Key="app.js.br", ContentType="binary/octet-stream")
+
+        test_return_value = get_data_from_s3(self.mocked_s3_class, "app.js",
+                                             headers={"accept-encoding": "gzip, deflate, br"})
+        identity_return_value = get_data_from_s3(self.mocked_s3_class, "app.js",
+                                                 headers={"accept-encoding": "identity"})
+
+        self.assertEqual(test_return_value["headers"]["Content-Encoding"], "br")
+        self.assertEqual(test_return_value["headers"]["Content-Type"], "application/javascript")
+        self.assertEqual(test_return_value["body"], base64.b64encode(b"brotli bytes").decode())
+        self.assertNotIn("Content-Encoding", identity_return_value["headers"])
+        self.assertFalse(identity_return_value["isBase64Encoded"])
+        self.assertEqual(identity_return_value["body"], "var a = 1;")
+
+        not_modified_value = get_data_from_s3(
+            self.mocked_s3_class, "app.js",
+            headers={"accept-encoding": "br", "if-none-match": test_return_value["headers"]["ETag"]})
+        self.assertTrue(test_return_value["headers"]["ETag"].endswith('-br"'))
+        self.assertEqual(not_modified_value["statusCode"], 304)
+
+    def test_get_data_from_s3_serves_a_reuploaded_sibling(self) -> None:
+        """
+        Verify overwriting only a precompressed sibling is picked up once the sibling is revalidated,
+        not answered from the encoded response of the previous sibling.
+        """
+        s3_client = client('s3', region_name="us-east-1")
+        s3_client.put_object(Body=b"var a = 1;", Bucket=self.test_s3_bucket_name,
+                             Key="app.js", ContentType="application/javascript")
+        s3_client.put_object(Body=b"old brotli", Bucket=self.test_s3_bucket_name,
+                             Key="app.js.br", ContentType="binary/octet-stream")
+        request_headers = {"accept-encoding": "br"}
+        first_return_value = get_data_from_s3(self.mocked_s3_class, "app.js", headers=request_headers)
+        s3_client.put_object(Body=b"new brotli", Bucket=self.test_s3_bucket_name,
+                             Key="app.js.br", ContentType="binary/octet-stream")
+        OBJECT_CACHE.ttl_seconds = 0
+        DISK_CACHE.ttl_seconds = 0
+
+        second_return_value = get_data_from_s3(self.mocked_s3_class, "app.js", headers=request_headers)
+
+        self.assertEqual(first_return_value["body"], base64.b64encode(b"old brotli").decode())
+        self.assertEqual(second_return_value["body"], base64.b64encode(b"new brotli").decode())
+
+    def test_get_data_from_s3_falls_back_when_sibling_is_deleted(self) -> None:
+        """
+        Verify a sibling deleted after it was indexed is skipped without marking the original missing.
+        """
+        s3_client = client('s3', region_name="us-east-1")
+        s3_client.put_object(Body=b"body { color: black; }", Bucket=self.test_s3_bucket_name,
+                             Key="s.css", ContentType="text/css")
+        s3_client.put_object(Body=b"gzip bytes", Bucket=self.test_s3_bucket_name,
+                             Key="s.css.gz", ContentType="binary/octet-stream")
+        get_data_from_s3(self.mocked_s3_class, "s.css", headers={"accept-encoding": "identity"})
+        get_data_from_s3(self.mocked_s3_class, "s.css", headers={"accept-encoding": "gzip"})
+        s3_client.delete_object(Bucket=self.test_s3_bucket_name, Key="s.css.gz")
+        OBJECT_CACHE.clear()
+        DISK_CACHE.clear()
+
+        test_return_value = get_data_from_s3(self.mocked_s3_class, "s.css", headers={"accept-encoding": "gzip"})
+        identity_return_value = get_data_from_s3(self.mocked_s3_class, "s.css", headers={"accept-encoding": "identity"})
+
+        self.assertEqual(test_return_value["statusCode"], 200)
+        self.assertNotIn("Content-Encoding", test_return_value["headers"])
+        self.assertEqual(identity_return_value["statusCode"], 200)
+        self.assertEqual(identity_return_value["body"], "body { color: black; }")
+        self.assertEqual(len(PRECOMPRESSED_INDEX), 1)
+        self.assertEqual(list(PRECOMPRESSED_INDEX.values()), [[]])
+
+    @patch("app.REDIRECT_THRESHOLD_BYTES", 5)
+    def test_get_data_from_s3_redirects_large_objects(self) -> None:
+        """
+        Verify a document over the redirect threshold is not downloaded and redirects to a presigned URL,
+        and that its size is remembered so the next request skips the GetObject.
+        """
+        self.mocked_s3_class.request_counter.reset()
+        test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        second_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        location = test_return_value["headers"]["Location"]
+        self.assertEqual(test_return_value["statusCode"], 307)
+        self.assertIn("/sample.txt?", location)
+        self.assertIn("Signature", location)
+        self.assertEqual(second_return_value["headers"]["Location"], location)
+        self.assertEqual(PRESIGNED_URLS.signed, 1)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 1)
+        self.assertEqual(OBJECT_CACHE.stats()["entries"], 0)
+
+    @patch("app.REDIRECT_THRESHOLD_BYTES", 5)
+    def test_get_data_from_s3_redirects_large_ranges(self) -> None:
+        """
+        Verify ranges spanning more than the redirect threshold redirect without a GetObject,
+        while a small range of the same object is still served.
+        """
+        self.mocked_s3_class.request_counter.reset()
+        open_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                             headers={"range": "bytes=0-"})
+        multiple_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                                 headers={"range": "bytes=0-1,4-"})
+
+        self.assertEqual(open_return_value["statusCode"], 307)
+        self.assertEqual(multiple_return_value["statusCode"], 307)
+        self.assertIn("/sample.txt?", open_return_value["headers"]["Location"])
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 0)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("HeadObject"), 1)
+
+        small_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                              headers={"range": "bytes=0-4"})
+        self.assertEqual(small_return_value["statusCode"], 206)
+        self.assertEqual(small_return_value["body"], base64.b64encode(b"Hello").decode())
+
+    def test_get_s3_resource_is_shared(self) -> None:
+        """
+        Verify one S3 resource is built per execution environment, even from several threads.
+        """
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resources = list(executor.map(lambda _: get_s3_resource(), range(16)))
+
+        self.assertTrue(all(s3_resource is resources[0] for s3_resource in resources))
+
     def test_get_data_from_s3_doc_notfound_404(self) -> None:
         """
         Verify given a document type not present in the S3, a 404 error is returned.
@@ -69,7 +469,72 @@ class TestSampleLambda(TestCase):
         self.assertEqual(test_return_value["statusCode"], 404)
         self.assertIn("Not Found", test_return_value["body"])
 
-    @patch("app.S3Resource")
+    def test_get_data_from_s3_repeat_404_skips_s3(self) -> None:
+        """
+        Verify a key S3 reported missing is answered from the negative cache without a stack trace
+        """
+        with patch("app.logger.exception") as exception_log:
+            first_response = get_data_from_s3(self.mocked_s3_class, "missing.txt")
+            self.mocked_s3_class.request_counter.reset()
+            second_response = get_data_from_s3(self.mocked_s3_class, "missing.txt")
+
+        self.assertEqual(second_response["statusCode"], 404)
+        self.assertEqual(second_response["body"], first_response["body"])
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+        exception_log.assert_not_called()
+
+    def test_get_data_from_s3_answers_404_and_304_from_metadata_index(self) -> None:
+        """
+        Verify a fresh metadata index answers missing keys without calling S3, and that revalidations
+        and HEAD requests use the stored content type, learned with a single HeadObject, not a guess
+        """
+        index = MetadataIndex(prefix = "", refresh_seconds = 60, max_age_seconds = 300)
+        index.refresh(self.mocked_s3_class)
+        etag = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)["ETag"]
+        self.mocked_s3_class.request_counter.reset()
+
+        with patch("app.METADATA_INDEX", index):
+            missing_return_value = get_data_from_s3(self.mocked_s3_class, "missing.txt")
+            self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+            not_modified_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key,
+                                                  headers={"if-none-match": etag})
+            head_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key, method="HEAD")
+
+        self.assertEqual(missing_return_value["statusCode"], 404)
+        self.assertEqual(not_modified_value["statusCode"], 304)
+        self.assertEqual(not_modified_value["headers"]["ETag"], etag)
+        self.assertEqual(head_return_value["headers"]["Content-Type"], "plain/text")
+        self.assertEqual(self.mocked_s3_class.request_counter.get("HeadObject"), 1)
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 1)
+
+    def test_get_data_from_s3_does_not_cache_access_denied(self) -> None:
+        """
+        Verify AccessDenied is not negatively cached and is still logged with its stack trace
+        """
+        access_denied = ClientError({"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "GetObject")
+        with patch("app.load_object", side_effect = access_denied), patch("app.logger.exception") as exception_log:
+            test_return_value = get_data_from_s3(self.mocked_s3_class, "private.txt")
+
+        self.assertEqual(test_return_value["statusCode"], 404)
+        self.assertEqual(NEGATIVE_CACHE.stats()["entries"], 0)
+        exception_log.assert_called_once()
+
+    def test_get_data_from_s3_only_caches_the_requested_key_as_missing(self) -> None:
+        """
+        Verify a NoSuchKey naming another key, such as a sibling, does not mark the requested key missing
+        """
+        sibling_missing = ClientError({"Error": {"Code": "NoSuchKey", "Message": "The specified key does not exist.",
+                                                 "Key": "sample.txt.gz"}}, "GetObject")
+        with patch("app.load_encoded_variant", side_effect = sibling_missing):
+            test_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        second_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+
+        self.assertEqual(test_return_value["statusCode"], 404)
+        self.assertEqual(NEGATIVE_CACHE.stats()["entries"], 0)
+        self.assertEqual(second_return_value["statusCode"], 200)
+
+    @patch("app.get_s3_resource")
     @patch("app.get_data_from_s3")
     def test_lambda_handler_valid_event_returns_200(self,
                             patch_get_data_from_s3 : MagicMock,
@@ -99,11 +564,285 @@ class TestSampleLambda(TestCase):
 
         patch_get_data_from_s3.assert_called_once_with(
                                         s3=self.mocked_s3_class,
-                                        s3_file_key="sample.txt"
+                                        s3_file_key="sample.txt",
+                                        headers=test_event["headers"],
+                                        query=test_event["queryStringParameters"],
+                                        method="GET"
                                         )
 
         self.assertEqual(test_return_value, return_value_200)
-    
+
+    @patch("metrics.METRICS_ENABLED", True)
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_emits_emf_record(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify one EMF line with the phase timers is written per request, correlated by trace id.
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        test_event = self.load_sample_event_from_file("event")
+        test_event["headers"] = {"x-amzn-trace-id": test_event["headers"]["x-amzn-trace-id"]}
+
+        with patch("sys.stdout", new_callable = io.StringIO) as stdout:
+            lambda_handler(event=test_event, context=None)
+            lambda_handler(event=test_event, context=None)
+
+        first_record, second_record = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(first_record["TraceId"], test_event["headers"]["x-amzn-trace-id"])
+        self.assertEqual(first_record["StatusCode"], 200)
+        self.assertEqual(first_record["CacheTier"], "miss")
+        self.assertEqual(first_record["ObjectSize"], 11)
+        self.assertIn("S3FirstByte", first_record)
+        self.assertIn("S3Download", first_record)
+        self.assertIn("Encode", first_record)
+        self.assertIn("ResponseBuild", first_record)
+        self.assertEqual(second_record["CacheTier"], "response")
+        self.assertNotIn("S3FirstByte", second_record)
+
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_access_log_skips_s3_and_body(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify debug and access logging neither call S3 nor format the response body.
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        test_event = self.load_sample_event_from_file("event")
+        test_event["headers"] = {}
+        response = lambda_handler(event=test_event, context=None)
+        self.mocked_s3_class.request_counter.reset()
+
+        with self.assertLogs(level="DEBUG") as captured_logs:
+            lambda_handler(event=test_event, context=None)
+
+        access_lines = [json.loads(record.getMessage()) for record in captured_logs.records
+                        if record.name == "access"]
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+        self.assertEqual(access_lines[0]["key"], "sample.txt")
+        self.assertEqual(access_lines[0]["bytes"], len(response["body"]))
+        self.assertEqual(access_lines[0]["cache_tier"], "response")
+        self.assertFalse(any(response["body"] in line for line in captured_logs.output))
+
+    @skipUnless(find_spec("PIL"), "Pillow is not installed")
+    @patch("images._OUTPUT_FORMATS", ("webp",))
+    def test_get_data_from_s3_does_not_transcode_oversized_sources(self) -> None:
+        """
+        Verify a source over the byte limit is never downloaded for transcoding, and one over the
+        pixel limit is served as the original instead of being decoded.
+        """
+        from PIL import Image
+        source = io.BytesIO()
+        Image.effect_noise((256, 256), 64).convert("RGB").save(source, format="PNG")
+        client('s3', region_name="us-east-1").put_object(
+            Body=source.getvalue(), Bucket=self.test_s3_bucket_name, Key="photo.png", ContentType="image/png")
+        request_headers = {"accept": "image/webp"}
+
+        with patch("app.REDIRECT_THRESHOLD_BYTES", 1024), patch("app.transcode") as transcode:
+            redirected_return_value = get_data_from_s3(self.mocked_s3_class, "photo.png", headers=request_headers)
+        transcode.assert_not_called()
+        LARGE_OBJECTS.clear()
+        with patch("images.IMAGE_MAX_PIXELS", 100 * 100):
+            original_return_value = get_data_from_s3(self.mocked_s3_class, "photo.png", headers=request_headers)
+
+        self.assertEqual(redirected_return_value["statusCode"], 307)
+        self.assertEqual(original_return_value["statusCode"], 200)
+        self.assertEqual(original_return_value["headers"]["Content-Type"], "image/png")
+        self.assertEqual(base64.b64decode(original_return_value["body"]), source.getvalue())
+
+    @skipUnless(find_spec("PIL"), "Pillow is not installed")
+    @patch("images._OUTPUT_FORMATS", ("webp",))
+    def test_get_data_from_s3_serves_cached_webp_derivative(self) -> None:
+        """
+        Verify a PNG is transcoded once to WebP, stored under _derived/ and then served from the cache.
+        """
+        from PIL import Image
+        source = io.BytesIO()
+        Image.effect_noise((256, 256), 64).convert("RGB").save(source, format="PNG")
+        client('s3', region_name="us-east-1").put_object(
+            Body=source.getvalue(), Bucket=self.test_s3_bucket_name, Key="photo.png", ContentType="image/png")
+        request_headers = {"accept": "image/avif,image/webp,image/*,*/*;q=0.8"}
+
+        test_return_value = get_data_from_s3(self.mocked_s3_class, "photo.png", headers=request_headers)
+        self.mocked_s3_class.request_counter.reset()
+        cached_return_value = get_data_from_s3(self.mocked_s3_class, "photo.png", headers=request_headers)
+        original_return_value = get_data_from_s3(self.mocked_s3_class, "photo.png")
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+        derived_objects = self.mocked_s3_class.client.list_objects_v2(
+            Bucket=self.test_s3_bucket_name, Prefix="_derived/photo.png/")["Contents"]
+        self.assertEqual(test_return_value["headers"]["Content-Type"], "image/webp")
+        self.assertIn("Accept", test_return_value["headers"]["Vary"])
+        self.assertEqual(len(derived_objects), 1)
+        self.assertEqual(cached_return_value["body"], test_return_value["body"])
+        self.assertEqual(original_return_value["headers"]["Content-Type"], "image/png")
+        self.assertIn("Accept", original_return_value["headers"]["Vary"])
+
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_serves_fingerprinted_urls(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify a current '<hash>/<key>' URL is immutable and an outdated one redirects to it.
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        s3_head = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)
+        current_hash = fingerprint(s3_head["ETag"])
+        test_event = self.load_sample_event_from_file("event")
+        test_event["headers"] = {}
+
+        with patch("app.FINGERPRINTS", FingerprintManifest(lambda: {"assets": {"sample.txt": current_hash}}, 60)):
+            test_event["path"] = "/static/%s/sample.txt" % current_hash
+            current_response = lambda_handler(event=test_event, context=None)
+            test_event["path"] = "/static/0123456789ab/sample.txt"
+            outdated_response = lambda_handler(event=test_event, context=None)
+
+        self.assertEqual(current_response["statusCode"], 200)
+        self.assertEqual(current_response["headers"]["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(outdated_response["statusCode"], 302)
+        self.assertEqual(outdated_response["headers"]["Location"], "/static/%s/sample.txt" % current_hash)
+
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_checks_fingerprint_of_uncached_objects(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify an object overwritten since the manifest was built is not marked immutable when it is
+        fetched uncached or answered with a 304 from the metadata index.
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        s3_head = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)
+        outdated_hash = fingerprint(s3_head["ETag"])
+        self.mocked_s3_class.client.put_object(Body=b"Hello Again", Bucket=self.test_s3_bucket_name,
+                                               Key=self.bucket_key, ContentType="plain/text")
+        current_etag = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)["ETag"]
+        OBJECT_CACHE.ttl_seconds = 0
+        DISK_CACHE.ttl_seconds = 0
+        index = MetadataIndex(prefix = "", refresh_seconds = 60, max_age_seconds = 300)
+        index.refresh(self.mocked_s3_class)
+        test_event = self.load_sample_event_from_file("event")
+        test_event["path"] = "/static/%s/sample.txt" % outdated_hash
+
+        with patch("app.FINGERPRINTS", FingerprintManifest(lambda: {"assets": {"sample.txt": outdated_hash}}, 60)):
+            test_event["headers"] = {}
+            uncached_response = lambda_handler(event=test_event, context=None)
+            with patch("app.METADATA_INDEX", index):
+                test_event["headers"] = {"if-none-match": current_etag}
+                not_modified_response = lambda_handler(event=test_event, context=None)
+
+        self.assertEqual(uncached_response["statusCode"], 200)
+        self.assertNotEqual(uncached_response["headers"].get("Cache-Control"), "public, max-age=31536000, immutable")
+        self.assertEqual(not_modified_response["statusCode"], 304)
+        self.assertNotEqual(not_modified_response["headers"].get("Cache-Control"),
+                            "public, max-age=31536000, immutable")
+
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_head_returns_metadata_without_get_object(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify a HEAD is answered from HeadObject with an empty body, and from the cache once cached
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        test_event = self.load_sample_event_from_file("event")
+        test_event["httpMethod"] = "HEAD"
+        test_event["headers"] = {}
+
+        self.mocked_s3_class.request_counter.reset()
+        head_response = lambda_handler(event=test_event, context=None)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 0)
+        self.assertEqual(self.mocked_s3_class.request_counter.get("HeadObject"), 1)
+        self.assertEqual(head_response["statusCode"], 200)
+        self.assertEqual(head_response["body"], "")
+        self.assertEqual(head_response["headers"]["Content-Length"], str(len(b"Hello World")))
+        self.assertEqual(head_response["headers"]["Content-Type"], "plain/text")
+        self.assertIn("ETag", head_response["headers"])
+        self.assertIn("Last-Modified", head_response["headers"])
+
+        get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        self.mocked_s3_class.request_counter.reset()
+        cached_head_response = lambda_handler(event=test_event, context=None)
+        self.assertEqual(cached_head_response["headers"]["ETag"], head_response["headers"]["ETag"])
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+        test_event["path"] = "/static/missing.txt"
+        missing_response = lambda_handler(event=test_event, context=None)
+        self.assertEqual((missing_response["statusCode"], missing_response["body"]), (404, ""))
+
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_unsupported_method_returns_405(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify methods other than GET and HEAD are rejected with Allow, POST only reaches bundles
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        test_event = self.load_sample_event_from_file("event")
+        test_event["httpMethod"] = "DELETE"
+        delete_response = lambda_handler(event=test_event, context=None)
+        test_event["httpMethod"] = "POST"
+        post_response = lambda_handler(event=test_event, context=None)
+
+        self.assertEqual(delete_response["statusCode"], 405)
+        self.assertEqual(delete_response["headers"]["Allow"], "GET, HEAD")
+        self.assertEqual(post_response["statusCode"], 405)
+
+    def test_get_data_from_s3_hedges_slow_primary_with_replica(self) -> None:
+        """
+        Verify a GetObject delayed on the primary bucket is answered by the replica bucket,
+        and a primary 500 falls back to the replica
+        """
+        replica_bucket_name = "unit_test_s3_replica_bucket"
+        s3_client = client('s3', region_name="us-east-1")
+        s3_client.create_bucket(Bucket = replica_bucket_name)
+        s3_client.put_object(Body=b"Hello replica", Bucket=replica_bucket_name, Key=self.bucket_key,
+                             ContentType='plain/text')
+        with patch.dict(os.environ, {"S3_REPLICA_BUCKET_NAME": replica_bucket_name, "HEDGE_INITIAL_DELAY_MS": "20"}):
+            s3_resource = S3Resource()
+        delay_primary = lambda **kwargs: time.sleep(0.3)
+        s3_resource.client.meta.events.register('before-call.s3.GetObject', delay_primary, unique_id='delay')
+
+        hedged_return_value = get_data_from_s3(s3_resource, self.bucket_key)
+        self.assertEqual(hedged_return_value["body"], base64.b64encode(b"Hello replica").decode())
+        self.assertEqual(s3_resource.hedged_reads.stats()["fired"], 1)
+        self.assertEqual(s3_resource.hedged_reads.stats()["won"], 1)
+
+        OBJECT_CACHE.clear()
+        DISK_CACHE.clear()
+        s3_resource.client.meta.events.unregister('before-call.s3.GetObject', unique_id='delay')
+        internal_error = lambda **kwargs: (MagicMock(status_code=500), {
+            "Error": {"Code": "InternalError", "Message": "We encountered an internal error."},
+            "ResponseMetadata": {"HTTPStatusCode": 500}})
+        s3_resource.client.meta.events.register('before-call.s3.GetObject', internal_error, unique_id='error')
+        fallback_return_value = get_data_from_s3(s3_resource, self.bucket_key)
+        self.assertEqual(fallback_return_value["statusCode"], 200)
+        self.assertEqual(fallback_return_value["body"], base64.b64encode(b"Hello replica").decode())
+        self.assertEqual(s3_resource.hedged_reads.stats()["fallbacks"], 1)
+        self.assertEqual(s3_resource.hedged_reads.replica.request_counter.get("GetObject"), 2)
+
+    @patch("app.get_s3_resource")
+    def test_lambda_handler_applies_s3_notifications(self, patch_lambda_s3_class : MagicMock) -> None:
+        """
+        Verify an upload notification refreshes a cached object and a removal drops it
+        """
+        patch_lambda_s3_class.return_value = self.mocked_s3_class
+        get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        notification_event = self.load_sample_event_from_file("s3_notification_event")
+
+        self.mocked_s3_class.request_counter.reset()
+        self.assertEqual(lambda_handler(event=notification_event, context=None), {"batchItemFailures": []})
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+        client('s3', region_name="us-east-1").put_object(
+            Body=b"Hello again", Bucket=self.test_s3_bucket_name, Key=self.bucket_key, ContentType='plain/text')
+        etag = self.mocked_s3_class.client.head_object(
+            Bucket=self.test_s3_bucket_name, Key=self.bucket_key)["ETag"]
+        notification_event["Records"][0]["s3"]["object"]["eTag"] = etag.strip('"')
+        sqs_event = {"Records": [{"eventSource": "aws:sqs", "messageId": "1", "body": json.dumps(notification_event)},
+                                 {"eventSource": "aws:sqs", "messageId": "2", "body": "not json"}]}
+        self.assertEqual(lambda_handler(event=sqs_event, context=None),
+                         {"batchItemFailures": [{"itemIdentifier": "2"}]})
+        self.mocked_s3_class.request_counter.reset()
+        refreshed_return_value = get_data_from_s3(self.mocked_s3_class, self.bucket_key)
+        self.assertEqual(refreshed_return_value["body"], base64.b64encode(b"Hello again").decode())
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+
+        notification_event["Records"][0]["eventName"] = "ObjectRemoved:Delete"
+        lambda_handler(event=notification_event, context=None)
+        self.assertFalse(OBJECT_CACHE.contains((self.test_s3_bucket_name, self.bucket_key)))
+        self.assertFalse(DISK_CACHE.contains((self.test_s3_bucket_name, self.bucket_key)))
+
     def load_sample_event_from_file(self, test_event_file_name: str) ->  dict:
         """
         Loads and validate test events from the file system
@@ -113,7 +852,7 @@ class TestSampleLambda(TestCase):
             event = json.load(file_handle)
             return event
         
-    @patch("app.S3Resource")
+    @patch("app.get_s3_resource")
     @patch("app.get_data_from_s3")
     def test_lambda_handler_invalid_event_path_returns_400(self,
                             patch_get_data_from_s3 : MagicMock,
@@ -143,4 +882,4 @@ class TestSampleLambda(TestCase):
         s3_bucket = s3_resource.Bucket( self.test_s3_bucket_name )
         for key in s3_bucket.objects.all():
             key.delete()
-        s3_bucket.delete()
\ No newline at end of file
+        s3_bucket.delete()
\ No newline at end of file
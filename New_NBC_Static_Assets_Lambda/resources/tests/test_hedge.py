@@ -0,0 +1,86 @@
+import sys
+import time
+from threading import Event
+from unittest import TestCase
+from botocore.exceptions import ClientError
+
+sys.path.insert(1, 'resources/source')
+from hedge import HedgedReads
+
+def s3_error(code: str, status: int) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "GetObject")
+
+class TestHedgedReads(TestCase):
+    """
+    Test class for hedged reads across a primary and a replica bucket
+    """
+
+    def setUp(self) -> None:
+        """
+        Create hedged reads hedging after 20 ms until latencies are recorded
+        """
+        self.hedged_reads = HedgedReads(replica = None, initial_delay_seconds = 0.02, min_delay_seconds = 0.001,
+                                        min_samples = 4, window = 8)
+
+    def test_threshold_follows_running_percentile(self) -> None:
+        """
+        Verify the initial delay is used until enough samples exist, then the p95 of the window
+        """
+        self.assertEqual(self.hedged_reads.threshold_seconds(), 0.02)
+        for seconds in (0.010, 0.011, 0.012, 0.200):
+            self.hedged_reads.record_first_byte(seconds)
+        self.assertEqual(self.hedged_reads.threshold_seconds(), 0.200)
+        for seconds in (0.010,) * 8:
+            self.hedged_reads.record_first_byte(seconds)
+        self.assertEqual(self.hedged_reads.threshold_seconds(), 0.010)
+
+    def test_slow_primary_is_hedged_and_abandoned(self) -> None:
+        """
+        Verify a primary without a first byte in time is raced by the replica, which wins,
+        and the primary stops reading once it answers
+        """
+        primary_done = Event()
+        kept_reading = []
+
+        def slow_primary(on_first_byte):
+            time.sleep(0.2)
+            kept_reading.append(on_first_byte())
+            primary_done.set()
+            return "primary"
+
+        outcome = self.hedged_reads.run(slow_primary, lambda on_first_byte: on_first_byte() and "replica")
+
+        self.assertEqual((outcome.result, outcome.source, outcome.hedged), ("replica", "replica", True))
+        self.assertTrue(primary_done.wait(1))
+        self.assertEqual(kept_reading, [False])
+        self.assertEqual(self.hedged_reads.stats()["fired"], 1)
+        self.assertEqual(self.hedged_reads.stats()["won"], 1)
+
+    def test_fast_primary_is_not_hedged(self) -> None:
+        """
+        Verify a primary answering within the threshold is used alone
+        """
+        replica_calls = []
+        outcome = self.hedged_reads.run(lambda on_first_byte: on_first_byte() and "primary",
+                                        lambda on_first_byte: replica_calls.append(1))
+
+        self.assertEqual((outcome.result, outcome.hedged), ("primary", False))
+        self.assertEqual(replica_calls, [])
+        self.assertEqual(self.hedged_reads.stats()["samples"], 1)
+
+    def test_server_errors_fall_back_and_missing_keys_do_not(self) -> None:
+        """
+        Verify a primary 5xx is retried on the replica while NoSuchKey is final
+        """
+        def failing(error):
+            def call(on_first_byte):
+                raise error
+            return call
+
+        outcome = self.hedged_reads.run(failing(s3_error("InternalError", 500)), lambda on_first_byte: "replica")
+        self.assertEqual((outcome.result, outcome.hedged), ("replica", False))
+        self.assertEqual(self.hedged_reads.stats()["fallbacks"], 1)
+
+        with self.assertRaises(ClientError):
+            self.hedged_reads.run(failing(s3_error("NoSuchKey", 404)), failing(AssertionError("replica called")))
+        self.assertEqual(self.hedged_reads.stats()["fallbacks"], 1)
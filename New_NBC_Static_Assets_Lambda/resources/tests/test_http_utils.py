@@ -0,0 +1,83 @@
+import sys
+from datetime import datetime, timezone
+from unittest import TestCase
+
+sys.path.insert(1, 'resources/source')
+from http_utils import (etag_matches, format_http_date, get_header, is_not_modified,
+                        max_range_bytes, parse_range_header, resolve_ranges)
+
+class TestHttpUtils(TestCase):
+    """
+    Test class for the HTTP header helpers
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the Last-Modified date of the sample document
+        """
+        self.last_modified = datetime(2023, 5, 30, 10, 47, 7, tzinfo = timezone.utc)
+
+    def test_get_header_is_case_insensitive(self) -> None:
+        """
+        Verify request headers are looked up regardless of case.
+        """
+        self.assertEqual(get_header({"If-None-Match": '"a"'}, "if-none-match"), '"a"')
+        self.assertIsNone(get_header({}, "if-none-match"))
+
+    def test_format_http_date(self) -> None:
+        """
+        Verify datetimes are formatted as HTTP dates.
+        """
+        self.assertEqual(format_http_date(self.last_modified), "Tue, 30 May 2023 10:47:07 GMT")
+
+    def test_etag_matches_lists_weak_tags_and_wildcard(self) -> None:
+        """
+        Verify If-None-Match lists, weak tags and the wildcard are matched.
+        """
+        self.assertTrue(etag_matches('"a", W/"b"', '"b"'))
+        self.assertTrue(etag_matches('*', '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+
+    def test_if_none_match_takes_precedence_over_if_modified_since(self) -> None:
+        """
+        Verify If-Modified-Since is ignored when If-None-Match is present.
+        """
+        headers = {"if-none-match": '"other"', "if-modified-since": "Tue, 30 May 2023 10:47:07 GMT"}
+        self.assertFalse(is_not_modified(headers, '"etag"', self.last_modified))
+
+    def test_if_modified_since(self) -> None:
+        """
+        Verify If-Modified-Since compares against Last-Modified and ignores malformed dates.
+        """
+        self.assertTrue(is_not_modified({"if-modified-since": "Tue, 30 May 2023 10:47:07 GMT"},
+                                        '"etag"', self.last_modified))
+        self.assertFalse(is_not_modified({"if-modified-since": "Mon, 29 May 2023 10:47:07 GMT"},
+                                         '"etag"', self.last_modified))
+        self.assertFalse(is_not_modified({"if-modified-since": "garbage"},
+                                         '"etag"', self.last_modified))
+
+    def test_parse_range_header(self) -> None:
+        """
+        Verify byte ranges are parsed and malformed headers are ignored.
+        """
+        self.assertEqual(parse_range_header("bytes=0-499, 500-, -200"),
+                         [(0, 499), (500, None), (None, 200)])
+        self.assertIsNone(parse_range_header("bytes=5-1"))
+        self.assertIsNone(parse_range_header("bytes=a-b"))
+        self.assertIsNone(parse_range_header("items=0-1"))
+        self.assertIsNone(parse_range_header(""))
+
+    def test_resolve_ranges(self) -> None:
+        """
+        Verify ranges are clamped to the object, merged, and dropped when unsatisfiable.
+        """
+        self.assertEqual(resolve_ranges([(0, 4), (3, 8), (None, 2)], 100), [(0, 8), (98, 99)])
+        self.assertEqual(resolve_ranges([(90, 200)], 100), [(90, 99)])
+        self.assertEqual(resolve_ranges([(100, None)], 100), [])
+
+    def test_max_range_bytes(self) -> None:
+        """
+        Verify bounded and suffix ranges add up and an open-ended range has no bound.
+        """
+        self.assertEqual(max_range_bytes([(0, 4), (None, 10)]), 15)
+        self.assertIsNone(max_range_bytes([(0, 4), (20, None)]))
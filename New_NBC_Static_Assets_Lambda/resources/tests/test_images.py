@@ -0,0 +1,80 @@
+import sys
+import io
+from importlib.util import find_spec
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+sys.path.insert(1, 'resources/source')
+from images import ImageTooLargeError, derived_key, negotiate_format, parse_width, transcode
+
+class TestImages(TestCase):
+    """
+    Test class for image format negotiation and derivatives
+    """
+
+    @patch("images._OUTPUT_FORMATS", ("avif", "webp"))
+    def test_negotiate_format_prefers_avif_when_named(self) -> None:
+        """
+        Verify AVIF beats WebP, explicit q values win and image/* alone selects nothing
+        """
+        self.assertEqual(negotiate_format("image/avif,image/webp,image/apng,image/*,*/*;q=0.8"), "avif")
+        self.assertEqual(negotiate_format("image/avif;q=0.5,image/webp"), "webp")
+        self.assertIsNone(negotiate_format("image/*,*/*;q=0.8"))
+        self.assertIsNone(negotiate_format(None))
+
+    @patch("images._OUTPUT_FORMATS", ())
+    def test_nothing_is_negotiated_without_pillow(self) -> None:
+        """
+        Verify originals are served when no encoder is available
+        """
+        self.assertIsNone(negotiate_format("image/webp"))
+        self.assertIsNone(parse_width({"w": "300"}))
+
+    @patch("images._OUTPUT_FORMATS", ("webp",))
+    @patch("images.IMAGE_WIDTHS", (320, 640))
+    def test_parse_width_rounds_up_to_allowed_widths(self) -> None:
+        """
+        Verify widths snap to the next allowed one and invalid values are ignored
+        """
+        self.assertEqual(parse_width({"w": "300"}), 320)
+        self.assertEqual(parse_width({"w": "321"}), 640)
+        self.assertEqual(parse_width({"w": "5000"}), 640)
+        self.assertIsNone(parse_width({"w": "-1"}))
+        self.assertIsNone(parse_width({}))
+
+    def test_derived_key_follows_the_source_etag(self) -> None:
+        """
+        Verify a derivative key changes with the source ETag, width and format
+        """
+        self.assertEqual(derived_key("img/a.png", '"0123456789abcdef0123456789abcdef"', "webp", 320),
+                         "_derived/img/a.png/0123456789ab-w320.webp")
+        self.assertEqual(derived_key("img/a.png", '"fedcba9876543210fedcba9876543210"', "avif"),
+                         "_derived/img/a.png/fedcba987654.avif")
+
+    @skipUnless(find_spec("PIL"), "Pillow is not installed")
+    def test_transcode_downscales_and_changes_format(self) -> None:
+        """
+        Verify a PNG is re-encoded as WebP no wider than the asked width
+        """
+        from PIL import Image
+        source = io.BytesIO()
+        Image.new("RGB", (800, 400), "red").save(source, format = "PNG")
+
+        with Image.open(io.BytesIO(transcode(source.getvalue(), "webp", 320))) as derivative:
+            self.assertEqual(derivative.format, "WEBP")
+            self.assertEqual(derivative.size, (320, 160))
+
+    @skipUnless(find_spec("PIL"), "Pillow is not installed")
+    @patch("images.IMAGE_MAX_PIXELS", 100 * 100)
+    def test_transcode_rejects_images_over_the_pixel_limit(self) -> None:
+        """
+        Verify a source whose header declares too many pixels is rejected before it is decoded
+        """
+        from PIL import Image
+        source = io.BytesIO()
+        Image.new("L", (101, 100)).save(source, format = "PNG")
+
+        with patch("PIL.ImageFile.ImageFile.load") as load:
+            with self.assertRaises(ImageTooLargeError):
+                transcode(source.getvalue(), "webp")
+        load.assert_not_called()
@@ -0,0 +1,120 @@
+import sys
+import os
+import asyncio
+import http.client
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+from boto3 import client
+import moto
+
+sys.path.insert(1, 'resources/source')
+import app
+from app import S3Resource, lambda_handler, OBJECT_CACHE, DISK_CACHE
+from local_server import build_event, build_http_response, start_server
+
+@moto.mock_s3
+class TestLocalServer(TestCase):
+    """
+    Test class for the local HTTP server adapter
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a mocked bucket and serve the handler on a free local port
+        """
+        self.test_s3_bucket_name = "unit_test_s3_bucket"
+        os.environ["S3_BUCKET_NAME"] = self.test_s3_bucket_name
+        os.environ["LAMBDA_PATH"] = "/static/"
+        s3_client = client('s3', region_name="us-east-1")
+        s3_client.create_bucket(Bucket = self.test_s3_bucket_name)
+        s3_client.put_object(Body=b"Hello World", Bucket=self.test_s3_bucket_name, Key="sample.txt",
+                             ContentType="plain/text")
+        OBJECT_CACHE.clear()
+        DISK_CACHE.clear()
+        self.patcher = patch("app.get_s3_resource", return_value=S3Resource())
+        self.patcher.start()
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target = self.loop.run_forever, daemon = True)
+        self.loop_thread.start()
+        self.executor = ThreadPoolExecutor(max_workers = 16)
+        self.server = asyncio.run_coroutine_threadsafe(
+            start_server('127.0.0.1', 0, lambda_handler, self.executor), self.loop).result(5)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def tearDown(self) -> None:
+        self.server.close()
+        asyncio.run_coroutine_threadsafe(self.server.wait_closed(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(5)
+        self.loop.close()
+        self.executor.shutdown()
+        self.patcher.stop()
+
+    def request(self, path, headers = None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout = 10)
+        try:
+            connection.request('GET', path, headers = headers or {})
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    def test_serves_objects_over_http(self) -> None:
+        """
+        Verify an HTTP GET is served with the object body and headers
+        """
+        status, headers, body = self.request('/static/sample.txt')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"Hello World")
+        self.assertEqual(headers["Content-Type"], "plain/text")
+        self.assertEqual(headers["Content-Length"], "11")
+
+    def test_concurrent_misses_share_one_get_object(self) -> None:
+        """
+        Verify concurrent requests for an uncached key result in a single S3 fetch
+        """
+        original_fetch = app.fetch_object
+        release = threading.Event()
+
+        def slow_fetch(*args, **kwargs):
+            release.wait(5)
+            return original_fetch(*args, **kwargs)
+
+        with patch("app.fetch_object", side_effect = slow_fetch) as fetch_mock:
+            with ThreadPoolExecutor(max_workers = 8) as clients:
+                futures = [clients.submit(self.request, '/static/sample.txt') for _ in range(8)]
+                threading.Timer(0.5, release.set).start()
+                results = [future.result() for future in futures]
+        self.assertTrue(all(status == 200 and body == b"Hello World" for status, _, body in results))
+        self.assertEqual(fetch_mock.call_count, 1)
+
+    def test_build_event_matches_alb_shape(self) -> None:
+        """
+        Verify query parameters stay URL-encoded and the body is passed base64-encoded
+        """
+        event = build_event('POST', '/static/_bundle?keys=a%2Cb&format=zip', {'host': 'x'}, b'[]')
+        self.assertEqual(event["path"], "/static/_bundle")
+        self.assertEqual(event["queryStringParameters"], {"keys": "a%2Cb", "format": "zip"})
+        self.assertTrue(event["isBase64Encoded"])
+        self.assertEqual(event["body"], "W10=")
+
+    def test_build_http_response_decodes_base64_body(self) -> None:
+        """
+        Verify a base64 ALB response is written as raw bytes with its Content-Length
+        """
+        raw = build_http_response({"statusCode": 404, "isBase64Encoded": True, "body": b"aGk="}, False)
+        self.assertTrue(raw.startswith(b"HTTP/1.1 404 Not Found\r\n"))
+        self.assertIn(b"Content-Length: 2\r\n", raw)
+        self.assertTrue(raw.endswith(b"\r\n\r\nhi"))
+
+    def test_build_http_response_keeps_head_content_length(self) -> None:
+        """
+        Verify a HEAD response keeps the handler's Content-Length and carries no body
+        """
+        raw = build_http_response({"statusCode": 200, "headers": {"Content-Length": "11"}, "body": ""}, False,
+                                  head_request = True)
+        self.assertIn(b"Content-Length: 11\r\n", raw)
+        self.assertTrue(raw.endswith(b"\r\n\r\n"))
@@ -0,0 +1,140 @@
+import sys
+from datetime import datetime, timezone
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.insert(1, 'resources/source')
+sys.path.insert(1, 'resources/tests')
+from metadata_index import MetadataIndex, PackedKeys, list_snapshot, manifest_snapshot
+from fake_clock import FakeClock
+
+MODIFIED = datetime(2024, 1, 2, 3, 4, 5, tzinfo = timezone.utc)
+
+def listing_client(*pages):
+    client = MagicMock()
+    client.list_objects_v2.side_effect = list(pages)
+    return client
+
+def indexed(clock, *keys):
+    """
+    Index over a single page listing keys, all with the same ETag
+    """
+    index = MetadataIndex(prefix = 'assets/', refresh_seconds = 60, max_age_seconds = 300, clock = clock)
+    s3 = MagicMock(bucket_name = 'bucket')
+    s3.client = listing_client({"Contents": [{"Key": key, "Size": 7, "ETag": '"%s"' % ('ab' * 16),
+                                              "LastModified": MODIFIED} for key in keys], "IsTruncated": False})
+    index.refresh(s3)
+    return index
+
+class TestMetadataIndex(TestCase):
+    """
+    Test class for the bucket metadata index
+    """
+
+    def test_list_snapshot_pages_and_packs_etags(self) -> None:
+        """
+        Verify every page is listed, MD5 ETags round-trip and multipart ones are kept as is
+        """
+        client = listing_client(
+            {"Contents": [{"Key": "a.css", "Size": 3, "ETag": '"%s"' % ('0f' * 16), "LastModified": MODIFIED}],
+             "IsTruncated": True, "NextContinuationToken": "next"},
+            {"Contents": [{"Key": "b.js", "Size": 5, "ETag": '"%s-2"' % ('0f' * 16), "LastModified": MODIFIED}],
+             "IsTruncated": False})
+        snapshot = list_snapshot(client, "bucket", "")
+
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(snapshot.lookup("a.css"), (3, '"%s"' % ('0f' * 16), MODIFIED.timestamp(), None))
+        self.assertEqual(snapshot.lookup("b.js")[1], '"%s-2"' % ('0f' * 16))
+        self.assertIsNone(snapshot.lookup("a.cs"))
+        self.assertEqual(client.list_objects_v2.call_args[1]["ContinuationToken"], "next")
+
+    def test_manifest_snapshot_sorts_rows(self) -> None:
+        """
+        Verify manifest rows are searchable whatever their order and keep their content type
+        """
+        snapshot = manifest_snapshot({"objects": [["z.png", 1, '"%s"' % ('11' * 16), 0.0, "image/png"],
+                                                  ["a.txt", 2, '"%s"' % ('22' * 16), 0.0]]})
+
+        self.assertEqual(snapshot.lookup("z.png")[3], "image/png")
+        self.assertEqual(snapshot.lookup("a.txt")[0], 2)
+
+    def test_packed_keys_search_in_utf8_order(self) -> None:
+        """
+        Verify keys live in one buffer and non-ASCII keys are found in the order S3 lists them
+        """
+        snapshot = manifest_snapshot({"objects": [[key, 1, '"%s"' % ('33' * 16), 0.0]
+                                                  for key in ("z.css", "\u00e9t\u00e9.css", "a.css", "\uff21.css")]})
+
+        self.assertIsInstance(snapshot.keys, PackedKeys)
+        self.assertEqual(len(snapshot.keys.buffer), sum(len(key.encode('utf-8')) for key in
+                                                        ("z.css", "\u00e9t\u00e9.css", "a.css", "\uff21.css")))
+        for key in ("z.css", "\u00e9t\u00e9.css", "a.css", "\uff21.css"):
+            self.assertEqual(snapshot.lookup(key)[0], 1)
+        self.assertIsNone(snapshot.lookup("b.css"))
+
+    def test_delta_manifest_keeps_the_index_current_between_rebuilds(self) -> None:
+        """
+        Verify a delta applies creations and removals, keeps the index trusted, and that a full
+        rebuild only runs every rebuild_seconds
+        """
+        clock = FakeClock(1000.0)
+        index = MetadataIndex(prefix = 'assets/', refresh_seconds = 60, max_age_seconds = 300, clock = clock,
+                              rebuild_seconds = 3600, delta_location = 's3:_delta.json')
+        s3 = MagicMock(bucket_name = 'bucket')
+        s3.client = listing_client({"Contents": [{"Key": "assets/site.css", "Size": 7, "ETag": '"%s"' % ('ab' * 16),
+                                                  "LastModified": MODIFIED}], "IsTruncated": False})
+        self.assertTrue(index.needs_rebuild())
+        index.refresh(s3)
+        self.assertFalse(index.needs_rebuild())
+
+        clock.now += 250
+        read_manifest = MagicMock(return_value = {"objects": [["assets/new.css", 9, '"%s"' % ('cd' * 16),
+                                                               MODIFIED.timestamp(), "text/css"]],
+                                                  "removed": ["assets/site.css", "elsewhere/a.css"]})
+        index.apply_delta(s3, read_manifest)
+        clock.now += 250
+
+        self.assertEqual(index.lookup("assets/new.css").content_type, "text/css")
+        self.assertTrue(index.is_missing("assets/site.css"))
+        self.assertTrue(index.is_missing("assets/other.css"))
+        self.assertEqual(index.stats()["overlay"], 2)
+        clock.now += 3600
+        self.assertTrue(index.needs_rebuild())
+
+    def test_missing_keys_are_only_trusted_while_fresh(self) -> None:
+        """
+        Verify a listed key resolves without a guessed content type, an absent one is missing, and
+        a stale index or a key outside the prefix answers neither
+        """
+        clock = FakeClock(1000.0)
+        index = indexed(clock, "assets/site.css")
+
+        metadata = index.lookup("assets/site.css")
+        self.assertEqual((metadata.content_length, metadata.content_type, metadata.last_modified),
+                         (7, None, MODIFIED))
+        self.assertTrue(index.is_missing("assets/other.css"))
+        self.assertFalse(index.is_missing("elsewhere/other.css"))
+        clock.now += 300
+        self.assertFalse(index.is_missing("assets/other.css"))
+        self.assertIsNone(index.lookup("assets/site.css"))
+
+    def test_overlay_survives_only_older_rebuilds(self) -> None:
+        """
+        Verify updates and removals apply at once and are dropped by a rebuild started after them
+        """
+        clock = FakeClock(1000.0)
+        index = indexed(clock, "assets/site.css")
+        clock.now += 1
+        index.update("assets/new.css", 9, '"%s"' % ('cd' * 16), MODIFIED)
+        index.remove("assets/site.css")
+
+        self.assertEqual(index.lookup("assets/new.css").content_length, 9)
+        self.assertTrue(index.is_missing("assets/site.css"))
+        self.assertEqual(index.stats()["overlay"], 2)
+
+        clock.now += 1
+        s3 = MagicMock(bucket_name = 'bucket')
+        s3.client = listing_client({"Contents": [], "IsTruncated": False})
+        index.refresh(s3)
+        self.assertEqual(index.stats()["overlay"], 0)
+        self.assertTrue(index.is_missing("assets/new.css"))
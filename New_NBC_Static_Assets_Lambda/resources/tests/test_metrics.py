@@ -0,0 +1,85 @@
+import sys
+import io
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.insert(1, 'resources/source')
+import metrics
+from metrics import NULL_METRICS, RequestMetrics, TrackedRequest, current_metrics, start_request
+
+class TestMetrics(TestCase):
+    """
+    Test class for the Embedded Metric Format request metrics
+    """
+
+    def test_disabled_metrics_are_a_shared_no_op(self) -> None:
+        """
+        Verify nothing is tracked or written while EMF_METRICS is off
+        """
+        with patch("metrics.METRICS_ENABLED", False), patch("sys.stdout", new_callable = io.StringIO) as stdout:
+            request_metrics = start_request("Root=1-abc", cold_start = True)
+            with request_metrics.phase("Encode"):
+                pass
+            request_metrics.set("ObjectSize", 10)
+            request_metrics.emit({"statusCode": 200})
+
+        self.assertIs(request_metrics, NULL_METRICS)
+        self.assertIs(current_metrics(), NULL_METRICS)
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_tracked_requests_keep_only_log_properties(self) -> None:
+        """
+        Verify a request tracked for the access log while EMF_METRICS is off times no phase and writes nothing
+        """
+        with patch("metrics.METRICS_ENABLED", False), patch("sys.stdout", new_callable = io.StringIO) as stdout:
+            request_metrics = start_request("Root=1-abc", track = True)
+            with request_metrics.phase("Encode"):
+                pass
+            request_metrics.set("ObjectSize", 10)
+            request_metrics.set("CacheTier", "memory")
+            self.assertIs(current_metrics(), request_metrics)
+            request_metrics.emit({"statusCode": 200})
+
+        self.assertIsInstance(request_metrics, TrackedRequest)
+        self.assertEqual(request_metrics.properties, {"TraceId": "Root=1-abc", "CacheTier": "memory"})
+        self.assertIs(current_metrics(), NULL_METRICS)
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_phases_add_up_and_are_emitted_as_emf(self) -> None:
+        """
+        Verify one EMF line carries the phase timers, the properties and the CacheTier dimension
+        """
+        stream = io.StringIO()
+        request_metrics = RequestMetrics("Root=1-abc", cold_start = True, stream = stream)
+        with request_metrics.phase("S3Download"):
+            pass
+        with request_metrics.phase("S3Download"):
+            pass
+        request_metrics.set("ObjectSize", 11)
+        request_metrics.set("CacheTier", "memory")
+        request_metrics.emit({"statusCode": 200})
+
+        record = json.loads(stream.getvalue())
+        definition = record["_aws"]["CloudWatchMetrics"][0]
+        self.assertEqual(stream.getvalue().count("\n"), 1)
+        self.assertEqual(definition["Dimensions"], [["CacheTier"]])
+        self.assertIn({"Name": "S3Download", "Unit": "Milliseconds"}, definition["Metrics"])
+        self.assertIn({"Name": "ObjectSize", "Unit": "Bytes"}, definition["Metrics"])
+        self.assertEqual(record["TraceId"], "Root=1-abc")
+        self.assertEqual(record["CacheTier"], "memory")
+        self.assertEqual(record["StatusCode"], 200)
+        self.assertEqual(record["ColdStart"], 1)
+        self.assertEqual(record["ObjectSize"], 11)
+        self.assertGreaterEqual(record["Total"], record["S3Download"])
+
+    def test_request_metrics_are_per_thread_until_emitted(self) -> None:
+        """
+        Verify instrumented code finds the request's metrics until they are emitted
+        """
+        with patch("metrics.METRICS_ENABLED", True), patch("sys.stdout", new_callable = io.StringIO):
+            request_metrics = start_request()
+            self.assertIs(current_metrics(), request_metrics)
+            request_metrics.emit()
+
+        self.assertIs(metrics.current_metrics(), NULL_METRICS)
@@ -0,0 +1,51 @@
+import sys
+from unittest import TestCase
+from botocore.exceptions import ClientError
+
+sys.path.insert(1, 'resources/source')
+sys.path.insert(1, 'resources/tests')
+from negative_cache import NegativeCache
+from fetch import is_missing_key
+from fake_clock import FakeClock
+
+class TestNegativeCache(TestCase):
+    """
+    Test class for the missing-key cache
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a small cache with a manual clock
+        """
+        self.clock = FakeClock()
+        self.cache = NegativeCache(max_entries = 2, ttl_seconds = 10, clock = self.clock)
+
+    def test_entries_expire_after_ttl(self) -> None:
+        """
+        Verify a missing key is remembered until its TTL expires
+        """
+        self.cache.put(("bucket", "a"), "Not Found")
+        self.assertEqual(self.cache.get(("bucket", "a")), "Not Found")
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(("bucket", "a")))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_oldest_entries_are_evicted(self) -> None:
+        """
+        Verify the cache stays within max_entries
+        """
+        for key in ("a", "b", "c"):
+            self.cache.put(("bucket", key), "Not Found")
+        self.assertIsNone(self.cache.get(("bucket", "a")))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_only_missing_keys_are_cacheable(self) -> None:
+        """
+        Verify NoSuchKey and a HeadObject 404 count as missing, AccessDenied and throttling do not
+        """
+        def error(code):
+            return ClientError({"Error": {"Code": code}}, "GetObject")
+        self.assertTrue(is_missing_key(error("NoSuchKey")))
+        self.assertTrue(is_missing_key(error("404")))
+        self.assertFalse(is_missing_key(error("AccessDenied")))
+        self.assertFalse(is_missing_key(error("SlowDown")))
@@ -0,0 +1,56 @@
+import sys
+import json
+from datetime import datetime, timezone
+from unittest import TestCase
+
+sys.path.insert(1, 'resources/source')
+from notifications import bucket_changes, is_bucket_notification
+
+def s3_event(event_name: str, key: str) -> dict:
+    return {"Records": [{"eventSource": "aws:s3", "eventName": event_name, "eventTime": "2024-01-02T03:04:05.678Z",
+                         "s3": {"bucket": {"name": "bucket"},
+                                "object": {"key": key, "size": 11, "eTag": "0123456789abcdef0123456789abcdef"}}}]}
+
+class TestNotifications(TestCase):
+    """
+    Test class for the S3 event notification parser
+    """
+
+    def test_is_bucket_notification_tells_records_from_requests(self) -> None:
+        """
+        Verify S3, SQS and SNS events are notifications and ALB requests are not
+        """
+        self.assertTrue(is_bucket_notification(s3_event("ObjectCreated:Put", "a.css")))
+        self.assertTrue(is_bucket_notification({"Records": [{"eventSource": "aws:sqs", "body": "{}"}]}))
+        self.assertTrue(is_bucket_notification({"Records": [{"EventSource": "aws:sns", "Sns": {"Message": "{}"}}]}))
+        self.assertFalse(is_bucket_notification({"httpMethod": "GET", "path": "/static/a.css"}))
+        self.assertFalse(is_bucket_notification({"Records": []}))
+
+    def test_direct_record_decodes_key_and_etag(self) -> None:
+        """
+        Verify keys are URL-decoded, ETags quoted like S3 returns them and removals flagged
+        """
+        created, = bucket_changes(s3_event("ObjectCreated:Put", "img/my+photo%281%29.png")["Records"][0])
+        removed, = bucket_changes(s3_event("ObjectRemoved:Delete", "a.css")["Records"][0])
+
+        self.assertEqual(created.key, "img/my photo(1).png")
+        self.assertEqual(created.etag, '"0123456789abcdef0123456789abcdef"')
+        self.assertEqual(created.event_time, datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo = timezone.utc))
+        self.assertFalse(created.removed)
+        self.assertTrue(removed.removed)
+        self.assertEqual(bucket_changes(s3_event("ObjectRestore:Completed", "a.css")["Records"][0]), [])
+
+    def test_sqs_and_sns_envelopes_are_unwrapped(self) -> None:
+        """
+        Verify records delivered through SQS, SNS and SNS to SQS give the same change
+        """
+        message = json.dumps(s3_event("ObjectCreated:Copy", "a.css"))
+        via_sqs = {"eventSource": "aws:sqs", "messageId": "1", "body": message}
+        via_sns = {"EventSource": "aws:sns", "Sns": {"Message": message}}
+        via_sns_to_sqs = {"eventSource": "aws:sqs", "messageId": "2",
+                          "body": json.dumps({"Type": "Notification", "Message": message})}
+
+        for record in (via_sqs, via_sns, via_sns_to_sqs):
+            change, = bucket_changes(record)
+            self.assertEqual((change.bucket, change.key, change.removed), ("bucket", "a.css", False))
+        self.assertEqual(bucket_changes({"eventSource": "aws:sqs", "body": json.dumps({"Event": "s3:TestEvent"})}), [])
@@ -0,0 +1,45 @@
+import sys
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+sys.path.insert(1, 'resources/source')
+sys.path.insert(1, 'resources/tests')
+from presign import PresignedUrlCache
+from fake_clock import FakeClock
+
+class TestPresignedUrlCache(TestCase):
+    """
+    Test class for the presigned URL cache
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a cache over a mocked S3 client
+        """
+        self.clock = FakeClock()
+        self.cache = PresignedUrlCache(expires_in = 300, refresh_margin = 60, clock = self.clock)
+        self.s3 = MagicMock()
+        self.s3.bucket_name = "bucket"
+        self.s3.client.generate_presigned_url.side_effect = lambda *args, **kwargs: "url-%d" % self.clock.now
+
+    def test_reuses_url_until_refresh_margin(self) -> None:
+        """
+        Verify a URL is reused until refresh_margin seconds before it expires, then re-signed.
+        """
+        self.assertEqual(self.cache.get_url(self.s3, "big.pdf"), "url-0")
+        self.clock.now = 239
+        self.assertEqual(self.cache.get_url(self.s3, "big.pdf"), "url-0")
+        self.clock.now = 240
+        self.assertEqual(self.cache.get_url(self.s3, "big.pdf"), "url-240")
+        self.assertEqual(self.cache.signed, 2)
+        self.assertEqual(self.cache.reused, 1)
+        self.s3.client.generate_presigned_url.assert_called_with(
+            'get_object', Params = {"Bucket": "bucket", "Key": "big.pdf"}, ExpiresIn = 300)
+
+    def test_urls_are_per_key(self) -> None:
+        """
+        Verify each key gets its own URL.
+        """
+        self.cache.get_url(self.s3, "a.pdf")
+        self.cache.get_url(self.s3, "b.pdf")
+        self.assertEqual(self.cache.signed, 2)
@@ -0,0 +1,157 @@
+import sys
+import os
+import json
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+from boto3 import client
+import moto
+
+sys.path.insert(1, 'resources/source')
+from app import S3Resource, OBJECT_CACHE, DISK_CACHE, FIRST_REQUESTS, fetch_into_cache, is_cached, load_object
+from prewarm import Prewarmer, load_manifest, parse_manifest
+from singleflight import SingleFlight
+
+@moto.mock_s3
+class TestPrewarm(TestCase):
+    """
+    Test class for manifest-driven cache prewarming
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a mocked bucket holding a few assets and a hot-key manifest
+        """
+        self.test_s3_bucket_name = "unit_test_s3_bucket"
+        os.environ["S3_BUCKET_NAME"] = self.test_s3_bucket_name
+        self.s3_client = client('s3', region_name="us-east-1")
+        self.s3_client.create_bucket(Bucket = self.test_s3_bucket_name)
+        for key, size in (("low.css", 10), ("high.js", 20), ("big.png", 100)):
+            self.s3_client.put_object(Body=b"x" * size, Bucket=self.test_s3_bucket_name, Key=key)
+        self.s3_client.put_object(Body=json.dumps({"keys": [
+            "low.css", {"key": "high.js", "priority": 10}, {"key": "big.png", "priority": 5}]}),
+            Bucket=self.test_s3_bucket_name, Key="_prewarm.json")
+        self.mocked_s3_class = S3Resource()
+        OBJECT_CACHE.clear()
+        DISK_CACHE.clear()
+        FIRST_REQUESTS.clear()
+
+    def run_prewarm(self, prewarmer):
+        prewarmer.run(lambda: self.mocked_s3_class, "s3:_prewarm.json",
+                      prefetch = lambda s3, key, max_body_bytes: fetch_into_cache(s3, key, max_body_bytes)[0],
+                      is_cached = is_cached)
+
+    def test_parse_manifest_orders_by_priority(self) -> None:
+        """
+        Verify keys are ordered by descending priority, keeping manifest order on ties
+        """
+        self.assertEqual(parse_manifest({"keys": ["a", {"key": "b", "priority": 2}, "c"]}), ["b", "a", "c"])
+
+    def test_load_manifest_from_bundled_file(self) -> None:
+        """
+        Verify a manifest can be read from a file shipped with the function
+        """
+        with tempfile.NamedTemporaryFile('w', suffix = '.json', delete = False) as manifest_file:
+            json.dump({"keys": ["a.css"]}, manifest_file)
+        try:
+            self.assertEqual(load_manifest(self.mocked_s3_class, manifest_file.name), ["a.css"])
+        finally:
+            os.remove(manifest_file.name)
+
+    def test_prewarm_fills_cache_and_first_request_hits(self) -> None:
+        """
+        Verify prewarmed keys are served from the cache without calling S3 on the first request
+        """
+        prewarmer = Prewarmer(max_bytes = 1024, max_seconds = 10)
+        self.run_prewarm(prewarmer)
+        self.assertEqual(prewarmer.stats()["state"], "done")
+        self.assertEqual(prewarmer.keys_loaded, 3)
+        self.assertEqual(prewarmer.bytes_loaded, 130)
+        self.assertIsNotNone(prewarmer.stats()["duration_ms"])
+
+        self.mocked_s3_class.request_counter.reset()
+        load_object(self.mocked_s3_class, "high.js")
+        self.assertEqual(self.mocked_s3_class.request_counter.total(), 0)
+        self.assertEqual(FIRST_REQUESTS.stats()["hit_ratio"], 1.0)
+
+    def test_prewarm_stops_at_byte_budget(self) -> None:
+        """
+        Verify keys beyond the byte budget are skipped, highest priority first
+        """
+        prewarmer = Prewarmer(max_bytes = 20, max_seconds = 10)
+        self.run_prewarm(prewarmer)
+        self.assertTrue(is_cached(self.mocked_s3_class, "high.js"))
+        self.assertFalse(is_cached(self.mocked_s3_class, "big.png"))
+        self.assertEqual(prewarmer.keys_skipped, 2)
+
+    def test_prewarm_skips_keys_over_the_remaining_budget(self) -> None:
+        """
+        Verify a key whose manifest size exceeds the budget left is not fetched, and one without
+        a size is fetched with the budget left as its body limit
+        """
+        self.s3_client.put_object(Body=json.dumps({"keys": [
+            {"key": "big.png", "priority": 10, "size": 100}, "high.js", "low.css"]}),
+            Bucket=self.test_s3_bucket_name, Key="_prewarm.json")
+        prewarmer = Prewarmer(max_bytes = 25, max_seconds = 10)
+        self.mocked_s3_class.request_counter.reset()
+
+        self.run_prewarm(prewarmer)
+
+        self.assertFalse(is_cached(self.mocked_s3_class, "big.png"))
+        self.assertTrue(is_cached(self.mocked_s3_class, "high.js"))
+        self.assertFalse(is_cached(self.mocked_s3_class, "low.css"))
+        self.assertEqual((prewarmer.keys_loaded, prewarmer.bytes_loaded, prewarmer.keys_skipped), (1, 20, 2))
+        self.assertEqual(self.mocked_s3_class.request_counter.get("GetObject"), 3)
+
+    def test_prewarm_missing_manifest_fails_quietly(self) -> None:
+        """
+        Verify a missing manifest leaves the function serving without prewarm
+        """
+        prewarmer = Prewarmer()
+        prewarmer.run(lambda: self.mocked_s3_class, "s3:missing.json",
+                      prefetch = lambda s3, key, max_body_bytes: None, is_cached = is_cached)
+        self.assertEqual(prewarmer.state, "failed")
+
+    def test_request_waits_for_prefetch_in_flight(self) -> None:
+        """
+        Verify a request for a key being prefetched waits for it instead of fetching it again
+        """
+        started = threading.Event()
+        release = threading.Event()
+        import app
+        original_fetch = app.fetch_object
+
+        def slow_fetch(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return original_fetch(*args, **kwargs)
+
+        with patch("app.fetch_object", side_effect = slow_fetch) as fetch_mock:
+            prefetch = threading.Thread(target = fetch_into_cache, args = (self.mocked_s3_class, "low.css"))
+            prefetch.start()
+            started.wait(5)
+            results = []
+            request = threading.Thread(target = lambda: results.append(load_object(self.mocked_s3_class, "low.css")))
+            request.start()
+            release.set()
+            prefetch.join(5)
+            request.join(5)
+        self.assertEqual(fetch_mock.call_count, 1)
+        self.assertEqual(bytes(results[0].body), b"x" * 10)
+        self.assertEqual(FIRST_REQUESTS.counts["coalesced"] + FIRST_REQUESTS.counts["hit"], 1)
+
+class TestSingleFlight(TestCase):
+    """
+    Test class for concurrent call coalescing
+    """
+
+    def test_errors_reach_every_waiter(self) -> None:
+        """
+        Verify the leader's exception is raised to callers that waited on it
+        """
+        flight = SingleFlight()
+        with self.assertRaises(KeyError):
+            flight.do("key", lambda: {}["missing"])
+        self.assertFalse(flight.in_flight("key"))
+        self.assertEqual(flight.do("key", lambda: 1), (1, False))
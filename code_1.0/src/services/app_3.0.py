@@ -34,10 +34,10 @@ def get_data_from_s3( s3: LambdaS3Class,
                          s3_file_key: str):
     response = {}
     try:
-        client_response = s3.resource.Object(s3.bucket_name, s3_file_key)
-        logger.debug("Response from S3 '%s' : ", client_response.get())
-        body = base64.b64encode(client_response.get()['Body'].read())
-        content_type = client_response.get()['ContentType']
+        client_response = s3.resource.Object(s3.bucket_name, s3_file_key).get()
+        logger.debug("Response from S3 '%s' : ", client_response)
+        body = base64.b64encode(client_response['Body'].read())
+        content_type = client_response['ContentType']
         logger.info(
             "Successfully retreived object '%s' from Bucket '%s'.", s3_file_key, s3.bucket_name)
         response = {